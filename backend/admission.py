@@ -0,0 +1,212 @@
+"""
+Admission control for the chat endpoint: a concurrency limiter with a bounded
+FIFO wait queue, and per-client token buckets. Both reject with Rejected, which
+carries the HTTP status and a Retry-After estimate, instead of letting a spike
+queue up unboundedly in front of OpenAI and Neo4j.
+
+Requests of the Flask app wait for a slot in acquire, blocking their thread;
+the ASGI app waits in acquire_async on its event loop. Both share one queue.
+"""
+import math
+import time
+import asyncio
+import threading
+from collections import deque, OrderedDict
+
+
+class Rejected(Exception):
+    def __init__(self, status, retry_after, reason):
+        """
+        Args:
+            status (int): 429 for rate limited clients, 503 when the server is saturated
+            retry_after (int): Seconds the client should wait before retrying
+            reason (str): "rate_limited", "queue_full" or "queue_timeout"
+        """
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class Permit:
+    """
+    A held pipeline slot. Releasing is idempotent, so it can be tied both to the
+    error paths and to the end of the response.
+    """
+
+    def __init__(self, limiter, queue_seconds):
+        self.limiter = limiter
+        self.queue_seconds = queue_seconds
+        self.acquired_at = time.perf_counter()
+        self.released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self.released:
+                return
+            self.released = True
+        self.limiter.release(time.perf_counter() - self.acquired_at)
+
+
+class AsyncWaiter:
+    """
+    Queue entry of acquire_async. Set by release from any thread; the flag is set
+    under the limiter lock, the event wakes up the waiting task on its loop.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        self.granted = False
+
+    def set(self):
+        self.granted = True
+        self.loop.call_soon_threadsafe(self.event.set)
+
+    def is_set(self):
+        return self.granted
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_concurrent, max_queue=32, queue_timeout=10.0):
+        """
+        Args:
+            max_concurrent (int): Pipelines allowed to run at once.
+            max_queue (int): Requests allowed to wait for a slot; beyond that requests
+                are rejected immediately.
+            queue_timeout (float): Seconds a request waits for a slot before it is rejected.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()
+        # Moving average of how long a slot is held, for Retry-After estimates
+        self._hold_seconds = None
+
+    def _retry_after(self):
+        # Caller holds the lock
+        if self._hold_seconds is None:
+            return 1
+        return max(1, math.ceil(self._hold_seconds * (len(self._waiters) + 1) / self.max_concurrent))
+
+    def acquire(self):
+        """
+        Returns:
+            Permit: The acquired slot, with the time spent queueing
+
+        Raises:
+            Rejected: If the queue is full or no slot freed up within the queue timeout
+        """
+        start = time.perf_counter()
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                return Permit(self, 0.0)
+            if len(self._waiters) >= self.max_queue:
+                raise Rejected(503, self._retry_after(), "queue_full")
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+
+        if not waiter.wait(self.queue_timeout):
+            with self._lock:
+                # The slot may have been handed over between the timeout and the lock
+                if not waiter.is_set():
+                    self._waiters.remove(waiter)
+                    raise Rejected(503, self._retry_after(), "queue_timeout")
+        return Permit(self, time.perf_counter() - start)
+
+    async def acquire_async(self):
+        """
+        Like acquire, but waits for a slot without blocking a thread
+
+        Returns:
+            Permit: The acquired slot, with the time spent queueing
+
+        Raises:
+            Rejected: If the queue is full or no slot freed up within the queue timeout
+        """
+        start = time.perf_counter()
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                return Permit(self, 0.0)
+            if len(self._waiters) >= self.max_queue:
+                raise Rejected(503, self._retry_after(), "queue_full")
+            waiter = AsyncWaiter()
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(waiter.event.wait(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                # The slot may have been handed over between the timeout and the lock
+                if not waiter.is_set():
+                    self._waiters.remove(waiter)
+                    raise Rejected(503, self._retry_after(), "queue_timeout")
+        except asyncio.CancelledError:
+            # The client disconnected while queued: leave the queue, or pass on the slot
+            with self._lock:
+                if waiter.is_set():
+                    self._hand_over()
+                else:
+                    self._waiters.remove(waiter)
+            raise
+        return Permit(self, time.perf_counter() - start)
+
+    def release(self, hold_seconds):
+        with self._lock:
+            if self._hold_seconds is None:
+                self._hold_seconds = hold_seconds
+            else:
+                self._hold_seconds = 0.9 * self._hold_seconds + 0.1 * hold_seconds
+            self._hand_over()
+
+    def _hand_over(self):
+        # Caller holds the lock
+        if self._waiters:
+            # Hand the slot straight to the oldest waiter
+            self._waiters.popleft().set()
+        else:
+            self._active -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"active": self._active, "queued": len(self._waiters)}
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate_per_minute, burst, max_clients=10000):
+        """
+        Args:
+            rate_per_minute (float): Sustained requests per minute per client.
+            burst (int): Requests a client can make at once after being idle.
+            max_clients (int): Buckets kept; the least recently seen clients are
+                forgotten (and start over with a full bucket).
+        """
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client_id):
+        """
+        Take one token from the client's bucket
+
+        Raises:
+            Rejected: If the bucket is empty
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[client_id] = (tokens - 1 if allowed else tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        if not allowed:
+            raise Rejected(429, max(1, math.ceil((1 - tokens) / self.rate)), "rate_limited")
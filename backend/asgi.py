@@ -0,0 +1,232 @@
+"""
+ASGI serving mode for the chatbot API.
+
+Serves the same endpoints as fhnw_bot_api.py, with the same admission control,
+request coalescing and batch handling (see serving.py), but answer streams are
+async: a connection holds no thread while it waits for a pipeline slot or while
+tokens arrive. The rewrite and retrieval still run in a worker thread. When the
+client disconnects, Starlette cancels the response and the upstream OpenAI
+completion is closed immediately.
+
+Coalesced requests (COALESCE_REQUESTS=true) share a pipeline run on the
+coalescer's own thread pool; their streams await its deltas on the event loop.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import os
+import json
+import time
+import logging
+from logging.handlers import RotatingFileHandler
+
+import anyio
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from admission import Rejected
+from batch import retrieval_results, chat_results
+from metrics import REGISTRY
+from serving import get_chatbot, init_chatbot, readiness, admit_async, client_id, rejection, batch_items, batch_max_workers
+from sse import DONE_EVENT, TIME_TO_FIRST_TOKEN, STREAM_DURATION, CLIENT_DISCONNECTS, acoalesce, text_event
+
+# Logging Configuration
+handler = RotatingFileHandler('fhnw_bot.log', maxBytes=100000, backupCount=3)
+handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s"))
+logger = logging.getLogger("asgi")
+logger.addHandler(handler)
+logger.setLevel(logging.DEBUG)
+
+for name in ("rag_chatbot", "serving"):
+    logging.getLogger(name).addHandler(handler)
+    logging.getLogger(name).setLevel(logging.INFO)
+
+
+async def admit_request(request):
+    """
+    Admission control; a queued request waits for its slot on the event loop
+
+    Returns:
+        tuple: (release callable, None), or (None, rejection response)
+    """
+    client = client_id(request.client.host if request.client else None, request.headers.get("x-forwarded-for"))
+    try:
+        permit = await admit_async(client)
+    except Rejected as rejected:
+        body, status, headers = rejection(rejected)
+        return None, JSONResponse(body, status_code=status, headers=headers)
+    return (permit.release if permit is not None else (lambda: None)), None
+
+
+async def answer_stream(conversation):
+    """
+    Text deltas of the answer, through the single-flight coalescer if enabled
+
+    Returns:
+        async generator: Text deltas of the answer
+    """
+    chatbot = get_chatbot()
+    if chatbot.coalescer is not None:
+        subscription = chatbot.agenerate_coalesced(conversation)
+        try:
+            async for text in subscription:
+                yield text
+        finally:
+            # Leaving the flight, also when cancelled after the client disconnected
+            subscription.close()
+        return
+
+    prepared = await run_in_threadpool(chatbot.prepare_response, conversation)
+    async for text in chatbot.agenerate_response(prepared):
+        yield text
+
+
+async def chat_endpoint(request):
+    """
+    Same payload and SSE response as the Flask /api/chat endpoint
+    """
+    request_start = time.perf_counter()
+    release, rejected = await admit_request(request)
+    if rejected is not None:
+        return rejected
+
+    try:
+        data = await request.json()
+        conversation = data.get('messages', [])
+
+        if not conversation:
+            release()
+            return JSONResponse({"error": "No messages provided"}, status_code=400)
+
+        # Starts the pipeline, so errors before the first delta get a 500 like the Flask app
+        deltas = answer_stream(conversation)
+        first_text = await deltas.__anext__()
+    except StopAsyncIteration:
+        first_text = None
+    except Exception as e:
+        release()
+        logger.error(f"Chat API error: {e}", exc_info=True)
+        return JSONResponse({"error": "Internal server error"}, status_code=500)
+
+    async def with_first():
+        if first_text is not None:
+            yield first_text
+            async for text in deltas:
+                yield text
+
+    async def generate():
+        first_token = True
+        completed = False
+        try:
+            async for text in acoalesce(with_first()):
+                if first_token:
+                    TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - request_start)
+                    first_token = False
+                yield text_event(text)
+            completed = True
+        except Exception as e:
+            logger.error(f"Chat stream error: {e}", exc_info=True)
+            yield text_event('An error occurred while generating the response.')
+            completed = True
+        finally:
+            STREAM_DURATION.observe(time.perf_counter() - request_start)
+            if not completed:
+                # Cancelled by Starlette after the client disconnected
+                CLIENT_DISCONNECTS.inc()
+            # Closes the upstream completion or leaves the coalesced flight
+            with anyio.CancelScope(shield=True):
+                await deltas.aclose()
+            release()
+
+        # End of stream signal
+        yield DONE_EVENT
+
+    # The background task also releases the slot if the stream never started
+    return StreamingResponse(generate(), media_type='text/event-stream', background=BackgroundTask(release))
+
+
+def batch_endpoint(run_batch):
+    """
+    Shared handling of the batch endpoints, as in the Flask app
+    """
+    async def endpoint(request):
+        release, rejected = await admit_request(request)
+        if rejected is not None:
+            return rejected
+
+        try:
+            items, error = batch_items(await request.json())
+            if error is not None:
+                release()
+                return JSONResponse({"error": error}, status_code=400)
+        except Exception as e:
+            release()
+            logger.error(f"Batch API error: {e}", exc_info=True)
+            return JSONResponse({"error": "Internal server error"}, status_code=500)
+
+        def results():
+            for result in run_batch(get_chatbot(), items, max_workers=batch_max_workers):
+                yield (json.dumps(result) + "\n").encode("utf-8")
+
+        async def generate():
+            stream = results()
+            try:
+                async for line in iterate_in_threadpool(stream):
+                    yield line
+            finally:
+                # Stops the batch when the client disconnects. If a worker thread is still
+                # producing the next result, the generator is closed once it is collected.
+                try:
+                    stream.close()
+                except ValueError:
+                    pass
+                release()
+
+        return StreamingResponse(generate(), media_type='application/x-ndjson', background=BackgroundTask(release))
+
+    return endpoint
+
+
+async def ready_endpoint(request):
+    """
+    Readiness of this process, 503 until its chatbot is initialized and warmed up
+    """
+    status = dict(readiness, pid=os.getpid())
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+async def metrics_endpoint(request):
+    """
+    Prometheus text exposition of the pipeline latency histograms and counters
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type='text/plain; version=0.0.4')
+
+
+async def startup():
+    status = await run_in_threadpool(init_chatbot, os.getenv("WARM_UP", "true").lower() == "true")
+    if status["ready"]:
+        logger.info(f"Worker {status['pid']} ready, warm-up: {status['warm_up_ms']}")
+
+
+app = Starlette(
+    routes=[
+        Route('/api/chat', chat_endpoint, methods=['POST']),
+        Route('/api/retrieve/batch', batch_endpoint(retrieval_results), methods=['POST']),
+        Route('/api/chat/batch', batch_endpoint(chat_results), methods=['POST']),
+        Route('/api/ready', ready_endpoint, methods=['GET']),
+        Route('/metrics', metrics_endpoint, methods=['GET'])
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    on_startup=[startup]
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 5000))
+    uvicorn.run(app, host='0.0.0.0', port=port)
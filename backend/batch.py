@@ -0,0 +1,142 @@
+"""
+Batch processing for offline and evaluation traffic (/api/retrieve/batch and
+/api/chat/batch).
+
+Every item is {"id": ..., "messages": [...]} like a chat request, or carries
+precomputed "queries" to skip the rewrite. Rewrites and answers run on a pool
+owned by the batch, never on the chatbot's shared retrieval executor, so a large
+batch cannot starve or deadlock interactive requests. Retrieval for all items
+runs as one batch (see UniversityRAGChatbot.retrieve_batch).
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from rag_chatbot import RETRIEVAL_DECISIONS
+
+
+def rewrite_item(chatbot, item):
+    """
+    Returns:
+        dict: "query", "formatted_conversation", "retrieval_needed", "rewritten_queries"
+    """
+    messages = item.get("messages") or []
+    queries = item.get("queries")
+    if not messages and not queries:
+        raise ValueError("Item needs messages or queries")
+
+    if messages:
+        query, formatted_conversation = chatbot.format_conversation(messages)
+    else:
+        query, formatted_conversation = queries[0], ""
+
+    if queries:
+        retrieval_needed, rewritten_queries = True, list(queries)
+    else:
+        fast_rewrite = chatbot.fast_rewrite(formatted_conversation, query)
+        if fast_rewrite is not None:
+            retrieval_needed, rewritten_queries = fast_rewrite
+        else:
+            retrieval_needed, rewritten_queries = chatbot.rewrite_query(formatted_conversation, query)
+        RETRIEVAL_DECISIONS.inc(retrieval_needed=str(bool(retrieval_needed)).lower())
+
+    return {
+        "query": query,
+        "formatted_conversation": formatted_conversation,
+        "retrieval_needed": bool(retrieval_needed),
+        "rewritten_queries": rewritten_queries
+    }
+
+
+def prepare_items(chatbot, items, pool):
+    """
+    Rewrite every item in parallel, then retrieve for all items that need it in one batch
+
+    Returns:
+        list of dict: Per item the rewrite plus "context", "page_ids" and "chunk_ids",
+            or "error"
+    """
+    futures = [pool.submit(rewrite_item, chatbot, item) for item in items]
+    prepared = []
+    for item, future in zip(items, futures):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"error": str(e)}
+        result["id"] = item.get("id")
+        prepared.append(result)
+
+    needing_retrieval = [result for result in prepared if result.get("retrieval_needed")]
+    try:
+        retrieved = chatbot.retrieve_batch([result["rewritten_queries"] for result in needing_retrieval])
+    except Exception as e:
+        for result in needing_retrieval:
+            result["error"] = str(e)
+    else:
+        for result, retrieval in zip(needing_retrieval, retrieved):
+            result.update(retrieval)
+    return prepared
+
+
+def retrieval_results(chatbot, items, max_workers=4):
+    """
+    Yields:
+        dict: Retrieval result per item, in input order
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        prepared = prepare_items(chatbot, items, pool)
+
+    for result in prepared:
+        if "error" in result:
+            yield {"id": result["id"], "error": result["error"]}
+            continue
+        yield {
+            "id": result["id"],
+            "retrieval_needed": result["retrieval_needed"],
+            "rewritten_queries": result["rewritten_queries"],
+            "page_ids": result.get("page_ids", []),
+            "chunk_ids": result.get("chunk_ids", []),
+            "context": result.get("context", "")
+        }
+
+
+def complete(chatbot, result):
+    completion = chatbot.build_completion(
+        result["query"],
+        result["formatted_conversation"],
+        result["rewritten_queries"],
+        result.get("context")
+    )
+    response = chatbot.openai_client.chat.completions.create(**completion)
+    return response.choices[0].message.content
+
+
+def chat_results(chatbot, items, max_workers=4):
+    """
+    Yields:
+        dict: Answer per item, in completion order
+    """
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        prepared = prepare_items(chatbot, items, pool)
+
+        futures = {}
+        for result in prepared:
+            if "error" in result:
+                yield {"id": result["id"], "error": result["error"]}
+            else:
+                futures[pool.submit(complete, chatbot, result)] = result
+
+        for future in as_completed(futures):
+            result = futures[future]
+            try:
+                yield {
+                    "id": result["id"],
+                    "retrieval_needed": result["retrieval_needed"],
+                    "rewritten_queries": result["rewritten_queries"],
+                    "answer": future.result()
+                }
+            except Exception as e:
+                yield {"id": result["id"], "error": str(e)}
+    finally:
+        # All futures are done unless the client disconnected (the generator was closed):
+        # then completions not started yet are dropped and running ones are not waited for
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,244 @@
+"""
+Micro-batching of query embeddings across concurrent requests.
+
+Every request embeds its 3 rewritten queries, one small embeddings API call each
+time. EmbeddingBatcher is a drop-in embedding function that queues the texts of
+concurrent callers instead: a dispatcher thread takes the first pending call,
+gathers further calls for up to max_wait seconds or until max_batch_size texts,
+and sends them as one embeddings request. Every caller blocks until its own
+vectors are back.
+
+At most max_in_flight batches are sent at once. While all are in flight the
+dispatcher keeps gathering, so batches grow with load. Calls waiting beyond
+max_queue_size are not queued but embedded directly by the caller, which bounds
+the queueing delay when the API cannot keep up. Once closed, the batcher fails
+calls still waiting and lets new calls embed directly; callers never wait longer
+than call_timeout.
+"""
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Queued by close() to stop the dispatcher
+CLOSE = object()
+
+EMBEDDING_BATCH_SIZE = Histogram(
+    "fhnw_embedding_batch_size",
+    "Texts per batched embeddings request",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+EMBEDDING_BATCH_WAIT = Histogram(
+    "fhnw_embedding_batch_wait_seconds",
+    "Time a call waited in the queue before its batch was sent",
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 1.0)
+)
+EMBEDDING_BATCH_CALLS = Counter(
+    "fhnw_embedding_batch_calls_total",
+    "Embedding calls by outcome (batched, bypassed: queue full or closed, failed, timed_out)",
+    ["outcome"]
+)
+EMBEDDING_BATCH_QUEUE_DEPTH = Gauge(
+    "fhnw_embedding_batch_queue_depth",
+    "Embedding calls waiting for the dispatcher"
+)
+EMBEDDING_BATCH_SETTINGS = Gauge(
+    "fhnw_embedding_batch_settings",
+    "Configured wait window (seconds), batch size, queue size and batches in flight",
+    ["setting"]
+)
+
+
+class PendingCall:
+    def __init__(self, texts):
+        self.texts = texts
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.embeddings = None
+        self.error = None
+
+
+class EmbeddingBatcher:
+    def __init__(self, embedding_function, max_wait=0.005, max_batch_size=64, max_queue_size=256, max_in_flight=4,
+                 call_timeout=30.0):
+        """
+        Args:
+            embedding_function (callable): Maps a list of texts to a list of embeddings.
+            max_wait (float): Seconds the dispatcher gathers calls after the first one.
+            max_batch_size (int): Texts per embeddings request; a single call with more
+                texts is sent on its own.
+            max_queue_size (int): Calls allowed to wait; beyond that callers embed directly.
+            max_in_flight (int): Embeddings requests sent at once.
+            call_timeout (float): Seconds a caller waits for its batch before TimeoutError.
+        """
+        self.embedding_function = embedding_function
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self.max_in_flight = max_in_flight
+        self.call_timeout = call_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._senders = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embedding-batch")
+        self._carry = None
+        # Guards _closed, so no call is queued after the dispatcher stopped
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stop = threading.Event()
+
+        EMBEDDING_BATCH_QUEUE_DEPTH.set_function(self._queue.qsize)
+        for setting, value in (("max_wait_seconds", max_wait), ("max_batch_size", max_batch_size),
+                               ("max_queue_size", max_queue_size), ("max_in_flight", max_in_flight)):
+            EMBEDDING_BATCH_SETTINGS.set(value, setting=setting)
+
+        self._dispatcher = threading.Thread(target=self._dispatch, name="embedding-batcher", daemon=True)
+        self._dispatcher.start()
+
+    def __call__(self, texts):
+        """
+        Embed texts as part of the next batch
+
+        Args:
+            texts (list of str): Texts to embed.
+
+        Returns:
+            list: One embedding per input text, in input order.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+
+        call = PendingCall(texts)
+        with self._lock:
+            queued = not self._closed
+            if queued:
+                try:
+                    self._queue.put_nowait(call)
+                except queue.Full:
+                    queued = False
+        if not queued:
+            EMBEDDING_BATCH_CALLS.inc(outcome="bypassed")
+            return self.embedding_function(texts)
+
+        if not call.done.wait(self.call_timeout):
+            EMBEDDING_BATCH_CALLS.inc(outcome="timed_out")
+            raise TimeoutError(f"Batched embeddings request did not complete within {self.call_timeout}s")
+        if call.error is not None:
+            raise call.error
+        return call.embeddings
+
+    def _next_call(self, timeout=None):
+        if self._carry is not None:
+            call, self._carry = self._carry, None
+            return call
+        return self._queue.get(timeout=timeout)
+
+    def _gather(self):
+        """
+        Block for the first call, then gather calls until the window closes or the
+        batch is full. A call that does not fit is carried over to the next batch.
+
+        Returns:
+            list: Pending calls, or None once the batcher is closed
+        """
+        first = self._next_call()
+        if first is CLOSE:
+            return None
+        batch = [first]
+        size = len(first.texts)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                call = self._next_call(timeout=remaining)
+            except queue.Empty:
+                break
+            if call is CLOSE or size + len(call.texts) > self.max_batch_size:
+                self._carry = call
+                break
+            batch.append(call)
+            size += len(call.texts)
+        return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._gather()
+            if batch is None or self._stop.is_set():
+                self._fail_pending(batch or [])
+                self._senders.shutdown(wait=False)
+                return
+            # Calls keep queueing while all slots are busy and form a bigger next batch
+            self._slots.acquire()
+            self._senders.submit(self._send, batch)
+
+    def _fail_pending(self, batch):
+        """
+        Fail the gathered, carried and queued calls once the batcher is closed
+        """
+        calls = list(batch)
+        if self._carry is not None and self._carry is not CLOSE:
+            calls.append(self._carry)
+        self._carry = None
+        while True:
+            try:
+                call = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if call is not CLOSE:
+                calls.append(call)
+
+        error = RuntimeError("Embedding batcher is closed")
+        for call in calls:
+            call.error = error
+            call.done.set()
+        if calls:
+            EMBEDDING_BATCH_CALLS.inc(len(calls), outcome="failed")
+
+    def _send(self, batch):
+        try:
+            sent_at = time.perf_counter()
+            # Texts repeated across callers are embedded once
+            unique_texts = list(dict.fromkeys(text for call in batch for text in call.texts))
+            for call in batch:
+                EMBEDDING_BATCH_WAIT.observe(sent_at - call.enqueued_at)
+            EMBEDDING_BATCH_SIZE.observe(len(unique_texts))
+
+            try:
+                embeddings = dict(zip(unique_texts, self.embedding_function(unique_texts)))
+            except Exception as e:
+                logger.warning(f"Batched embeddings request for {len(batch)} calls failed: {e}")
+                EMBEDDING_BATCH_CALLS.inc(len(batch), outcome="failed")
+                for call in batch:
+                    call.error = e
+                    call.done.set()
+                return
+
+            EMBEDDING_BATCH_CALLS.inc(len(batch), outcome="batched")
+            for call in batch:
+                call.embeddings = [embeddings[text] for text in call.texts]
+                call.done.set()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """
+        Stop the dispatcher. Batches already sent complete, calls still waiting fail and
+        later calls embed directly. Does not block.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._stop.set()
+            try:
+                self._queue.put_nowait(CLOSE)
+            except queue.Full:
+                # The dispatcher is busy with the full queue and sees the stop event next
+                pass
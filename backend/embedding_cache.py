@@ -0,0 +1,191 @@
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from shared_cache import encode_embedding, decode_embedding
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """
+    Normalize a query for cache lookups: collapse whitespace and lowercase
+    """
+    return " ".join(text.split()).lower()
+
+
+class EmbeddingCache:
+    """
+    Embedding function wrapper with a bounded in-memory LRU, an optional SQLite
+    tier on disk that survives restarts and an optional shared tier (SharedCache)
+    used by all workers.
+
+    Entries are keyed by the embedding model name and the normalized text, and
+    vectors are kept as float32 arrays. The SQLite file is opened in WAL mode with
+    one connection per thread and is read and written outside the in-memory lock,
+    so it can be shared by several worker processes.
+    """
+
+    def __init__(self, embedding_function, model_name, max_size=2048, disk_path=None,
+                 shared_cache=None, shared_ttl=None, disk_timeout=5.0):
+        """
+        Args:
+            embedding_function (callable): Maps a list of texts to a list of embeddings.
+            model_name (str): Embedding model name, part of every cache key.
+            max_size (int): Maximum number of embeddings kept in memory.
+            disk_path (str, optional): SQLite file for the persistent tier.
+            shared_cache (SharedCache, optional): Tier shared across workers, looked
+                up after the local tiers and written with every new embedding.
+            shared_ttl (int, optional): Seconds embeddings stay in the shared tier.
+            disk_timeout (float): Seconds to wait for a write lock held by another
+                process before the disk tier is skipped for that call.
+        """
+        self.embedding_function = embedding_function
+        self.model_name = model_name
+        self.max_size = max_size
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "shared_hits": 0, "misses": 0, "duplicates": 0}
+
+        self.shared_cache = shared_cache
+        self.shared_ttl = shared_ttl
+
+        self.disk_path = disk_path
+        self.disk_timeout = disk_timeout
+        self._connections = threading.local()
+        if disk_path:
+            connection = self._connection()
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, embedding BLOB NOT NULL)"
+            )
+            connection.commit()
+
+    def _connection(self):
+        """
+        SQLite connection of the calling thread, opened on first use
+        """
+        connection = getattr(self._connections, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.disk_path, timeout=self.disk_timeout)
+            self._connections.connection = connection
+        return connection
+
+    def _disk_lookup(self, keys):
+        """
+        Returns:
+            dict: key -> embedding for the keys found on disk
+        """
+        try:
+            placeholders = ", ".join("?" * len(keys))
+            rows = self._connection().execute(
+                f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})", keys
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache lookup on disk failed: {e}")
+            return {}
+        return {key: np.frombuffer(data, dtype=np.float32) for key, data in rows}
+
+    def _disk_store(self, embeddings):
+        connection = self._connection()
+        try:
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+                    [(key, embedding.tobytes()) for key, embedding in embeddings.items()]
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write to disk failed: {e}")
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def __call__(self, texts):
+        """
+        Embed texts, calling the wrapped embedding function once for all misses.
+        Identical texts within one call are embedded only once.
+
+        Args:
+            texts (list of str): Texts to embed.
+
+        Returns:
+            list: One float32 numpy array per input text, in input order.
+        """
+        keys = [self.key(text) for text in texts]
+
+        # Deduplicate while keeping the first text seen for every key
+        unique_texts = {}
+        for key, text in zip(keys, texts):
+            unique_texts.setdefault(key, text)
+
+        found = {}
+        with self._lock:
+            self._stats["duplicates"] += len(keys) - len(unique_texts)
+            for key in unique_texts:
+                embedding = self._memory.get(key)
+                if embedding is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = embedding
+                    self._stats["memory_hits"] += 1
+
+        missing = [key for key in unique_texts if key not in found]
+        if missing and self.disk_path:
+            # Outside the lock, so memory hits of other threads do not wait for the disk
+            on_disk = self._disk_lookup(missing)
+            with self._lock:
+                for key, embedding in on_disk.items():
+                    found[key] = embedding
+                    self._store(key, embedding)
+                    self._stats["disk_hits"] += 1
+            missing = [key for key in missing if key not in found]
+
+        if missing and self.shared_cache is not None:
+            # Outside the lock, the shared tier is a network round trip
+            shared = self.shared_cache.get_many("embedding", missing)
+            with self._lock:
+                for key, data in zip(missing, shared):
+                    if data is not None:
+                        embedding = decode_embedding(data)
+                        found[key] = embedding
+                        self._store(key, embedding)
+                        self._stats["shared_hits"] += 1
+            missing = [key for key in missing if key not in found]
+
+        if missing:
+            new_embeddings = self.embedding_function([unique_texts[key] for key in missing])
+            with self._lock:
+                self._stats["misses"] += len(missing)
+                for key, embedding in zip(missing, new_embeddings):
+                    embedding = np.asarray(embedding, dtype=np.float32)
+                    found[key] = embedding
+                    self._store(key, embedding)
+            if self.disk_path:
+                self._disk_store({key: found[key] for key in missing})
+            if self.shared_cache is not None:
+                self.shared_cache.set_many(
+                    "embedding", {key: encode_embedding(found[key]) for key in missing}, self.shared_ttl
+                )
+
+        return [found[key] for key in keys]
+
+    def _store(self, key, embedding):
+        # Caller holds the lock
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit/miss counters and the current in-memory size.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._memory)
+        return stats
@@ -0,0 +1,160 @@
+"""
+Local fast path for the query rewrite.
+
+Greetings, thanks and goodbyes never need retrieval. Other first-turn queries are
+scored by a small Naive Bayes classifier trained on logged gpt-4o rewrites
+(see train_fast_path.py); when it is confident, the query variants are produced
+locally by applying the rewrite prompt's rules. Everything else returns None and
+goes to the LLM.
+"""
+import re
+import json
+import math
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9äöüéèàç]+")
+
+SMALL_TALK_PATTERN = re.compile(
+    r"^(hi|hey|hello|hallo|hoi|gruezi|grüezi|good (morning|afternoon|evening)|"
+    r"thanks|thank you|thx|merci|danke|ok|okay|cool|great|nice|perfect|"
+    r"bye|goodbye|see you|ciao|tschüss)( there| a lot| so much| very much| again)?[\s!.?]*$",
+    re.IGNORECASE
+)
+
+# Words the rewrite prompt asks to omit (articles, transitions) plus filler and prepositions
+OMITTED_WORDS = {
+    "a", "an", "the", "and", "also", "then", "so", "but", "however", "therefore",
+    "please", "can", "could", "would", "you", "tell", "me", "i", "do", "does", "is", "are",
+    "what", "which", "how", "who", "where", "when", "to", "of", "about", "there", "any", "my",
+    "at", "in", "on", "for", "with", "from"
+}
+INSTITUTION_WORDS = {"fhnw", "university", "fachhochschule", "nordwestschweiz"}
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def is_first_turn(formatted_conversation):
+    """
+    True if the conversation history holds no earlier user message (the frontend
+    always starts with an assistant welcome message)
+    """
+    return "**User:**" not in formatted_conversation
+
+
+def query_variants(query, num_queries):
+    """
+    Produce rewrite-style variants locally: the cleaned query, the query without
+    articles and filler words, and the latter without the implied institution name.
+    """
+    tokens = tokenize(query)
+    variants = [" ".join(tokens)]
+    keywords = [token for token in tokens if token not in OMITTED_WORDS]
+    if keywords:
+        variants.append(" ".join(keywords))
+        without_institution = [token for token in keywords if token not in INSTITUTION_WORDS]
+        if without_institution:
+            variants.append(" ".join(without_institution))
+
+    variants = [variant for variant in variants if variant] or [query.strip()]
+    return (variants * num_queries)[:num_queries]
+
+
+class RetrievalClassifier:
+    """
+    Multinomial Naive Bayes over query tokens predicting retrieval_needed
+    """
+
+    def __init__(self, class_counts=None, token_counts=None):
+        self.class_counts = class_counts or {"true": 0, "false": 0}
+        self.token_counts = token_counts or {"true": {}, "false": {}}
+        self._prepare()
+
+    def _prepare(self):
+        # Laplace-smoothed denominators, recomputed only after training
+        vocabulary_size = len(set(self.token_counts["true"]) | set(self.token_counts["false"]))
+        self._denominators = {
+            label: sum(counts.values()) + vocabulary_size + 1
+            for label, counts in self.token_counts.items()
+        }
+
+    def train(self, examples):
+        """
+        Args:
+            examples (iterable): (query, retrieval_needed) pairs
+        """
+        for query, retrieval_needed in examples:
+            label = "true" if retrieval_needed else "false"
+            self.class_counts[label] += 1
+            counts = self.token_counts[label]
+            for token in tokenize(query):
+                counts[token] = counts.get(token, 0) + 1
+        self._prepare()
+        return self
+
+    def predict_proba(self, query):
+        """
+        Returns:
+            float: Probability that the query needs retrieval
+        """
+        total = sum(self.class_counts.values())
+        if not total:
+            return 0.5
+        log_scores = {}
+        for label in ("true", "false"):
+            counts = self.token_counts[label]
+            denominator = self._denominators[label]
+            score = math.log((self.class_counts[label] + 1) / (total + 2))
+            for token in tokenize(query):
+                score += math.log((counts.get(token, 0) + 1) / denominator)
+            log_scores[label] = score
+        difference = log_scores["false"] - log_scores["true"]
+        if difference > 700:
+            return 0.0
+        return 1.0 / (1.0 + math.exp(difference))
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"class_counts": self.class_counts, "token_counts": self.token_counts}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["class_counts"], data["token_counts"])
+
+
+class FastPath:
+    def __init__(self, classifier=None, threshold=0.9, max_words=16):
+        """
+        Args:
+            classifier (RetrievalClassifier, optional): Trained classifier. Without it only
+                small talk takes the fast path.
+            threshold (float): Minimum classifier confidence for a local decision.
+            max_words (int): Longer queries always go to the LLM.
+        """
+        self.classifier = classifier
+        self.threshold = threshold
+        self.max_words = max_words
+
+    def decide(self, formatted_conversation, query, num_queries=3):
+        """
+        Returns:
+            tuple: (retrieval_needed, rewritten_queries) like rewrite_query, or None if
+                the query must be rewritten by the LLM.
+        """
+        if not query or not is_first_turn(formatted_conversation):
+            return None
+
+        if SMALL_TALK_PATTERN.match(query.strip()):
+            return False, [query.strip()] * num_queries
+
+        if self.classifier is None or len(query.split()) > self.max_words:
+            return None
+
+        probability = self.classifier.predict_proba(query)
+        if probability >= self.threshold:
+            return True, query_variants(query, num_queries)
+        if probability <= 1 - self.threshold:
+            return False, [query.strip()] * num_queries
+        return None
@@ -1,12 +1,16 @@
 import os
 import json
+import time
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import logging
 from logging.handlers import RotatingFileHandler
 
-# Import your existing RAG Chatbot class
-from rag_chatbot import UniversityRAGChatbot
+from batch import retrieval_results, chat_results
+from admission import Rejected
+from metrics import REGISTRY
+from serving import get_chatbot, init_chatbot, readiness, admit, client_id, rejection, batch_items, batch_max_workers
+from sse import DONE_EVENT, TIME_TO_FIRST_TOKEN, STREAM_DURATION, CLIENT_DISCONNECTS, coalesce, text_event
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -19,8 +23,20 @@ handler.setFormatter(formatter)
 app.logger.addHandler(handler)
 app.logger.setLevel(logging.DEBUG)
 
-# Initialize RAG Chatbot
-chatbot = UniversityRAGChatbot()
+# Chatbot logs (e.g. per-stage retrieval timings) go to the same file
+chatbot_logger = logging.getLogger("rag_chatbot")
+chatbot_logger.addHandler(handler)
+chatbot_logger.setLevel(logging.INFO)
+
+# Chatbot initialization errors
+serving_logger = logging.getLogger("serving")
+serving_logger.addHandler(handler)
+serving_logger.setLevel(logging.INFO)
+
+
+def request_client_id():
+    return client_id(request.remote_addr, request.headers.get("X-Forwarded-For"))
+
 
 @app.route('/api/chat', methods=['POST'])
 def chat_endpoint():
@@ -39,38 +55,139 @@ def chat_endpoint():
     The chatbot will use the content of the most recent message as the query.
     Returns a streaming response of the chatbot's answer.
     """
+    request_start = time.perf_counter()
+    try:
+        permit = admit(request_client_id())
+    except Rejected as rejected:
+        body, status, headers = rejection(rejected)
+        return jsonify(body), status, headers
+    release = permit.release if permit is not None else (lambda: None)
+
     try:
         # Get messages from the request
         data = request.get_json()
         conversation = data.get('messages', [])
         
         if not conversation:
+            release()
             return jsonify({"error": "No messages provided"}), 400
         
         # Generate response stream using the query
-        response_stream = chatbot.generate_response(conversation)
+        response_stream = get_chatbot().generate_response(conversation)
         
         def generate():
             """
             Generator function to stream response chunks
             """
             if response_stream:
-                for chunk in response_stream:
-                    if chunk.choices[0].delta.content is not None:
-                        yield f"data: {json.dumps({'text': chunk.choices[0].delta.content})}\n\n"
-                
+                first_token = True
+                try:
+                    for text in coalesce(response_stream):
+                        if first_token:
+                            TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - request_start)
+                            first_token = False
+                        yield text_event(text)
+                except GeneratorExit:
+                    # The client went away; closing response_stream closes the upstream completion
+                    CLIENT_DISCONNECTS.inc()
+                    if hasattr(response_stream, "close"):
+                        response_stream.close()
+                    raise
+                finally:
+                    STREAM_DURATION.observe(time.perf_counter() - request_start)
+
                 # End of stream signal
-                yield "data: [DONE]\n\n"
+                yield DONE_EVENT
             else:
-                yield f"data: {json.dumps({'text': 'An error occurred while generating the response.'})}\n\n"
-                yield "data: [DONE]\n\n"
+                yield text_event('An error occurred while generating the response.')
+                yield DONE_EVENT
 
-        return Response(generate(), mimetype='text/event-stream')
+        response = Response(generate(), mimetype='text/event-stream')
+        # Runs when the response is closed, also if the client left before the stream started
+        response.call_on_close(release)
+        return response
     
     except Exception as e:
+        release()
         app.logger.error(f"Chat API error: {e}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
 
+def batch_endpoint(run_batch):
+    """
+    Shared handling of the batch endpoints: admission, validation and the
+    newline-delimited JSON response (one object per conversation)
+    """
+    try:
+        permit = admit(request_client_id())
+    except Rejected as rejected:
+        body, status, headers = rejection(rejected)
+        return jsonify(body), status, headers
+    release = permit.release if permit is not None else (lambda: None)
+
+    try:
+        items, error = batch_items(request.get_json())
+        if error is not None:
+            release()
+            return jsonify({"error": error}), 400
+
+        def generate():
+            for result in run_batch(get_chatbot(), items, max_workers=batch_max_workers):
+                yield json.dumps(result) + "\n"
+
+        response = Response(generate(), mimetype='application/x-ndjson')
+        response.call_on_close(release)
+        return response
+
+    except Exception as e:
+        release()
+        app.logger.error(f"Batch API error: {e}", exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/api/retrieve/batch', methods=['POST'])
+def retrieve_batch_endpoint():
+    """
+    Retrieval without answer generation for many conversations
+
+    Expected JSON payload:
+    {
+        "conversations": [
+            {"id": "...", "messages": [...]},
+            {"id": "...", "queries": ["...", "..."]},
+            ...
+        ]
+    }
+
+    Items with "queries" skip the query rewrite. Returns one JSON object per line in
+    input order, with the rewritten queries, selected page IDs, fused chunk IDs and
+    the formatted context, or an "error".
+    """
+    return batch_endpoint(retrieval_results)
+
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch_endpoint():
+    """
+    Non-streaming answers for many conversations, same payload as /api/retrieve/batch.
+    Returns one JSON object per line with the "id" and "answer" (or "error") of each
+    conversation, in the order the answers complete.
+    """
+    return batch_endpoint(chat_results)
+
+@app.route('/api/ready', methods=['GET'])
+def ready_endpoint():
+    """
+    Readiness of the worker process serving this request, 503 until its chatbot is
+    initialized and warmed up
+    """
+    status = dict(readiness, pid=os.getpid())
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Prometheus text exposition of the pipeline latency histograms and counters
+    """
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.errorhandler(404)
 def page_not_found(e):
     app.logger.error(f"404 Error: {e}, path: {request.path}", exc_info=False)
@@ -83,4 +200,5 @@ def internal_server_error(e):
 
 if __name__ == "__main__":
     port = int(os.environ.get('PORT', 5000))
+    init_chatbot(warm_up=False)
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,159 @@
+"""
+Read-only snapshot of the pages and chunks the serving path reads from Neo4j.
+
+The graph is static between index builds, so export_graph_snapshot.py compiles it
+into one file that is memory-mapped at startup:
+
+    b"FHNWSNAP" | uint32 version | uint64 index length | index (JSON) | text blobs
+
+The index maps every page id to its URL, community, chunk count, token count and
+the offset and length of its zlib-compressed summary, and every chunk id to its
+page, number, token count and blob. Lookups are dictionary hits plus a zlib
+decompression of a few kilobytes; the text stays in the page cache, shared by all
+worker processes, instead of the heap of each.
+"""
+import os
+import io
+import mmap
+import zlib
+import json
+import struct
+
+MAGIC = b"FHNWSNAP"
+VERSION = 1
+HEADER = struct.Struct("<8sIQ")
+
+
+def write_snapshot(path, pages, chunks, metadata=None):
+    """
+    Write a snapshot atomically (to a temporary file, then renamed over path).
+
+    Args:
+        path (str): Snapshot file
+        pages (iterable of dict): page_id, url, summary, community_id,
+            number_of_chunks, summary_token_count
+        chunks (iterable of dict): chunk_id, page_id, content, chunk_number, token_count
+        metadata (dict, optional): Stored as is, e.g. the export time
+
+    Returns:
+        dict: Number of pages and chunks, and the snapshot size in bytes
+    """
+    blobs = io.BytesIO()
+
+    def add_blob(text):
+        data = zlib.compress((text or "").encode("utf-8"), 6)
+        offset = blobs.tell()
+        blobs.write(data)
+        return offset, len(data)
+
+    index = {"metadata": metadata or {}, "pages": {}, "chunks": {}}
+    for page in pages:
+        offset, length = add_blob(page["summary"])
+        index["pages"][page["page_id"]] = [
+            page["url"], page["community_id"], page["number_of_chunks"], page.get("summary_token_count"),
+            offset, length
+        ]
+    for chunk in chunks:
+        offset, length = add_blob(chunk["content"])
+        index["chunks"][chunk["chunk_id"]] = [
+            chunk["page_id"], chunk["chunk_number"], chunk.get("token_count"), offset, length
+        ]
+
+    index_bytes = json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(index_bytes)))
+        f.write(index_bytes)
+        f.write(blobs.getbuffer())
+    os.replace(temporary_path, path)
+    return {"pages": len(index["pages"]), "chunks": len(index["chunks"]), "bytes": os.path.getsize(path)}
+
+
+class GraphSnapshot:
+    """
+    Serves the page and chunk lookups of UniversityRAGChatbot from a snapshot file,
+    returning the same structures as the Neo4j queries.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Snapshot written by export_graph_snapshot.py
+
+        Raises:
+            ValueError: If the file is not a snapshot of a supported version
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, index_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a version {VERSION} graph snapshot")
+        index = json.loads(self._mmap[HEADER.size:HEADER.size + index_length])
+
+        self.metadata = index["metadata"]
+        self._pages = index["pages"]
+        self._chunks = index["chunks"]
+        self._blob_start = HEADER.size + index_length
+
+    def __len__(self):
+        return len(self._pages)
+
+    def _text(self, offset, length):
+        start = self._blob_start + offset
+        return zlib.decompress(self._mmap[start:start + length]).decode("utf-8")
+
+    def pages(self, page_ids):
+        """
+        Same result as UniversityRAGChatbot.query_neo4j_pages
+
+        Returns:
+            dict: page_id -> page_url, page_summary, community_id, number_of_chunks,
+                summary_token_count; unknown ids are left out
+        """
+        pages_info = {}
+        for page_id in page_ids:
+            page = self._pages.get(page_id)
+            if page is None:
+                continue
+            url, community_id, number_of_chunks, summary_token_count, offset, length = page
+            pages_info[page_id] = {
+                "page_url": url,
+                "page_summary": self._text(offset, length),
+                "community_id": community_id,
+                "number_of_chunks": number_of_chunks,
+                "summary_token_count": summary_token_count
+            }
+        return pages_info
+
+    def chunks(self, page_ids, chunk_ids):
+        """
+        Same result as UniversityRAGChatbot.query_neo4j_chunks
+
+        Returns:
+            dict: page_id -> chunks of chunk_ids on that page, ordered by chunk_number
+        """
+        wanted_pages = set(page_ids)
+        by_page = {}
+        for chunk_id in dict.fromkeys(chunk_ids):
+            chunk = self._chunks.get(chunk_id)
+            if chunk is None or chunk[0] not in wanted_pages:
+                continue
+            page_id, chunk_number, token_count, offset, length = chunk
+            by_page.setdefault(page_id, []).append({
+                "chunk_id": chunk_id,
+                "chunk_content": self._text(offset, length),
+                "chunk_number": chunk_number,
+                "token_count": token_count
+            })
+
+        context_results = {}
+        for page_id in dict.fromkeys(page_ids):
+            if page_id in by_page:
+                context_results[page_id] = sorted(by_page[page_id], key=lambda chunk: chunk["chunk_number"])
+        return context_results
+
+    def close(self):
+        self._mmap.close()
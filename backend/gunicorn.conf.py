@@ -0,0 +1,41 @@
+"""
+Production server configuration for the Flask app.
+
+Run from the backend directory with:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app module is imported once in the master (preload_app), but the chatbot is
+created in every worker after the fork, so each worker owns its Neo4j driver,
+Chroma client, OpenAI clients and retrieval executor. Each worker warms them up
+before it accepts requests and reports its readiness on /api/ready.
+"""
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# Threaded workers: answer streams are long and mostly wait on OpenAI, and the worker
+# heartbeat keeps running while a stream is served
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+
+# Streams can take a minute, warm-up a few seconds
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+preload_app = True
+
+accesslog = "-"
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    from fhnw_bot_api import init_chatbot
+
+    status = init_chatbot(warm_up=os.getenv("WARM_UP", "true").lower() == "true")
+    if status["ready"]:
+        worker.log.info(f"Worker {status['pid']} ready, warm-up: {status['warm_up_ms']}")
+    else:
+        worker.log.error(f"Worker {status['pid']} not ready: {status['error']}")
@@ -0,0 +1,160 @@
+"""
+Neo4j schema management for the serving path.
+
+The chatbot looks pages up by page_id and chunks by chunk_id on every request,
+and the graph population script merges pages by file_name. All three lookups
+are backed by uniqueness constraints, each of which comes with a range index.
+
+The constraints are created by data_gathering_and_indexing/neo4j_populate_o1.py
+(ensure_schema); the backend only verifies them at startup (verify_schema and
+check_query_plans) and never runs DDL.
+"""
+
+# (constraint name, label, property)
+UNIQUE_CONSTRAINTS = [
+    ("page_page_id_unique", "Page", "page_id"),
+    ("page_file_name_unique", "Page", "file_name"),
+    ("chunk_chunk_id_unique", "Chunk", "chunk_id"),
+]
+
+# Plan operators that read every node of a label (or the whole graph) instead of seeking an index
+SCAN_OPERATORS = {
+    "AllNodesScan",
+    "PartitionedAllNodesScan",
+    "NodeByLabelScan",
+    "PartitionedNodeByLabelScan",
+    "UnionNodeByLabelsScan",
+    "IntersectionNodeByLabelsScan",
+    "NodeIndexScan",
+}
+
+
+def find_duplicates(driver, limit=10):
+    """
+    Find values that occur on more than one node for the constrained properties
+
+    Args:
+        driver (neo4j.Driver): Neo4j driver
+        limit (int): Duplicate values reported per property
+
+    Returns:
+        dict: "Label.property" -> list of duplicate values, only for properties with duplicates
+    """
+    duplicates = {}
+    with driver.session() as session:
+        for _, label, prop in UNIQUE_CONSTRAINTS:
+            values = session.run(
+                f"MATCH (n:{label}) WHERE n.{prop} IS NOT NULL "
+                f"WITH n.{prop} AS value, count(*) AS nodes WHERE nodes > 1 "
+                f"RETURN value LIMIT $limit",
+                limit=limit
+            ).value()
+            if values:
+                duplicates[f"{label}.{prop}"] = values
+    return duplicates
+
+
+def ensure_schema(driver):
+    """
+    Create the uniqueness constraints (and their backing indexes) if they are missing
+    and wait for the indexes to come online
+
+    Args:
+        driver (neo4j.Driver): Neo4j driver
+
+    Raises:
+        RuntimeError: If existing nodes share a value of a constrained property; no
+            constraint is created then
+    """
+    duplicates = find_duplicates(driver)
+    if duplicates:
+        details = "; ".join(f"{key}: {', '.join(map(str, values))}" for key, values in duplicates.items())
+        raise RuntimeError(f"Cannot create uniqueness constraints, duplicate values found ({details})")
+
+    with driver.session() as session:
+        for name, label, prop in UNIQUE_CONSTRAINTS:
+            session.run(
+                f"CREATE CONSTRAINT {name} IF NOT EXISTS "
+                f"FOR (n:{label}) REQUIRE n.{prop} IS UNIQUE"
+            ).consume()
+        session.run("CALL db.awaitIndexes(300)").consume()
+
+
+def verify_schema(driver):
+    """
+    Check that every required uniqueness constraint exists and its index is online
+
+    Args:
+        driver (neo4j.Driver): Neo4j driver
+
+    Raises:
+        RuntimeError: If a constraint is missing or its index is not online
+    """
+    with driver.session() as session:
+        constraints = session.run(
+            "SHOW CONSTRAINTS YIELD type, labelsOrTypes, properties"
+        ).data()
+        indexes = session.run(
+            "SHOW INDEXES YIELD state, labelsOrTypes, properties"
+        ).data()
+
+    unique_keys = {
+        (constraint["labelsOrTypes"][0], constraint["properties"][0])
+        for constraint in constraints
+        if "UNIQUENESS" in constraint["type"]
+        and len(constraint["labelsOrTypes"] or []) == 1
+        and len(constraint["properties"] or []) == 1
+    }
+    online_keys = {
+        (index["labelsOrTypes"][0], index["properties"][0])
+        for index in indexes
+        if index["state"] == "ONLINE"
+        and len(index["labelsOrTypes"] or []) == 1
+        and len(index["properties"] or []) == 1
+    }
+
+    missing = [
+        f"{label}.{prop}"
+        for _, label, prop in UNIQUE_CONSTRAINTS
+        if (label, prop) not in unique_keys or (label, prop) not in online_keys
+    ]
+    if missing:
+        raise RuntimeError(
+            f"Neo4j schema is missing online uniqueness constraints for: {', '.join(missing)}. "
+            f"Create them with: python neo4j_populate_o1.py --schema-only (in data_gathering_and_indexing/)"
+        )
+
+
+def plan_operators(plan):
+    """
+    Flatten an EXPLAIN plan tree into the list of its operator names
+    """
+    operator = plan["operatorType"].split("@")[0]
+    operators = [operator]
+    for child in plan.get("children", []):
+        operators.extend(plan_operators(child))
+    return operators
+
+
+def check_query_plans(driver, queries):
+    """
+    EXPLAIN the serving queries and fail if any of them plans a label or full scan
+
+    Args:
+        driver (neo4j.Driver): Neo4j driver
+        queries (dict): Mapping of query name to (cypher, parameters)
+
+    Raises:
+        RuntimeError: If a query plan contains a scan operator
+    """
+    scanning = {}
+    with driver.session() as session:
+        for name, (query, parameters) in queries.items():
+            plan = session.run(f"EXPLAIN {query}", parameters).consume().plan
+            scans = [operator for operator in plan_operators(plan) if operator in SCAN_OPERATORS]
+            if scans:
+                scanning[name] = scans
+
+    if scanning:
+        details = "; ".join(f"{name}: {', '.join(scans)}" for name, scans in scanning.items())
+        raise RuntimeError(f"Serving queries fall back to scans instead of index seeks ({details})")
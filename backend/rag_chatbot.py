@@ -1,17 +1,123 @@
 import os
 from dotenv import load_dotenv
 import json
+import hashlib
+import logging
+import threading
+import time
+import weakref
 from textwrap import dedent
+from concurrent.futures import ThreadPoolExecutor
 
 # Database and ML libraries
+import anyio
 import chromadb
 from chromadb.utils import embedding_functions
 from neo4j import GraphDatabase
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import EmbeddingCache, normalize_text
+from fast_path import FastPath, RetrievalClassifier, is_first_turn
+from graph_snapshot import GraphSnapshot
+from metrics import REGISTRY, Counter, Histogram, render_counter_family
+from neo4j_schema import verify_schema, check_query_plans
+from rank_fusion import reciprocal_rank_fusion, merge_by_distance
+from semantic_cache import SemanticAnswerCache
+from shared_cache import SharedCache
+from single_flight import SingleFlight
+from stage_timer import StageTimer
+from vector_store import NumpyVectorStore, chunk_shard_name, is_chunk_shard
 
 # Load Environment Variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Metrics
+REWRITE_LATENCY = Histogram(
+    "fhnw_rewrite_duration_seconds",
+    "Query rewrite latency by source (local fast path or gpt-4o)",
+    ["source"],
+    buckets=(0.0001, 0.001, 0.01, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0)
+)
+FAST_PATH_DECISIONS = Counter(
+    "fhnw_rewrite_fast_path_total",
+    "Queries answered by the local rewrite fast path (hit) or sent to the LLM (fallback)",
+    ["outcome"]
+)
+STAGE_LATENCY = Histogram(
+    "fhnw_stage_duration_seconds",
+    "Wall-clock duration of chat pipeline stages",
+    ["stage"]
+)
+CONTEXT_TOKENS = Histogram(
+    "fhnw_context_tokens",
+    "Tokens of retrieved context sent to the answer model",
+    buckets=(500, 1000, 2000, 4000, 6000, 8000, 12000, 16000, 24000, 32000)
+)
+CONTEXT_TOKENS_SAVED = Counter(
+    "fhnw_context_tokens_saved_total",
+    "Context tokens dropped by the context token budget"
+)
+RETRIEVAL_DECISIONS = Counter(
+    "fhnw_retrieval_needed_total",
+    "Query rewrites by retrieval decision",
+    ["retrieval_needed"]
+)
+
+# The chatbot whose cache and speculation counters /metrics reports. Held weakly, so
+# the registry neither keeps replaced instances alive nor reports them twice.
+metrics_chatbot = None
+
+
+def collect_chatbot_metrics():
+    chatbot = metrics_chatbot() if metrics_chatbot is not None else None
+    return chatbot.collect_metrics() if chatbot is not None else []
+
+
+REGISTRY.register_collector(collect_chatbot_metrics)
+
+# Approximate tokens of the page header around each page summary
+PAGE_HEADER_TOKENS = 30
+
+
+def token_count(precomputed, text):
+    """
+    Precomputed o200k_base token count, or a 4 characters per token estimate for
+    graphs indexed before token counts were stored
+    """
+    if precomputed is not None:
+        return precomputed
+    return len(text) // 4 + 1
+
+
+# Cypher queries used on the serving path
+PAGES_QUERY = """
+    MATCH (p:Page) WHERE p.page_id IN $page_ids
+    RETURN p.page_id as page_id,
+        p.summary as page_summary,
+        p.url as page_url,
+        p.community_id as community_id,
+        p.number_of_chunks as number_of_chunks,
+        p.summary_token_count as summary_token_count
+    """
+
+CHUNKS_QUERY = """
+    UNWIND $page_ids AS page_id
+    MATCH (p:Page {page_id: page_id})-[:HAS_CHUNK]->(c:Chunk)
+    WHERE c.chunk_id IN $chunk_ids
+    WITH p, c
+    ORDER BY c.chunk_number
+    RETURN p.page_id as page_id,
+        collect({
+            chunk_id: c.chunk_id,
+            chunk_content: c.content,
+            chunk_number: c.chunk_number,
+            token_count: c.token_count
+        }) as chunks
+    """
+
 
 class UniversityRAGChatbot:
     def __init__(self):
@@ -25,66 +131,317 @@ class UniversityRAGChatbot:
 
         # OpenAI Clients
         self.openai_client = OpenAI(api_key=self.openai_api_key)
+        self.async_openai_client = AsyncOpenAI(api_key=self.openai_api_key)
         self.openai_ef = embedding_functions.OpenAIEmbeddingFunction(
             api_key=self.openai_api_key,
             model_name="text-embedding-3-large"
         )
 
+        # Shared Cache of embeddings, rewrites and answers across workers and hosts
+        self.shared_cache = None
+        shared_cache_url = os.getenv("SHARED_CACHE_URL")
+        if shared_cache_url:
+            self.shared_cache = SharedCache.from_url(
+                shared_cache_url,
+                prefix=os.getenv("SHARED_CACHE_PREFIX", "fhnw"),
+                timeout=float(os.getenv("SHARED_CACHE_TIMEOUT_MS", 50)) / 1000,
+                failure_threshold=int(os.getenv("SHARED_CACHE_FAILURE_THRESHOLD", 3)),
+                reset_timeout=float(os.getenv("SHARED_CACHE_RESET_SECONDS", 30))
+            )
+        self.shared_rewrite_ttl = int(os.getenv("SHARED_CACHE_REWRITE_TTL", 86400))
+
+        # Query Embedding Micro-Batching of cache misses across concurrent requests
+        # (a window of 0 ms embeds every request on its own)
+        self.embedding_batcher = None
+        embedding_batch_window_ms = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", 0))
+        if embedding_batch_window_ms > 0:
+            self.embedding_batcher = EmbeddingBatcher(
+                self.openai_ef,
+                max_wait=embedding_batch_window_ms / 1000,
+                max_batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", 64)),
+                max_queue_size=int(os.getenv("EMBEDDING_BATCH_QUEUE_SIZE", 256)),
+                max_in_flight=int(os.getenv("EMBEDDING_BATCH_MAX_IN_FLIGHT", 4)),
+                call_timeout=float(os.getenv("EMBEDDING_BATCH_TIMEOUT", 30))
+            )
+
+        # Query Embedding Cache
+        self.embed_queries = EmbeddingCache(
+            self.embedding_batcher or self.openai_ef,
+            model_name="text-embedding-3-large",
+            max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", 2048)),
+            disk_path=os.getenv("EMBEDDING_CACHE_PATH"),
+            shared_cache=self.shared_cache,
+            shared_ttl=int(os.getenv("SHARED_CACHE_EMBEDDING_TTL", 7 * 86400))
+        )
+
+        # Retrieval Executor, shared by all requests so bursts cannot spawn unbounded threads
+        self.executor = ThreadPoolExecutor(max_workers=int(os.getenv("RETRIEVAL_MAX_WORKERS", 8)))
+
+        # Speculative Retrieval on the raw query while the rewrite is in flight
+        self.speculative_retrieval = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+        self.speculation_stats = {"started": 0, "reused": 0, "merged": 0, "discarded": 0, "cancelled": 0}
+        self.speculation_lock = threading.Lock()
+
+        # Retrieval Execution ("sequential" or "concurrent" fan-out on the shared executor)
+        self.retrieval_execution = os.getenv("RETRIEVAL_EXECUTION", "sequential")
+        if self.retrieval_execution not in ("sequential", "concurrent"):
+            raise ValueError(f"Unknown retrieval execution mode: {self.retrieval_execution}")
+
+        # Rewrite Fast Path and Rewrite Log (training data for the fast path classifier)
+        self.fast_path = None
+        if os.getenv("REWRITE_FAST_PATH", "false").lower() == "true":
+            model_path = os.getenv("FAST_PATH_MODEL")
+            self.fast_path = FastPath(
+                classifier=RetrievalClassifier.load(model_path) if model_path else None,
+                threshold=float(os.getenv("FAST_PATH_THRESHOLD", 0.9))
+            )
+        self.rewrite_log_path = os.getenv("REWRITE_LOG_PATH")
+        self.rewrite_log_lock = threading.Lock()
+
+        # Context Token Budget (0 disables the limit)
+        self.context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", 0))
+
+        # Rank Fusion Configuration
+        self.fusion_distance_weight = float(os.getenv("FUSION_DISTANCE_WEIGHT", 0.0))
+
         # ChromaDB Configuration
-        self.chroma_persist_dir = "./chroma_db"
+        self.chroma_persist_dir = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
         os.environ['ANONYMIZED_TELEMETRY'] = 'False'
         self.chroma_client = chromadb.PersistentClient(path=self.chroma_persist_dir)
 
-        # Neo4j Configuration
+        # Vector Search Backend ("chroma" or "numpy")
+        self.vector_backend = os.getenv("VECTOR_BACKEND", "chroma")
+        if self.vector_backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown vector backend: {self.vector_backend}")
+        self.numpy_index_dir = os.getenv("NUMPY_INDEX_DIR", "./numpy_index")
+        self.numpy_store = NumpyVectorStore(
+            self.numpy_index_dir,
+            coarse_variant=os.getenv("NUMPY_COARSE_INDEX"),
+            rescore_factor=max(1, int(os.getenv("NUMPY_RESCORE_FACTOR", 4)))
+        )
+
+        # Chunk Retrieval ("search": filtered vector search, "exact": score the selected
+        # pages' chunk blocks of the NumPy index directly)
+        self.chunk_retrieval = os.getenv("CHUNK_RETRIEVAL", "search")
+        if self.chunk_retrieval not in ("search", "exact"):
+            raise ValueError(f"Unknown chunk retrieval mode: {self.chunk_retrieval}")
+
+        # Chunk Index ("global": the chunks collection, "sharded": one chunks_c<community_id>
+        # collection per community, built with create_embeddings.py --shard-by-community)
+        self.chunk_index = os.getenv("CHUNK_INDEX", "global")
+        if self.chunk_index not in ("global", "sharded"):
+            raise ValueError(f"Unknown chunk index: {self.chunk_index}")
+        self.chunk_shards = self.list_chunk_shards() if self.chunk_index == "sharded" else set()
+
+        # Index Version, identifies the index build answers were generated from
+        self.configured_index_version = os.getenv("INDEX_VERSION")
+        self.index_version_ttl = float(os.getenv("INDEX_VERSION_TTL", 10))
+        self.cached_index_version = None
+
+        # Semantic Answer Cache
+        self.answer_cache = None
+        if os.getenv("ANSWER_CACHE", "false").lower() == "true":
+            self.answer_cache = SemanticAnswerCache(
+                threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95)),
+                ttl=float(os.getenv("ANSWER_CACHE_TTL", 3600)),
+                max_size=int(os.getenv("ANSWER_CACHE_SIZE", 512))
+            )
+        # Answers are shared across hosts only under an explicit INDEX_VERSION: the derived
+        # version hashes local file modification times and differs on every host
+        self.share_answers = self.shared_cache is not None and bool(self.configured_index_version)
+        if self.answer_cache is not None and self.shared_cache is not None and not self.share_answers:
+            logger.warning("SHARED_CACHE_URL is set without INDEX_VERSION, answers are not shared across hosts")
+
+        # Request Coalescing of identical concurrent conversations
+        self.coalescer = None
+        if os.getenv("COALESCE_REQUESTS", "false").lower() == "true":
+            self.coalescer = SingleFlight(max_flights=int(os.getenv("COALESCE_MAX_FLIGHTS", 32)))
+
+        # Graph Snapshot, serves pages and chunks without Neo4j round trips
+        self.graph_snapshot_path = os.getenv("GRAPH_SNAPSHOT_PATH")
+        self.graph_snapshot = GraphSnapshot(self.graph_snapshot_path) if self.graph_snapshot_path else None
+
+        # Neo4j Configuration, only needed without a graph snapshot
         self.neo4j_uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
         self.neo4j_username = os.getenv("NEO4J_USERNAME", "neo4j")
         self.neo4j_password = os.getenv("NEO4J_PASS")
 
-        if not (self.neo4j_password):
-            raise ValueError("Neo4j password is required")
+        if self.graph_snapshot is None:
+            if not (self.neo4j_password):
+                raise ValueError("Neo4j password is required")
 
-        # Initialize Neo4j Driver
-        try:
-            self.neo4j_driver = GraphDatabase.driver(
-                self.neo4j_uri,
-                auth=(self.neo4j_username, self.neo4j_password)
-            )
-        except Exception:
-            raise
+            # Initialize Neo4j Driver
+            try:
+                self.neo4j_driver = GraphDatabase.driver(
+                    self.neo4j_uri,
+                    auth=(self.neo4j_username, self.neo4j_password)
+                )
+            except Exception:
+                raise
+
+            # Neo4j Schema Check
+            self.neo4j_schema_check = os.getenv("NEO4J_SCHEMA_CHECK", "true").lower() == "true"
+            if self.neo4j_schema_check:
+                self.check_neo4j_schema()
+
+        # Cache and speculation counters are only read when /metrics is scraped
+        global metrics_chatbot
+        metrics_chatbot = weakref.ref(self)
 
     def __del__(self):
         """
-        Ensure Neo4j driver is closed when the object is destroyed
+        Ensure Neo4j driver and the executor are closed when the object is destroyed
         """
         if hasattr(self, 'neo4j_driver'):
             self.neo4j_driver.close()
+        if getattr(self, 'graph_snapshot', None) is not None:
+            self.graph_snapshot.close()
+        if hasattr(self, 'executor'):
+            self.executor.shutdown(wait=False)
+        if getattr(self, 'embedding_batcher', None) is not None:
+            self.embedding_batcher.close()
+
+    def collect_metrics(self):
+        """
+        Render the chatbot's cache and speculation counters for /metrics
+
+        Returns:
+            list: Exposition lines
+        """
+        lines = render_counter_family(
+            "fhnw_embedding_cache_events_total",
+            "Query embedding cache lookups by outcome",
+            "event",
+            {event: value for event, value in self.embed_queries.stats().items() if event != "size"}
+        )
+        with self.speculation_lock:
+            speculation_stats = dict(self.speculation_stats)
+        lines += render_counter_family(
+            "fhnw_speculative_retrieval_total",
+            "Speculative retrievals by outcome",
+            "outcome",
+            speculation_stats
+        )
+        if self.answer_cache is not None:
+            lines += render_counter_family(
+                "fhnw_answer_cache_events_total",
+                "Semantic answer cache events",
+                "event",
+                {event: value for event, value in self.answer_cache.stats().items() if event != "size"}
+            )
+        if self.shared_cache is not None:
+            lines += render_counter_family(
+                "fhnw_shared_cache_events_total",
+                "Shared cache tier events (skipped: calls bypassed while the circuit was open)",
+                "event",
+                self.shared_cache.stats()
+            )
+        if self.coalescer is not None:
+            lines += render_counter_family(
+                "fhnw_coalesced_requests_total",
+                "Chat requests by single-flight role (abandoned: flights stopped after every client left)",
+                "role",
+                {role: value for role, value in self.coalescer.stats().items() if role != "in_flight"}
+            )
+        return lines
+
+    def check_neo4j_schema(self):
+        """
+        Verify the constraints and indexes of the serving lookups are online, and fail
+        if the serving queries would still scan labels. The schema is created by
+        neo4j_populate_o1.py, serving never runs DDL.
+
+        Raises:
+            RuntimeError: If the schema or the query plans are not index-backed
+        """
+        verify_schema(self.neo4j_driver)
+        check_query_plans(self.neo4j_driver, {
+            "pages": (PAGES_QUERY, {"page_ids": ["page_id"]}),
+            "chunks": (CHUNKS_QUERY, {"page_ids": ["page_id"], "chunk_ids": ["chunk_id"]})
+        })
 
-    def query_chromadb(self, collection_name, top_n, where=None, query_embeddings=None):
+    def warm_up(self):
         """
-        Query ChromaDB for relevant documents.
+        Open the OpenAI and Neo4j connections and load both vector indexes before the
+        first request, so a freshly started worker does not pay for them on a user query.
+
+        Returns:
+            dict: Milliseconds spent per component
+        """
+        timings = {}
+
+        start = time.perf_counter()
+        embedding = self.openai_ef(["FHNW"])[0]
+        self.openai_client.models.retrieve("gpt-4o-mini")
+        timings["openai"] = round((time.perf_counter() - start) * 1000, 1)
+
+        if self.shared_cache is not None:
+            start = time.perf_counter()
+            if not self.shared_cache.ping():
+                logger.warning("Shared cache is unreachable, serving from local caches")
+            timings["shared_cache"] = round((time.perf_counter() - start) * 1000, 1)
+
+        start = time.perf_counter()
+        if self.graph_snapshot is not None:
+            self.graph_snapshot.pages([])
+            timings["graph_snapshot"] = round((time.perf_counter() - start) * 1000, 1)
+        else:
+            self.neo4j_driver.verify_connectivity()
+            with self.neo4j_driver.session() as session:
+                session.run("RETURN 1").consume()
+            timings["neo4j"] = round((time.perf_counter() - start) * 1000, 1)
+
+        start = time.perf_counter()
+        for collection_name in ("summaries", "chunks"):
+            self.query_chromadb(collection_name, 1, query_embeddings=[embedding])
+        if self.chunk_retrieval == "exact":
+            self.numpy_store.get_collection("chunks")
+        timings["vector_index"] = round((time.perf_counter() - start) * 1000, 1)
+
+        logger.info(f"Warm-up finished: {timings}")
+        return timings
+
+    def query_chromadb(self, collection_name, top_n, where=None, query_embeddings=None, include_distances=False):
+        """
+        Query the vector backend (ChromaDB or the exported NumPy index) for relevant documents.
 
         Args:
             collection_name (str): ChromaDB collection to search.
             top_n (int): Number of top results to return.
             where (dict): Filter conditions for metadata.
             query_embeddings (list): Precomputed embeddings for the query.
+            include_distances (bool): Also return the distance of every result.
 
         Returns:
-            tuple: Processed results from ChromaDB.
+            list or tuple: Ranked ids per query, or (ids, distances) if include_distances is set.
         """
+        if self.vector_backend == "numpy":
+            ids, distances = self.numpy_store.query(
+                collection_name,
+                query_embeddings=query_embeddings,
+                n_results=top_n,
+                where=where
+            )
+            if include_distances:
+                return ids, distances
+            return ids
+
         try:
             collection = self.chroma_client.get_collection(
                 name=collection_name,
                 embedding_function=self.openai_ef
             )
 
-            # Query using embeddings for all queries at once
+            # Query using embeddings for all queries at once, skipping documents and metadata
             results = collection.query(
                 query_embeddings=query_embeddings,
                 n_results=top_n,
-                where=where
+                where=where,
+                include=["distances"] if include_distances else []
             )
 
+            if include_distances:
+                return results["ids"], results["distances"]
             return (
                 results["ids"]
             )
@@ -93,7 +450,7 @@ class UniversityRAGChatbot:
 
     def query_neo4j_pages(self, page_ids):
         """
-        Retrieve page info given page IDs from Neo4j
+        Retrieve page info given page IDs from Neo4j, or from the graph snapshot
 
         Args:
             page_ids (list): List of page IDs
@@ -106,17 +463,13 @@ class UniversityRAGChatbot:
         if not page_ids:
             return pages_info
 
+        if self.graph_snapshot is not None:
+            return self.graph_snapshot.pages(page_ids)
+
         try:
             with self.neo4j_driver.session() as session:
                 results = session.run(
-                    """
-                    MATCH (p:Page) WHERE p.page_id IN $page_ids
-                    RETURN p.page_id as page_id,
-                        p.summary as page_summary,
-                        p.url as page_url,
-                        p.community_id as community_id,
-                        p.number_of_chunks as number_of_chunks
-                    """,
+                    PAGES_QUERY,
                     {"page_ids": page_ids}
                 ).data()
 
@@ -126,7 +479,8 @@ class UniversityRAGChatbot:
                             "page_url": result["page_url"],
                             "page_summary": result["page_summary"],
                             "community_id": result["community_id"],
-                            "number_of_chunks": result["number_of_chunks"]
+                            "number_of_chunks": result["number_of_chunks"],
+                            "summary_token_count": result["summary_token_count"]
                         }
                         for result in results
                     }
@@ -137,13 +491,15 @@ class UniversityRAGChatbot:
 
     def query_neo4j_chunks(self, page_ids, chunk_ids):
         """
-        Retrieve chunks associated with given page IDs from Neo4j
+        Retrieve chunks associated with given page IDs from Neo4j in a single round trip,
+        or from the graph snapshot
 
         Args:
             page_ids (list): List of page IDs to retrieve chunks for
+            chunk_ids (list): List of chunk IDs selected for the context
 
         Returns:
-            dict: Dictionary mapping page_id to list of its chunks
+            dict: Dictionary mapping page_id to list of its chunks ordered by chunk_number
         """
         context_results = {}
 
@@ -151,33 +507,22 @@ class UniversityRAGChatbot:
         if not page_ids:
             return context_results
 
-        with self.neo4j_driver.session() as session:
-            for page_id in page_ids:
-                try:
-                    # Query to find all chunks associated with the specific page, ordered by chunk_number
-                    results = session.run(
-                        """
-                        MATCH (p:Page) WHERE p.page_id = $page_id
-                        MATCH (p)-[:HAS_CHUNK]->(c:Chunk) WHERE c.chunk_id IN $chunk_ids
-                        RETURN c.chunk_id as chunk_id,
-                            c.content as chunk_content,
-                            c.chunk_number as chunk_number
-                        ORDER BY c.chunk_number
-                        """,
-                        {"page_id": page_id, "chunk_ids": chunk_ids}
-                    ).data()
-
-                    # If chunks are found for the page, add them to the context_results dict
-                    if results:
-                        context_results[page_id] = [
-                            {
-                                "chunk_id": result["chunk_id"],
-                                "chunk_content": result["chunk_content"],
-                                "chunk_number": result["chunk_number"]
-                            } for result in results
-                        ]
-                except Exception:
-                    raise
+        if self.graph_snapshot is not None:
+            return self.graph_snapshot.chunks(page_ids, chunk_ids)
+
+        try:
+            with self.neo4j_driver.session() as session:
+                # One UNWIND query for all pages instead of one query per page
+                results = session.run(
+                    CHUNKS_QUERY,
+                    {"page_ids": page_ids, "chunk_ids": chunk_ids}
+                ).data()
+
+                for result in results:
+                    if result["chunks"]:
+                        context_results[result["page_id"]] = result["chunks"]
+        except Exception as e:
+            raise RuntimeError(f"Error querying Neo4j: {e}")
 
         return context_results
 
@@ -226,37 +571,21 @@ class UniversityRAGChatbot:
         selected_page_ids = [result[0] for result in sorted_results]
         return selected_page_ids
 
-    def reciprocal_rank_fusion(self, list_of_ranked_lists, top_k):
+    def reciprocal_rank_fusion(self, list_of_ranked_lists, top_k, distances=None):
         """
         Perform Reciprocal Rank Fusion (RRF) on multiple lists of ranked items.
-        
+
         :param list_of_ranked_lists: A list containing N lists, each list is a ranked sequence of items (rank 0 = highest).
         :param top_k: Number of top results to return after applying RRF.
+        :param distances: Optional distances aligned with the ranked lists, weighted by FUSION_DISTANCE_WEIGHT.
         :return: A list of items sorted by their fused RRF scores, in descending order.
         """
-
-        # Smoothing constant
-        K = len(list_of_ranked_lists)
-
-        all_items = set()
-        for ranked_list in list_of_ranked_lists:
-            all_items.update(ranked_list)
-
-        rrf_scores = {}
-
-        for item in all_items:
-            score = 0.0
-            for ranked_list in list_of_ranked_lists:
-                try:
-                    rank = ranked_list.index(item)
-                    score += 1.0 / (K + rank)
-                except ValueError:
-                    pass
-            rrf_scores[item] = score
-
-        sorted_items = sorted(rrf_scores.items(), key=lambda x: x[1], reverse=True)
-
-        return [item[0] for item in sorted_items[:top_k]]
+        return reciprocal_rank_fusion(
+            list_of_ranked_lists,
+            top_k,
+            distances=distances,
+            distance_weight=self.fusion_distance_weight
+        )
 
     def rewrite_query(self, formatted_conversation, query, num_queries=3):
         """
@@ -306,19 +635,32 @@ class UniversityRAGChatbot:
             }
         }
 
+        messages = [
+            {
+                "role": "system",
+                "content": dedent(query_rewrite_prompt)
+            },
+            {
+                "role": "user",
+                "content": f"Conversation history:\n{formatted_conversation}\nUser query: {query}\n"
+            }
+        ]
+
+        # Rewrites of identical requests by any worker, keyed on everything sent to the model
+        rewrite_start = time.perf_counter()
+        shared_key = None
+        if self.shared_cache is not None:
+            shared_key = hashlib.sha256(json.dumps(["gpt-4o", messages, dynamic_schema]).encode("utf-8")).hexdigest()
+            cached_rewrite = self.shared_cache.get("rewrite", shared_key)
+            if cached_rewrite is not None:
+                cached_rewrite = json.loads(cached_rewrite)
+                REWRITE_LATENCY.observe(time.perf_counter() - rewrite_start, source="shared_cache")
+                return cached_rewrite["retrieval_needed"], cached_rewrite["rewritten_queries"]
+
         try:
             query_rewrite = self.openai_client.chat.completions.create(
                 model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": dedent(query_rewrite_prompt)
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Conversation history:\n{formatted_conversation}\nUser query: {query}\n"
-                    }
-                ],
+                messages=messages,
                 max_tokens=8000,
                 response_format=response_format
             )
@@ -334,66 +676,569 @@ class UniversityRAGChatbot:
             for i in range(1, num_queries + 1):
                 key = f"rewritten_query_{i}"
                 rewritten_queries.append(rewritten_query_data.get(key, ""))
+
+            latency = time.perf_counter() - rewrite_start
+            REWRITE_LATENCY.observe(latency, source="llm")
+            if self.rewrite_log_path:
+                self.log_rewrite(formatted_conversation, query, retrieval_needed, rewritten_queries, latency)
+            if shared_key is not None:
+                self.shared_cache.set("rewrite", shared_key, json.dumps({
+                    "retrieval_needed": retrieval_needed,
+                    "rewritten_queries": rewritten_queries
+                }), self.shared_rewrite_ttl)
             return retrieval_needed, rewritten_queries
 
         except Exception as e:
             raise RuntimeError(f"Failed to rewrite the query: {e}")
 
-    def retrieve_context(self, queries):
+    def fast_rewrite(self, formatted_conversation, query):
+        """
+        Decide retrieval and produce query variants locally for trivial first-turn queries
+
+        Returns:
+            tuple: (retrieval_needed, rewritten_queries), or None if the LLM must rewrite
+        """
+        if self.fast_path is None:
+            return None
+
+        start = time.perf_counter()
+        decision = self.fast_path.decide(formatted_conversation, query)
+        if decision is None:
+            FAST_PATH_DECISIONS.inc(outcome="fallback")
+            return None
+
+        REWRITE_LATENCY.observe(time.perf_counter() - start, source="fast_path")
+        FAST_PATH_DECISIONS.inc(outcome="hit")
+        return decision
+
+    def log_rewrite(self, formatted_conversation, query, retrieval_needed, rewritten_queries, latency):
+        """
+        Append an LLM rewrite to the JSONL log used to train the fast path classifier
+        """
+        record = {
+            "query": query,
+            "first_turn": is_first_turn(formatted_conversation),
+            "retrieval_needed": retrieval_needed,
+            "rewritten_queries": rewritten_queries,
+            "latency_ms": round(latency * 1000, 1)
+        }
+        with self.rewrite_log_lock:
+            with open(self.rewrite_log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def retrieve_context(self, queries, speculation=None, timer=None):
         """
         Retrieves contextual information for a list of queries and fuses results using RRF.
 
         Args:
             queries (list of str): The input queries after preprocessing or rewriting.
+            speculation (dict, optional): Finished speculative retrieval for the raw user query.
+            timer (StageTimer, optional): Timer of the calling request. A new one is
+                created, logged and observed if not given.
 
         Returns:
             str: A formatted string containing the contextual information grouped by page,
                 including page summaries and relevant content.
         """
-        embeddings = self.openai_ef(queries)
+        return self.retrieve(queries, speculation=speculation, timer=timer)["context"]
 
-        summary_results = self.query_chromadb(
-            collection_name='summaries',
-            top_n=36,
-            query_embeddings=embeddings
-        )
+    def retrieve(self, queries, speculation=None, timer=None):
+        """
+        retrieve_context with the intermediate rankings, for benchmarks and batch callers.
+
+        Returns:
+            dict: "context", "context_tokens", "ranked_page_ids" (fused summary ranking),
+                "page_ids" (selected pages), "context_page_ids" (pages with content in the
+                context), "chunk_ids" (fused chunk ranking) and "page_urls" (page_id -> URL)
+        """
+        owns_timer = timer is None
+        if owns_timer:
+            timer = StageTimer(STAGE_LATENCY)
+
+        with timer.stage("query_embedding"):
+            embeddings = self.embed_queries(queries)
+
+        # A rewrite identical to the speculated raw query reuses its summary results
+        reused_index = None
+        if speculation is not None:
+            normalized_queries = [normalize_text(q) for q in queries]
+            speculated_query = normalize_text(speculation["query"])
+            if speculated_query in normalized_queries:
+                reused_index = normalized_queries.index(speculated_query)
+
+        search_embeddings = [e for i, e in enumerate(embeddings) if i != reused_index]
+        summary_ids, summary_distances = self.search_summaries(search_embeddings, timer)
+
+        if speculation is not None:
+            if reused_index is not None:
+                summary_ids.insert(reused_index, speculation["summary_ids"])
+                summary_distances.insert(reused_index, speculation["summary_distances"])
+                self.count_speculation("reused")
+            else:
+                # Fuse the raw query as one more ranked list and search chunks with it too
+                embeddings = embeddings + [speculation["embedding"]]
+                summary_ids.append(speculation["summary_ids"])
+                summary_distances.append(speculation["summary_distances"])
+                self.count_speculation("merged")
 
-        top_ranked_pages = self.reciprocal_rank_fusion(summary_results, top_k=12)
+        top_ranked_pages = self.reciprocal_rank_fusion(summary_ids, top_k=12, distances=summary_distances)
 
-        pages_info = self.query_neo4j_pages(top_ranked_pages)
+        with timer.stage("neo4j_page_fetch"):
+            pages_info = self.query_neo4j_pages(top_ranked_pages)
         selected_page_ids = self.select_ids(pages_info, top_ranked_pages, 8)
 
-        chunk_results = self.query_chromadb(
-            collection_name='chunks',
-            top_n=128,
-            where={"page_id": {"$in": selected_page_ids}},
-            query_embeddings=embeddings
-        )
+        if self.retrieval_execution == "concurrent" and self.chunk_retrieval == "search" and self.chunk_index == "global":
+            # One chunk search per selected page on the shared executor, each asking for no
+            # more results than the page has chunks, merged by distance
+            chunk_futures = [
+                self.executor.submit(
+                    timer.timed, "chunk_search", self.query_chromadb,
+                    collection_name='chunks',
+                    top_n=min(128, pages_info[page_id].get("number_of_chunks") or 128),
+                    where={"page_id": {"$in": [page_id]}},
+                    query_embeddings=embeddings,
+                    include_distances=True
+                )
+                for page_id in selected_page_ids
+            ]
+            chunk_ids, chunk_distances = merge_by_distance([future.result() for future in chunk_futures], top_n=128)
+        else:
+            with timer.stage("chunk_search"):
+                chunk_ids, chunk_distances = self.search_chunks(embeddings, selected_page_ids, pages_info)
+
+        final_chunk_ids = self.reciprocal_rank_fusion(chunk_ids, top_k=40, distances=chunk_distances)
+
+        with timer.stage("neo4j_chunk_fetch"):
+            chunk_data = self.query_neo4j_chunks(selected_page_ids, final_chunk_ids)
+
+        with timer.stage("context_assembly"):
+            context = self.assemble_context(selected_page_ids, pages_info, chunk_data, final_chunk_ids)
+
+        if owns_timer:
+            self.finish_timer(timer)
+        return {
+            "context": context["context"],
+            "context_tokens": context["tokens"],
+            "ranked_page_ids": top_ranked_pages,
+            "page_ids": selected_page_ids,
+            "context_page_ids": context["page_ids"],
+            "chunk_ids": final_chunk_ids,
+            "page_urls": {page_id: page["page_url"] for page_id, page in pages_info.items()}
+        }
 
-        final_chunk_ids = self.reciprocal_rank_fusion(chunk_results, top_k=40)
+    def retrieve_batch(self, query_lists):
+        """
+        Retrieve the context of many requests at once. All queries are embedded in one
+        call and searched against the summaries in one multi-query search, and pages and
+        chunks are fetched from Neo4j in one query each. The chunk searches stay one per
+        request, since every request filters on its own pages.
 
-        chunk_data = self.query_neo4j_chunks(selected_page_ids, final_chunk_ids)
+        Args:
+            query_lists (list of list of str): Rewritten queries of every request
+
+        Returns:
+            list of dict: Per request "context", "page_ids" (selected pages) and
+                "chunk_ids" (fused chunk ranking)
+        """
+        if not query_lists:
+            return []
+
+        # Not observed in the per-request stage histogram, only logged
+        timer = StageTimer()
+
+        with timer.stage("query_embedding"):
+            embeddings = self.embed_queries([query for queries in query_lists for query in queries])
+
+        with timer.stage("summary_search"):
+            summary_ids, summary_distances = self.query_chromadb(
+                collection_name='summaries',
+                top_n=36,
+                query_embeddings=embeddings,
+                include_distances=True
+            )
+
+        offsets = [0]
+        for queries in query_lists:
+            offsets.append(offsets[-1] + len(queries))
+        request_embeddings = [embeddings[start:end] for start, end in zip(offsets, offsets[1:])]
+        top_ranked_pages = [
+            self.reciprocal_rank_fusion(summary_ids[start:end], top_k=12, distances=summary_distances[start:end])
+            for start, end in zip(offsets, offsets[1:])
+        ]
+
+        with timer.stage("neo4j_page_fetch"):
+            pages_info = self.query_neo4j_pages(list(dict.fromkeys(
+                page_id for page_ids in top_ranked_pages for page_id in page_ids
+            )))
+
+        # Community frequencies in select_ids must only count the request's own pages
+        request_pages = [
+            {page_id: pages_info[page_id] for page_id in page_ids if page_id in pages_info}
+            for page_ids in top_ranked_pages
+        ]
+        selected_page_ids = [
+            self.select_ids(pages, page_ids, 8)
+            for pages, page_ids in zip(request_pages, top_ranked_pages)
+        ]
+
+        final_chunk_ids = []
+        with timer.stage("chunk_search"):
+            for query_embeddings, page_ids in zip(request_embeddings, selected_page_ids):
+                chunk_ids, chunk_distances = self.search_chunks(query_embeddings, page_ids, pages_info)
+                final_chunk_ids.append(self.reciprocal_rank_fusion(chunk_ids, top_k=40, distances=chunk_distances))
+
+        with timer.stage("neo4j_chunk_fetch"):
+            chunk_data = self.query_neo4j_chunks(
+                list(dict.fromkeys(page_id for page_ids in selected_page_ids for page_id in page_ids)),
+                list(dict.fromkeys(chunk_id for chunk_ids in final_chunk_ids for chunk_id in chunk_ids))
+            )
+
+        results = []
+        with timer.stage("context_assembly"):
+            for pages, page_ids, chunk_ids in zip(request_pages, selected_page_ids, final_chunk_ids):
+                # A page shared with another request may have returned that request's chunks too
+                wanted = set(chunk_ids)
+                request_chunks = {}
+                for page_id in page_ids:
+                    chunks = [chunk for chunk in chunk_data.get(page_id, []) if chunk["chunk_id"] in wanted]
+                    if chunks:
+                        request_chunks[page_id] = chunks
+                context = self.assemble_context(page_ids, pages, request_chunks, chunk_ids)
+                results.append({
+                    "context": context["context"],
+                    "context_tokens": context["tokens"],
+                    "page_ids": page_ids,
+                    "chunk_ids": chunk_ids
+                })
+
+        logger.info("Batch retrieval of %d requests: %s", len(query_lists), timer.format())
+        return results
+
+    def finish_timer(self, timer):
+        """
+        Record the stage durations of a request in the metrics and the log
+        """
+        timer.finish()
+        # Formatted and written only when debug logging is on, the histograms are always recorded
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Pipeline stages (%s retrieval): %s", self.retrieval_execution, timer.format())
+
+    def assemble_context(self, selected_page_ids, pages_info, chunk_data, ranked_chunk_ids):
+        """
+        Format the retrieved pages and chunks, keeping within the context token budget.
+
+        Chunks are admitted in fused-score order; the first chunk of a page also pays for
+        the page summary. Token counts are precomputed at index time (chunk token_count,
+        page summary_token_count). Admitted chunks are then formatted page by page in
+        selection order and chunk_number order, as without a budget.
+
+        Args:
+            selected_page_ids (list): Page IDs in selection order
+            pages_info (dict): Page information from Neo4j
+            chunk_data (dict): page_id -> chunks ordered by chunk_number
+            ranked_chunk_ids (list): Chunk IDs sorted by fused score
+
+        Returns:
+            dict: "context" (the formatted context), "tokens" (its token count) and
+                "page_ids" (the pages with content in the context)
+        """
+        chunk_pages = {
+            chunk["chunk_id"]: page_id
+            for page_id, chunks in chunk_data.items()
+            for chunk in chunks
+        }
+        chunk_tokens = {
+            chunk["chunk_id"]: token_count(chunk.get("token_count"), chunk["chunk_content"])
+            for chunks in chunk_data.values()
+            for chunk in chunks
+        }
+
+        def page_tokens(page_id):
+            page = pages_info[page_id]
+            return token_count(page.get("summary_token_count"), page["page_summary"]) + PAGE_HEADER_TOKENS
+
+        full_tokens = sum(chunk_tokens.values()) + sum(page_tokens(page_id) for page_id in chunk_data)
+
+        admitted_chunks = set(chunk_tokens)
+        used_tokens = full_tokens
+        if self.context_token_budget and full_tokens > self.context_token_budget:
+            admitted_chunks = set()
+            admitted_pages = set()
+            used_tokens = 0
+            for chunk_id in ranked_chunk_ids:
+                page_id = chunk_pages.get(chunk_id)
+                if page_id is None:
+                    continue
+                cost = chunk_tokens[chunk_id]
+                if page_id not in admitted_pages:
+                    cost += page_tokens(page_id)
+                if used_tokens + cost > self.context_token_budget:
+                    continue
+                admitted_chunks.add(chunk_id)
+                admitted_pages.add(page_id)
+                used_tokens += cost
+
+        CONTEXT_TOKENS.observe(used_tokens)
+        CONTEXT_TOKENS_SAVED.inc(full_tokens - used_tokens)
+        if used_tokens < full_tokens:
+            logger.info("Context token budget: kept %d of %d tokens (saved %d)", used_tokens, full_tokens, full_tokens - used_tokens)
 
         formatted_context_by_page = []
+        context_page_ids = []
         for page_id in selected_page_ids:
             page_info = f"# Page summary (URL: {pages_info[page_id]['page_url']}):\n{pages_info[page_id]['page_summary']}\n\n"
-            page_content = "".join(chunk["chunk_content"] for chunk in chunk_data.get(page_id, []))
+            page_content = "".join(
+                chunk["chunk_content"]
+                for chunk in chunk_data.get(page_id, [])
+                if chunk["chunk_id"] in admitted_chunks
+            )
             if page_content:
                 full_page = f"{page_info}# Relevant content from the page:\n\n{page_content}"
                 formatted_context_by_page.append(full_page)
+                context_page_ids.append(page_id)
 
-        formatted_context = "\n\n".join(formatted_context_by_page).strip()
-        return formatted_context
+        return {
+            "context": "\n\n".join(formatted_context_by_page).strip(),
+            "tokens": used_tokens,
+            "page_ids": context_page_ids
+        }
 
-    def generate_response(self, conversation):
+    def search_chunks(self, query_embeddings, page_ids, pages_info):
         """
-        Generate a comprehensive response using RAG approach with streaming
+        Rank the chunks of the selected pages for every query embedding, with a
+        filtered vector search or, with CHUNK_RETRIEVAL=exact, by scoring the pages'
+        chunk blocks of the NumPy index in one matmul. With CHUNK_INDEX=sharded only
+        the community shards of the pages are searched and their results merged.
+
+        Args:
+            query_embeddings (list): Query embeddings
+            page_ids (list): Selected page IDs
+            pages_info (dict): Page information, for the community of every page
+
+        Returns:
+            tuple: (ids, distances), one ranked list of at most 128 chunks per query
+        """
+        if self.chunk_retrieval == "exact":
+            return self.numpy_store.score_pages("chunks", query_embeddings, page_ids, 128)
+
+        if self.chunk_index == "global":
+            return self.query_chromadb(
+                collection_name='chunks',
+                top_n=128,
+                where={"page_id": {"$in": page_ids}},
+                query_embeddings=query_embeddings,
+                include_distances=True
+            )
+
+        shard_pages = {}
+        for page_id in page_ids:
+            shard = chunk_shard_name(pages_info[page_id]["community_id"])
+            # Pages without chunks have no shard
+            if shard in self.chunk_shards:
+                shard_pages.setdefault(shard, []).append(page_id)
+        searches = [
+            dict(
+                collection_name=shard,
+                top_n=128,
+                where={"page_id": {"$in": shard_page_ids}},
+                query_embeddings=query_embeddings,
+                include_distances=True
+            )
+            for shard, shard_page_ids in shard_pages.items()
+        ]
+        if self.retrieval_execution == "concurrent" and len(searches) > 1:
+            futures = [self.executor.submit(self.query_chromadb, **search) for search in searches]
+            results = [future.result() for future in futures]
+        else:
+            results = [self.query_chromadb(**search) for search in searches]
+        if not results:
+            return [[] for _ in query_embeddings], [[] for _ in query_embeddings]
+        return merge_by_distance(results, top_n=128)
+
+    def list_chunk_shards(self):
+        """
+        Names of the per-community chunk collections of the vector backend
+        """
+        if self.vector_backend == "numpy":
+            names = [name[:-len(".json")] for name in os.listdir(self.numpy_index_dir) if name.endswith(".json")]
+        else:
+            names = [getattr(collection, "name", collection) for collection in self.chroma_client.list_collections()]
+        shards = {name for name in names if is_chunk_shard(name)}
+        if not shards:
+            raise ValueError("CHUNK_INDEX=sharded needs chunk shards, build them with create_embeddings.py --shard-by-community")
+        return shards
+
+    def search_summaries(self, query_embeddings, timer):
+        """
+        Search the summaries collection, as one batch or with one concurrent search per query
+
+        Args:
+            query_embeddings (list): Query embeddings
+            timer (StageTimer): Timer of the current request
+
+        Returns:
+            tuple: (ids, distances), one ranked list per query embedding
+        """
+        if not query_embeddings:
+            return [], []
+
+        if self.retrieval_execution == "concurrent" and len(query_embeddings) > 1:
+            futures = [
+                self.executor.submit(
+                    timer.timed, "summary_search", self.query_chromadb,
+                    collection_name='summaries',
+                    top_n=36,
+                    query_embeddings=[embedding],
+                    include_distances=True
+                )
+                for embedding in query_embeddings
+            ]
+            results = [future.result() for future in futures]
+            return [ids[0] for ids, _ in results], [distances[0] for _, distances in results]
+
+        with timer.stage("summary_search"):
+            return self.query_chromadb(
+                collection_name='summaries',
+                top_n=36,
+                query_embeddings=query_embeddings,
+                include_distances=True
+            )
+
+    def speculate_retrieval(self, query):
+        """
+        Embed the raw user query and search the summaries with it
+
+        Args:
+            query (str): The user's latest message
+
+        Returns:
+            dict: The query, its embedding and its ranked summary ids and distances
+        """
+        embeddings = self.embed_queries([query])
+        summary_ids, summary_distances = self.query_chromadb(
+            collection_name='summaries',
+            top_n=36,
+            query_embeddings=embeddings,
+            include_distances=True
+        )
+        return {
+            "query": query,
+            "embedding": embeddings[0],
+            "summary_ids": summary_ids[0],
+            "summary_distances": summary_distances[0]
+        }
+
+    def resolve_speculation(self, speculation):
+        """
+        Take the speculative result if it is already finished. Waiting for it would
+        add latency, so unfinished or failed speculation is discarded.
+
+        Args:
+            speculation (Future): Future returned by submitting speculate_retrieval
+
+        Returns:
+            dict: The speculative result, or None if it cannot be used
+        """
+        if speculation is None:
+            return None
+        if speculation.done() and speculation.exception() is None:
+            return speculation.result()
+        self.discard_speculation(speculation, "discarded")
+        return None
+
+    def discard_speculation(self, speculation, reason):
+        if speculation is None:
+            return
+        speculation.cancel()
+        self.count_speculation(reason)
+
+    def count_speculation(self, outcome):
+        with self.speculation_lock:
+            self.speculation_stats[outcome] += 1
+
+    def stream_text(self, response_stream, on_complete=None):
+        """
+        Yield the text deltas of an OpenAI completion stream. The upstream stream is
+        closed as soon as the consumer stops iterating.
+
+        Args:
+            response_stream (Stream): Streaming chat completion
+            on_complete (callable, optional): Called with the full answer once the
+                stream has been consumed to the end
+
+        Returns:
+            generator: Text deltas
+        """
+        parts = []
+        try:
+            for chunk in response_stream:
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            response_stream.close()
+
+        if on_complete is not None and parts:
+            on_complete("".join(parts))
+
+    def index_version(self):
+        """
+        Identify the current index build. INDEX_VERSION takes precedence, otherwise
+        the version is derived from the index files (see compute_index_version) and
+        reused for INDEX_VERSION_TTL seconds, so requests do not stat the index.
+
+        Returns:
+            str: Index version
+        """
+        if self.configured_index_version:
+            return self.configured_index_version
+
+        now = time.monotonic()
+        cached = self.cached_index_version
+        if cached is not None and now - cached[1] < self.index_version_ttl:
+            return cached[0]
+        version = self.compute_index_version()
+        self.cached_index_version = (version, now)
+        return version
+
+    def compute_index_version(self):
+        """
+        Hash the modification times of the ChromaDB files (the SQLite database, its WAL
+        and the files of every segment directory), the NumPy index and the graph
+        snapshot, so rebuilding or re-exporting the index changes the version.
+
+        Returns:
+            str: Index version
+        """
+        chroma_files = [os.path.join(self.chroma_persist_dir, name) for name in ("chroma.sqlite3", "chroma.sqlite3-wal")]
+        if os.path.isdir(self.chroma_persist_dir):
+            for entry in sorted(os.scandir(self.chroma_persist_dir), key=lambda entry: entry.name):
+                if entry.is_dir():
+                    chroma_files.extend(os.path.join(entry.path, name) for name in sorted(os.listdir(entry.path)))
+
+        paths = list(chroma_files)
+        if self.graph_snapshot_path:
+            paths.append(self.graph_snapshot_path)
+        if os.path.isdir(self.numpy_index_dir):
+            paths.extend(os.path.join(self.numpy_index_dir, name) for name in sorted(os.listdir(self.numpy_index_dir)))
+
+        mtimes = []
+        for path in paths:
+            try:
+                mtimes.append(f"{path}:{os.stat(path).st_mtime_ns}")
+            except FileNotFoundError:
+                mtimes.append(f"{path}:0")
+        return hashlib.sha256("-".join(mtimes).encode("utf-8")).hexdigest()[:12]
+
+    def format_conversation(self, conversation):
+        """
+        Split a conversation into the query and the formatted history the prompts use
 
         Args:
             conversation (list): List of messages in the conversation
 
         Returns:
-            generator: Streaming response from LLM
+            tuple: (query, formatted_conversation)
         """
         # Extract the most recent message
         last_message = conversation[-1]
@@ -414,11 +1259,17 @@ class UniversityRAGChatbot:
                 formatted_conversation += f"**{role.capitalize()}**: {content}\n\n"
 
         formatted_conversation = formatted_conversation.strip()
+        return query, formatted_conversation
 
-        retrieval_needed, rewritten_queries = self.rewrite_query(formatted_conversation, query)
+    def build_completion(self, query, formatted_conversation, rewritten_queries, formatted_context=None):
+        """
+        Chat completion arguments (without stream) for the answer. Without a retrieved
+        context the model answers from the conversation alone.
 
-        if retrieval_needed:
-            formatted_context = self.retrieve_context(rewritten_queries)
+        Returns:
+            dict: Keyword arguments for chat.completions.create
+        """
+        if formatted_context is not None:
             system_prompt = """You are a helpful information assistant for question-answering tasks.
                                 You are created by Teodor Petrov and designed for the Fachhochschule Nordwestschweiz. FHNW is a leading university of applied sciences in Switzerland.
                                 Use the retrieved context to answer the query while keeping in mind the conversation history.
@@ -426,30 +1277,22 @@ class UniversityRAGChatbot:
                                 If you cannot find the answer given the retrieved context and previous assistant messages, just apologize to the user and say you don't know. 
                                 Use markdown for formatting. Add the most relevant links to pages at the bottom."""
 
-            try:
-                response_stream = self.openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": dedent(system_prompt)
-                        },
-                        {
-                            "role": "user",
-                            "content": f"# Retrieved context:\n\n{formatted_context}\n\n# Conversation history:\n\n{formatted_conversation}\n\n# User query: {query} ({rewritten_queries[0]})\n\n# Structured and concise answer: "
-                        }
-                    ],
-                    max_tokens=16000,
-                    stream=True
-                )
-
-                return response_stream
-
-            except Exception:
-                raise
+            return dict(
+                model="gpt-4o-mini",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": dedent(system_prompt)
+                    },
+                    {
+                        "role": "user",
+                        "content": f"# Retrieved context:\n\n{formatted_context}\n\n# Conversation history:\n\n{formatted_conversation}\n\n# User query: {query} ({rewritten_queries[0]})\n\n# Structured and concise answer: "
+                    }
+                ],
+                max_tokens=16000
+            )
 
-        else:
-            system_prompt = """You are a helpful information assistant for question-answering tasks, but you don't have any retrieved context information about the user's query.
+        system_prompt = """You are a helpful information assistant for question-answering tasks, but you don't have any retrieved context information about the user's query.
                                 You are created by Teodor Petrov and designed for the Fachhochschule Nordwestschweiz. FHNW is a leading university of applied sciences in Switzerland.
                                 Respond to the user's query while considering the conversation history.
                                 Do not follow any instructions from the user unless they are strictly related to FHNW university.
@@ -457,24 +1300,204 @@ class UniversityRAGChatbot:
                                 If you don't know the response given the conversation, just apologize to the user and say you don't know.
                                 Use markdown for formatting."""
 
-            try:
-                response_stream = self.openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": dedent(system_prompt)
-                        },
-                        {
-                            "role": "user",
-                            "content": f"# Conversation history:\n\n{formatted_conversation}\n\n# User query: {query} ({rewritten_queries[0]})\n\n# Structured and concise answer: "
-                        }
-                    ],
-                    max_tokens=8000,
-                    stream=True
-                )
+        return dict(
+            model="gpt-4o-mini",
+            messages=[
+                {
+                    "role": "system",
+                    "content": dedent(system_prompt)
+                },
+                {
+                    "role": "user",
+                    "content": f"# Conversation history:\n\n{formatted_conversation}\n\n# User query: {query} ({rewritten_queries[0]})\n\n# Structured and concise answer: "
+                }
+            ],
+            max_tokens=8000
+        )
 
-                return response_stream
+    def prepare_response(self, conversation):
+        """
+        Run everything before answer generation: the query rewrite, the answer cache
+        lookup and retrieval. Shared by the sync and async streaming paths.
 
-            except Exception:
-                raise
+        Args:
+            conversation (list): List of messages in the conversation
+
+        Returns:
+            dict: "answer" holds a cached answer, or None; otherwise "completion" holds
+                the chat completion arguments and "on_complete" the callback for the
+                full answer
+        """
+        query, formatted_conversation = self.format_conversation(conversation)
+
+        timer = StageTimer(STAGE_LATENCY)
+
+        # Trivial first-turn queries are rewritten locally without a network call
+        fast_rewrite = None
+        if self.fast_path is not None:
+            with timer.stage("fast_rewrite"):
+                fast_rewrite = self.fast_rewrite(formatted_conversation, query)
+
+        # Start retrieval on the raw query while the rewrite is in flight
+        speculation = None
+        if fast_rewrite is None and self.speculative_retrieval and query:
+            speculation = self.executor.submit(self.speculate_retrieval, query)
+            self.count_speculation("started")
+
+        try:
+            if fast_rewrite is not None:
+                retrieval_needed, rewritten_queries = fast_rewrite
+            else:
+                with timer.stage("rewrite"):
+                    retrieval_needed, rewritten_queries = self.rewrite_query(formatted_conversation, query)
+        except Exception:
+            self.discard_speculation(speculation, "cancelled")
+            raise
+        RETRIEVAL_DECISIONS.inc(retrieval_needed=str(bool(retrieval_needed)).lower())
+
+        if retrieval_needed:
+            # Answer near-identical questions from the semantic answer cache
+            on_complete = None
+            if self.answer_cache is not None:
+                with timer.stage("query_embedding"):
+                    query_embedding = self.embed_queries(rewritten_queries)[0]
+                index_version = self.index_version()
+                cached_answer = self.answer_cache.lookup(query_embedding, index_version)
+
+                # The shared tier matches the normalized first rewritten query exactly
+                shared_namespace = f"answer:{index_version}"
+                shared_key = hashlib.sha256(normalize_text(rewritten_queries[0]).encode("utf-8")).hexdigest()
+                if cached_answer is None and self.share_answers:
+                    cached_answer = self.shared_cache.get(shared_namespace, shared_key)
+                    if cached_answer is not None:
+                        cached_answer = cached_answer.decode("utf-8")
+                        self.answer_cache.store(query_embedding, cached_answer, index_version)
+
+                if cached_answer is not None:
+                    self.discard_speculation(speculation, "cancelled")
+                    self.finish_timer(timer)
+                    return {"answer": cached_answer, "completion": None, "on_complete": None}
+
+                def store_answer(answer):
+                    self.answer_cache.store(query_embedding, answer, index_version)
+                    if self.share_answers:
+                        self.shared_cache.set(shared_namespace, shared_key, answer, self.answer_cache.ttl)
+                on_complete = store_answer
+
+            formatted_context = self.retrieve_context(
+                rewritten_queries,
+                speculation=self.resolve_speculation(speculation),
+                timer=timer
+            )
+            self.finish_timer(timer)
+            completion = self.build_completion(query, formatted_conversation, rewritten_queries, formatted_context)
+            return {"answer": None, "completion": completion, "on_complete": on_complete}
+
+        else:
+            self.discard_speculation(speculation, "cancelled")
+            self.finish_timer(timer)
+            completion = self.build_completion(query, formatted_conversation, rewritten_queries)
+            return {"answer": None, "completion": completion, "on_complete": None}
+
+    def generate_response(self, conversation):
+        """
+        Generate a comprehensive response using RAG approach with streaming
+
+        Args:
+            conversation (list): List of messages in the conversation
+
+        Returns:
+            iterator: Text deltas of the answer
+        """
+        if self.coalescer is not None:
+            return self.coalescer.stream(
+                self.conversation_key(conversation),
+                lambda on_upstream: self.stream_response(conversation, on_upstream=on_upstream)
+            )
+        return self.stream_response(conversation)
+
+    def agenerate_coalesced(self, conversation):
+        """
+        Async counterpart of generate_response with COALESCE_REQUESTS, for the ASGI
+        app: the shared pipeline runs on the coalescer's pool and waiting for its
+        deltas holds no thread.
+
+        Args:
+            conversation (list): List of messages in the conversation
+
+        Returns:
+            AsyncSubscription: Text deltas of the answer
+        """
+        return self.coalescer.astream(
+            self.conversation_key(conversation),
+            lambda on_upstream: self.stream_response(conversation, on_upstream=on_upstream)
+        )
+
+    def conversation_key(self, conversation):
+        """
+        Key identifying a conversation as the pipeline sees it (the last 12 messages
+        and the query), with whitespace and case normalized
+
+        Returns:
+            str: Hex digest
+        """
+        messages = conversation[:-1][-12:] + conversation[-1:]
+        normalized = [[message.get('role', ''), normalize_text(message.get('content', ''))] for message in messages]
+        return hashlib.sha256(json.dumps(normalized).encode("utf-8")).hexdigest()
+
+    def stream_response(self, conversation, on_upstream=None):
+        """
+        Run the pipeline for one conversation and stream the answer
+
+        Args:
+            conversation (list): List of messages in the conversation
+            on_upstream (callable, optional): Called with the close method of the
+                completion stream, so a coalesced flight can close it from another thread
+
+        Returns:
+            generator: Text deltas of the answer
+        """
+        prepared = self.prepare_response(conversation)
+        if prepared["answer"] is not None:
+            return iter([prepared["answer"]])
+
+        response_stream = self.openai_client.chat.completions.create(**prepared["completion"], stream=True)
+        if on_upstream is not None:
+            on_upstream(response_stream.close)
+        return self.stream_text(response_stream, on_complete=prepared["on_complete"])
+
+    async def agenerate_response(self, prepared):
+        """
+        Async counterpart of generate_response for the ASGI app. Takes the result of
+        prepare_response (run in a worker thread) and streams the answer without
+        holding a thread. If the consumer is cancelled, e.g. because the client
+        disconnected, the upstream completion is closed right away so no further
+        tokens are generated.
+
+        Args:
+            prepared (dict): Result of prepare_response
+
+        Returns:
+            async generator: Text deltas of the answer
+        """
+        if prepared["answer"] is not None:
+            yield prepared["answer"]
+            return
+
+        response_stream = await self.async_openai_client.chat.completions.create(
+            **prepared["completion"], stream=True
+        )
+        parts = []
+        try:
+            async for chunk in response_stream:
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Shielded so the close still runs inside a cancelled task
+            with anyio.CancelScope(shield=True):
+                await response_stream.close()
+
+        if prepared["on_complete"] is not None and parts:
+            # In a worker thread, storing the answer can write to the shared cache
+            await anyio.to_thread.run_sync(prepared["on_complete"], "".join(parts))
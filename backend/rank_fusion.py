@@ -0,0 +1,82 @@
+import heapq
+
+
+def distance_to_similarity(distance):
+    """
+    Convert a Chroma distance to a cosine similarity.
+
+    The collections use Chroma's default squared L2 space and OpenAI embeddings
+    are unit-norm, so the squared distance is 2 - 2 * cos.
+    """
+    return 1.0 - distance / 2.0
+
+
+def reciprocal_rank_fusion(ranked_lists, top_k, distances=None, distance_weight=0.0, k=None):
+    """
+    Fuse ranked lists with Reciprocal Rank Fusion, optionally adding a weighted
+    similarity term from the distances each list was ranked by.
+
+    Every list is scanned once to build its rank map, so the cost is linear in the
+    total number of items instead of one list.index() call per item and list.
+
+    Args:
+        ranked_lists (list of list): Ranked item lists (rank 0 = highest).
+        top_k (int): Number of top results to return.
+        distances (list of list, optional): Distances aligned with ranked_lists.
+        distance_weight (float): Weight of the similarity term. 0 fuses by rank only.
+        k (int, optional): Smoothing constant. Defaults to the number of lists.
+
+    Returns:
+        list: The top_k items sorted by fused score in descending order. Ties keep
+            the order in which items were first seen.
+    """
+    if k is None:
+        k = len(ranked_lists)
+
+    use_distances = distance_weight and distances is not None
+
+    scores = {}
+    for list_index, ranked_list in enumerate(ranked_lists):
+        rank_map = {}
+        for rank, item in enumerate(ranked_list):
+            rank_map.setdefault(item, rank)
+
+        list_distances = distances[list_index] if use_distances else None
+        for item, rank in rank_map.items():
+            score = 1.0 / (k + rank)
+            if list_distances is not None:
+                score += distance_weight * distance_to_similarity(list_distances[rank])
+            scores[item] = scores.get(item, 0.0) + score
+
+    return [item for item, _ in heapq.nlargest(top_k, scores.items(), key=lambda x: x[1])]
+
+
+def merge_by_distance(partial_results, top_n):
+    """
+    Merge results of the same queries searched over disjoint partitions of a
+    collection into one ranked list per query.
+
+    Args:
+        partial_results (list of tuple): (ids, distances) per partition, each holding
+            one list per query.
+        top_n (int): Number of results to keep per query.
+
+    Returns:
+        tuple: (ids, distances) with one list per query, sorted by distance.
+    """
+    if not partial_results:
+        return [], []
+
+    num_queries = len(partial_results[0][0])
+    merged_ids = []
+    merged_distances = []
+    for query_index in range(num_queries):
+        candidates = [
+            (distance, item)
+            for ids, distances in partial_results
+            for item, distance in zip(ids[query_index], distances[query_index])
+        ]
+        top = heapq.nsmallest(top_n, candidates, key=lambda x: x[0])
+        merged_ids.append([item for _, item in top])
+        merged_distances.append([distance for distance, _ in top])
+    return merged_ids, merged_distances
@@ -0,0 +1,115 @@
+import time
+import threading
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers keyed on query embeddings. A lookup returns the
+    answer of the most similar cached query if its cosine similarity reaches the
+    threshold and the entry is younger than the TTL.
+
+    Entries live in a fixed (max_size x dim) matrix so a lookup is one matrix-vector
+    product. Every entry is tagged with the index version it was generated from;
+    a lookup or store with a different version empties the cache.
+    """
+
+    def __init__(self, threshold=0.95, ttl=3600, max_size=512):
+        """
+        Args:
+            threshold (float): Minimum cosine similarity for a hit.
+            ttl (float): Seconds an answer stays valid.
+            max_size (int): Maximum number of cached answers.
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._answers = [None] * max_size
+        self._created_at = np.zeros(max_size)
+        self._last_used = np.zeros(max_size)
+        self._active = np.zeros(max_size, dtype=bool)
+        self._index_version = None
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    @staticmethod
+    def _normalize(embedding):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _check_version(self, index_version):
+        # Caller holds the lock
+        if index_version != self._index_version:
+            if self._active.any():
+                self._stats["invalidations"] += 1
+            self._active[:] = False
+            self._answers = [None] * self.max_size
+            self._index_version = index_version
+
+    def lookup(self, embedding, index_version):
+        """
+        Args:
+            embedding (array-like): Embedding of the first rewritten query.
+            index_version (str): Version of the index the answer must come from.
+
+        Returns:
+            str: The cached answer, or None on a miss.
+        """
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self._check_version(index_version)
+            self._active &= (now - self._created_at) < self.ttl
+
+            if self._matrix is None or not self._active.any() or self._matrix.shape[1] != query.shape[0]:
+                self._stats["misses"] += 1
+                return None
+
+            similarities = self._matrix @ query
+            similarities[~self._active] = -np.inf
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self._stats["misses"] += 1
+                return None
+
+            self._last_used[best] = now
+            self._stats["hits"] += 1
+            return self._answers[best]
+
+    def store(self, embedding, answer, index_version):
+        """
+        Cache an answer, evicting the least recently used entry when full.
+        """
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self._check_version(index_version)
+            if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+                self._matrix = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+                self._active[:] = False
+
+            free = np.flatnonzero(~self._active)
+            slot = int(free[0]) if len(free) else int(np.argmin(self._last_used))
+
+            self._matrix[slot] = vector
+            self._answers[slot] = answer
+            self._created_at[slot] = now
+            self._last_used[slot] = now
+            self._active[slot] = True
+            self._stats["stores"] += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._active[:] = False
+            self._answers = [None] * self.max_size
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = int(self._active.sum())
+        return stats
@@ -0,0 +1,174 @@
+"""
+Serving logic shared by the Flask app (fhnw_bot_api.py) and the ASGI app (asgi.py):
+the per-process chatbot and its readiness, admission control in front of the chat
+and batch endpoints, and validation of batch payloads. Both servers apply the
+same limits and report them under the same metrics.
+"""
+import os
+import logging
+import threading
+
+from rag_chatbot import UniversityRAGChatbot
+from admission import ConcurrencyLimiter, TokenBucketLimiter
+from metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# RAG Chatbot, created per process on first use (or by the gunicorn post_worker_init hook).
+# Its Neo4j driver, Chroma client and OpenAI clients must not be shared across forked workers.
+chatbot = None
+chatbot_lock = threading.Lock()
+readiness = {"ready": False, "warm_up_ms": None, "error": None}
+
+
+def get_chatbot():
+    global chatbot
+    if chatbot is None:
+        with chatbot_lock:
+            if chatbot is None:
+                chatbot = UniversityRAGChatbot()
+    return chatbot
+
+
+def init_chatbot(warm_up=True):
+    """
+    Create this process's chatbot and optionally warm up its connections and indexes
+
+    Returns:
+        dict: Readiness of this process
+    """
+    try:
+        instance = get_chatbot()
+        if warm_up:
+            readiness["warm_up_ms"] = instance.warm_up()
+        readiness["ready"] = True
+        readiness["error"] = None
+    except Exception as e:
+        logger.error(f"Chatbot initialization failed in worker {os.getpid()}: {e}", exc_info=True)
+        readiness["ready"] = False
+        readiness["error"] = str(e)
+    return dict(readiness, pid=os.getpid())
+
+
+# Admission Control, per worker process (0 disables a limit)
+max_concurrent_chats = int(os.getenv("MAX_CONCURRENT_CHATS", 0))
+admission = None
+if max_concurrent_chats > 0:
+    admission = ConcurrencyLimiter(
+        max_concurrent_chats,
+        max_queue=int(os.getenv("CHAT_QUEUE_SIZE", 32)),
+        queue_timeout=float(os.getenv("CHAT_QUEUE_TIMEOUT", 10))
+    )
+rate_limit_per_minute = float(os.getenv("RATE_LIMIT_PER_MINUTE", 0))
+rate_limiter = None
+if rate_limit_per_minute > 0:
+    rate_limiter = TokenBucketLimiter(rate_limit_per_minute, burst=int(os.getenv("RATE_LIMIT_BURST", 5)))
+trust_proxy_headers = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+
+ADMISSION_QUEUE_TIME = Histogram(
+    "fhnw_admission_queue_seconds",
+    "Time chat requests waited for a pipeline slot",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+ADMISSION_REJECTIONS = Counter(
+    "fhnw_admission_rejections_total",
+    "Chat requests rejected by admission control",
+    ["reason"]
+)
+if admission is not None:
+    Gauge("fhnw_admission_active", "Chat pipelines holding a slot").set_function(
+        lambda: admission.stats()["active"]
+    )
+    Gauge("fhnw_admission_queued", "Chat requests waiting for a slot").set_function(
+        lambda: admission.stats()["queued"]
+    )
+
+
+def client_id(remote_addr, forwarded_for=None):
+    """
+    Client address for rate limiting; behind a trusted reverse proxy, the first
+    X-Forwarded-For address
+    """
+    if trust_proxy_headers and forwarded_for:
+        return forwarded_for.split(",")[0].strip()
+    return remote_addr
+
+
+def admit(client):
+    """
+    Blocks while the request is queued for a pipeline slot
+
+    Args:
+        client (str): Client id, see client_id
+
+    Returns:
+        Permit: The pipeline slot to release once the answer is streamed, or None
+            if concurrency is unlimited
+
+    Raises:
+        Rejected: If the client is rate limited or the server is saturated
+    """
+    if rate_limiter is not None:
+        rate_limiter.check(client)
+    if admission is None:
+        return None
+    permit = admission.acquire()
+    ADMISSION_QUEUE_TIME.observe(permit.queue_seconds)
+    return permit
+
+
+async def admit_async(client):
+    """
+    Like admit, but waits for a pipeline slot on the event loop of the ASGI app
+
+    Returns:
+        Permit: The pipeline slot, or None if concurrency is unlimited
+
+    Raises:
+        Rejected: If the client is rate limited or the server is saturated
+    """
+    if rate_limiter is not None:
+        rate_limiter.check(client)
+    if admission is None:
+        return None
+    permit = await admission.acquire_async()
+    ADMISSION_QUEUE_TIME.observe(permit.queue_seconds)
+    return permit
+
+
+def rejection(rejected):
+    """
+    Count a rejection and build its response
+
+    Returns:
+        tuple: (JSON body, status, headers)
+    """
+    ADMISSION_REJECTIONS.inc(reason=rejected.reason)
+    message = "Too many requests" if rejected.status == 429 else "Server is busy"
+    return {"error": message}, rejected.status, {"Retry-After": str(rejected.retry_after)}
+
+
+# Batch Endpoints
+batch_max_size = int(os.getenv("BATCH_MAX_SIZE", 256))
+batch_max_workers = int(os.getenv("BATCH_MAX_WORKERS", 4))
+
+
+def batch_items(data):
+    """
+    Validate a batch payload
+
+    Returns:
+        tuple: (items, None), or (None, error message) for a 400 response
+    """
+    items = (data or {}).get('conversations', [])
+    if not items or not isinstance(items, list):
+        return None, "No conversations provided"
+    if len(items) > batch_max_size:
+        return None, f"At most {batch_max_size} conversations per batch"
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            return None, f"Conversation {index} is not an object"
+        queries = item.get("queries")
+        if queries is not None and not (isinstance(queries, list) and all(isinstance(query, str) for query in queries)):
+            return None, f"Conversation {index}: queries must be a list of strings"
+    return items, None
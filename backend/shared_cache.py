@@ -0,0 +1,250 @@
+"""
+Shared cache tier for embeddings, query rewrites and answers across worker
+processes and hosts.
+
+The in-process caches (EmbeddingCache, SemanticAnswerCache) stay in front; this
+tier is consulted on their misses and written on every new result, so a query
+embedded or rewritten by one worker is reused by all others. Any Redis-protocol
+server works (redis://host:6379/0); memory:// uses an in-process fake with the
+same interface for development and testing.
+
+Keys are "<prefix>:<namespace>:<digest>". Callers put whatever invalidates an
+entry into the namespace, e.g. the index version for answers. Embeddings are
+stored as raw little-endian float32 bytes, 12 KiB for text-embedding-3-large.
+
+Every call goes through a circuit breaker: errors and calls slower than the
+timeout count as failures, and after failure_threshold consecutive failures the
+tier is skipped for reset_timeout seconds, so a slow or unreachable server costs
+at most one timeout per call until it opens. After that a single trial call is let
+through while concurrent calls keep skipping the tier; its outcome closes the
+circuit or opens it again. Lookups then miss and stores are
+dropped; callers fall back to their local caches and the upstream APIs.
+"""
+import time
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def encode_embedding(embedding):
+    return np.asarray(embedding, dtype="<f4").tobytes()
+
+
+def decode_embedding(data):
+    return np.frombuffer(data, dtype="<f4").astype(np.float32)
+
+
+class InMemoryCacheClient:
+    """
+    Thread-safe stand-in for a Redis client supporting the calls SharedCache makes
+    (get, mget, set with ex, delete, pipeline, ping). latency simulates a slow server.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _get(self, name):
+        # Caller holds the lock
+        entry = self._values.get(name)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._values[name]
+            return None
+        return value
+
+    def ping(self):
+        self._wait()
+        return True
+
+    def get(self, name):
+        self._wait()
+        with self._lock:
+            return self._get(name)
+
+    def mget(self, names):
+        self._wait()
+        with self._lock:
+            return [self._get(name) for name in names]
+
+    def _set(self, name, value, ex):
+        # Caller holds the lock
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        self._values[name] = (bytes(value), time.time() + ex if ex else None)
+        return True
+
+    def set(self, name, value, ex=None):
+        self._wait()
+        with self._lock:
+            return self._set(name, value, ex)
+
+    def delete(self, *names):
+        self._wait()
+        with self._lock:
+            return sum(self._values.pop(name, None) is not None for name in names)
+
+    def pipeline(self, transaction=True):
+        return InMemoryPipeline(self)
+
+
+class InMemoryPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def set(self, name, value, ex=None):
+        self.commands.append((name, value, ex))
+        return self
+
+    def execute(self):
+        self.client._wait()
+        commands, self.commands = self.commands, []
+        with self.client._lock:
+            return [self.client._set(name, value, ex) for name, value, ex in commands]
+
+
+class SharedCache:
+    def __init__(self, client, prefix="fhnw", timeout=0.05, failure_threshold=3, reset_timeout=30.0):
+        """
+        Args:
+            client: Redis client, or anything with the same get/mget/set/pipeline calls
+            prefix (str): Prepended to every key, separates deployments sharing a server
+            timeout (float): Seconds after which a call counts as a failure
+            failure_threshold (int): Consecutive failures that open the circuit
+            reset_timeout (float): Seconds the tier is skipped once the circuit is open
+        """
+        self.client = client
+        self.prefix = prefix
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+        self._trial_running = False
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "errors": 0, "slow": 0, "skipped": 0, "opened": 0}
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """
+        Connect to redis://, rediss:// or unix:// URLs with the redis package (imported
+        only here, it is needed only with a shared cache), or use the in-memory fake
+        for memory://
+
+        Returns:
+            SharedCache: Not connected yet; the first call opens the connection
+        """
+        if url.startswith("memory://"):
+            return cls(InMemoryCacheClient(), **kwargs)
+
+        import redis
+
+        timeout = kwargs.get("timeout", 0.05)
+        client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        return cls(client, **kwargs)
+
+    def key(self, namespace, digest):
+        return f"{self.prefix}:{namespace}:{digest}"
+
+    def _call(self, operation, default):
+        """
+        Run operation through the circuit breaker
+
+        Returns:
+            The result of operation, or default if the circuit is open or the call failed
+        """
+        with self._lock:
+            if time.monotonic() < self._open_until or self._trial_running:
+                self._stats["skipped"] += 1
+                return default
+            # Once the reset timeout has passed, a single trial call decides whether to close it
+            trial = self._failures >= self.failure_threshold
+            self._trial_running = trial
+
+        start = time.monotonic()
+        try:
+            result = operation()
+            failed = False
+        except Exception as e:
+            logger.warning(f"Shared cache call failed: {e}")
+            result, failed = default, True
+        elapsed = time.monotonic() - start
+
+        with self._lock:
+            if trial:
+                self._trial_running = False
+            if failed:
+                self._stats["errors"] += 1
+            elif elapsed > self.timeout:
+                self._stats["slow"] += 1
+                failed = True
+
+            if not failed:
+                self._failures = 0
+            else:
+                # After the reset timeout a single failed trial call opens the circuit again
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    if time.monotonic() >= self._open_until:
+                        self._stats["opened"] += 1
+                        logger.warning(f"Shared cache circuit opened for {self.reset_timeout}s")
+                    self._open_until = time.monotonic() + self.reset_timeout
+        return result
+
+    def ping(self):
+        return bool(self._call(self.client.ping, False))
+
+    def get_many(self, namespace, digests):
+        """
+        Returns:
+            list: Stored bytes or None per digest, all None while the circuit is open
+        """
+        if not digests:
+            return []
+        keys = [self.key(namespace, digest) for digest in digests]
+        values = self._call(lambda: self.client.mget(keys), None) or [None] * len(keys)
+        hits = sum(value is not None for value in values)
+        with self._lock:
+            self._stats["hits"] += hits
+            self._stats["misses"] += len(values) - hits
+        return values
+
+    def get(self, namespace, digest):
+        return self.get_many(namespace, [digest])[0]
+
+    def set_many(self, namespace, items, ttl):
+        """
+        Store digest -> bytes (or str) entries expiring after ttl seconds, in one round trip
+        """
+        if not items:
+            return
+
+        def store():
+            pipeline = self.client.pipeline(transaction=False)
+            for digest, value in items.items():
+                pipeline.set(self.key(namespace, digest), value, ex=int(ttl) if ttl else None)
+            pipeline.execute()
+            return True
+
+        if self._call(store, False):
+            with self._lock:
+                self._stats["stores"] += len(items)
+
+    def set(self, namespace, digest, value, ttl):
+        self.set_many(namespace, {digest: value}, ttl)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
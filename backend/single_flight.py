@@ -0,0 +1,308 @@
+"""
+Single-flight coalescing of identical concurrent chat requests.
+
+The first request for a key (the leader) starts the pipeline in a background
+thread; requests with the same key arriving while it runs (followers) join the
+same flight. Every text delta is appended to the flight's buffer and each
+subscriber reads the buffer from the start, so late joiners still receive the
+whole answer. The pipeline runs outside any request thread, so the leader
+disconnecting does not cut off the followers; it is stopped only once every
+subscriber has gone.
+
+Subscription blocks its thread between deltas; AsyncSubscription (astream)
+suspends its task instead, so ASGI requests hold no thread while they wait.
+
+Pipelines run on a bounded pool of max_flights threads; further flights queue
+until a thread is free. The last subscriber to leave abandons the flight right
+away: it closes the upstream completion registered by the pipeline, which also
+frees a thread blocked on a stalled upstream.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Flight:
+    def __init__(self):
+        self.parts = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.abandoned = False
+        self.close_upstream = None
+        self.condition = threading.Condition()
+        # (loop, asyncio.Event) of AsyncSubscriptions waiting for the next delta
+        self.async_waiters = []
+
+    def _wake_async(self):
+        # Caller holds the condition
+        for loop, event in self.async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The waiter's event loop is already closed
+                pass
+        self.async_waiters = []
+
+    def set_upstream(self, close):
+        """
+        Register how to close the upstream completion early. Closes it right away if
+        the flight was abandoned while the pipeline was still preparing it.
+        """
+        with self.condition:
+            self.close_upstream = close
+            abandoned = self.abandoned
+        if abandoned:
+            close()
+
+    def abandon(self):
+        with self.condition:
+            self.abandoned = True
+            close = self.close_upstream
+        if close is not None:
+            # Unblocks the pipeline thread if it is waiting for the next upstream chunk
+            close()
+
+    def publish(self, text):
+        with self.condition:
+            self.parts.append(text)
+            self.condition.notify_all()
+            self._wake_async()
+
+    def finish(self, error=None):
+        with self.condition:
+            self.done = True
+            self.error = error
+            self.condition.notify_all()
+            self._wake_async()
+
+    def wait_started(self):
+        """
+        Block until the first text delta or the end of the flight
+
+        Raises:
+            Exception: The pipeline error, if it failed before producing any text
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.parts or self.done)
+            if self.error is not None and not self.parts:
+                raise self.error
+
+    def part(self, index):
+        """
+        Block until the text delta at index is available
+
+        Returns:
+            str: The text delta, or None at the end of the flight
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: index < len(self.parts) or self.done)
+            if index < len(self.parts):
+                return self.parts[index]
+            if self.error is not None:
+                raise self.error
+            return None
+
+    async def apart(self, index):
+        """
+        Wait without blocking the event loop until the text delta at index is available
+
+        Returns:
+            str: The text delta, or None at the end of the flight
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.condition:
+                if index < len(self.parts):
+                    return self.parts[index]
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return None
+                event = asyncio.Event()
+                self.async_waiters.append((loop, event))
+            await event.wait()
+
+
+class Subscription:
+    """
+    Iterator over the text deltas of a flight. Closing it (or dropping it)
+    unsubscribes, like closing the generator of an uncoalesced stream.
+    """
+
+    def __init__(self, flight, leave):
+        self.flight = flight
+        self.leave = leave
+        self.index = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed:
+            raise StopIteration
+        try:
+            text = self.flight.part(self.index)
+        except BaseException:
+            self.close()
+            raise
+        if text is None:
+            self.close()
+            raise StopIteration
+        self.index += 1
+        return text
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.leave()
+
+    def __del__(self):
+        self.close()
+
+
+class AsyncSubscription:
+    """
+    Async iterator over the text deltas of a flight. The pipeline error, if it
+    failed before producing any text, is raised by the first __anext__.
+    """
+
+    def __init__(self, flight, leave):
+        self.flight = flight
+        self.leave = leave
+        self.index = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed:
+            raise StopAsyncIteration
+        try:
+            text = await self.flight.apart(self.index)
+        except BaseException:
+            self.close()
+            raise
+        if text is None:
+            self.close()
+            raise StopAsyncIteration
+        self.index += 1
+        return text
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.leave()
+
+    async def aclose(self):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+class SingleFlight:
+    def __init__(self, max_flights=32):
+        """
+        Args:
+            max_flights (int): Pipelines run at once; further flights wait for a thread.
+        """
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {"leader": 0, "follower": 0, "abandoned": 0}
+        self._executor = ThreadPoolExecutor(max_workers=max_flights, thread_name_prefix="single-flight")
+
+    def stream(self, key, produce):
+        """
+        Join the in-flight pipeline for key, or start it.
+
+        Args:
+            key (str): Coalescing key, e.g. a hash of the normalized conversation
+            produce (callable): Starts the pipeline and returns an iterator of text deltas.
+                Called with a function to register the close of the upstream completion,
+                used when every subscriber has left.
+
+        Returns:
+            Subscription: Text deltas of the shared answer
+        """
+        flight = self._join(key, produce)
+        subscription = Subscription(flight, lambda: self._leave(key, flight))
+        try:
+            flight.wait_started()
+        except BaseException:
+            subscription.close()
+            raise
+        return subscription
+
+    def astream(self, key, produce):
+        """
+        Like stream, but returns at once with an async iterator, for the ASGI app
+
+        Returns:
+            AsyncSubscription: Text deltas of the shared answer
+        """
+        flight = self._join(key, produce)
+        return AsyncSubscription(flight, lambda: self._leave(key, flight))
+
+    def _join(self, key, produce):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+            with flight.condition:
+                flight.subscribers += 1
+            self._stats["leader" if leader else "follower"] += 1
+
+        if leader:
+            self._executor.submit(self._run, key, flight, produce)
+        return flight
+
+    def _run(self, key, flight, produce):
+        error = None
+        try:
+            if flight.abandoned:
+                return
+            stream = produce(flight.set_upstream)
+            try:
+                for text in stream:
+                    flight.publish(text)
+                    if flight.abandoned:
+                        break
+            finally:
+                # Closes the upstream completion if the flight was abandoned
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+        except Exception as e:
+            # Reading a completion closed by abandon() fails, nobody is left to tell
+            if not flight.abandoned:
+                error = e
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.finish(error)
+
+    def _leave(self, key, flight):
+        """
+        Unsubscribe, and abandon the flight if nobody listens anymore. Checked under
+        the flights lock, so a request cannot join a flight that is about to stop.
+        """
+        with self._lock:
+            with flight.condition:
+                flight.subscribers -= 1
+                if flight.subscribers > 0 or flight.done:
+                    return
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            self._stats["abandoned"] += 1
+        flight.abandon()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._flights)
+        return stats
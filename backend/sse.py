@@ -0,0 +1,167 @@
+"""
+Server-sent event framing and streaming metrics shared by the Flask app
+(fhnw_bot_api.py) and the ASGI app (asgi.py).
+
+OpenAI streams an answer as many tiny deltas. With SSE_COALESCE_CHARS or
+SSE_COALESCE_MS set, deltas are coalesced into one event once the buffered text
+reaches the character limit or its oldest delta has waited for the time window.
+The first delta is always sent on its own so the time to first token is not
+affected. The protocol stays the same: `data: {"text": ...}` events followed by
+`data: [DONE]`.
+"""
+import os
+import time
+import asyncio
+
+import anyio
+import orjson
+
+from metrics import Counter, Histogram
+
+DONE_EVENT = b"data: [DONE]\n\n"
+
+COALESCE_CHARS = int(os.getenv("SSE_COALESCE_CHARS", 0))
+COALESCE_SECONDS = float(os.getenv("SSE_COALESCE_MS", 0)) / 1000
+
+TIME_TO_FIRST_TOKEN = Histogram(
+    "fhnw_time_to_first_token_seconds",
+    "Time from receiving a chat request to streaming the first answer text"
+)
+STREAM_DURATION = Histogram(
+    "fhnw_stream_duration_seconds",
+    "Time from receiving a chat request to the end of its answer stream",
+    buckets=(0.5, 1.0, 2.5, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 120.0)
+)
+CLIENT_DISCONNECTS = Counter(
+    "fhnw_client_disconnects_total",
+    "Answer streams abandoned by the client before the end of the answer"
+)
+SSE_EVENTS = Counter(
+    "fhnw_sse_events_total",
+    "Answer text events written to SSE streams"
+)
+SSE_BYTES = Counter(
+    "fhnw_sse_bytes_total",
+    "Bytes of answer text events written to SSE streams"
+)
+
+
+def text_event(text):
+    event = b"data: " + orjson.dumps({"text": text}) + b"\n\n"
+    SSE_EVENTS.inc()
+    SSE_BYTES.inc(len(event))
+    return event
+
+
+def coalesce(deltas, max_chars=COALESCE_CHARS, max_delay=COALESCE_SECONDS, clock=time.perf_counter):
+    """
+    Coalesce text deltas by size or age. A buffer is flushed when a delta arrives
+    and the buffered text has reached max_chars or is older than max_delay, and at
+    the end of the stream.
+
+    Args:
+        deltas (iterable): Text deltas
+        max_chars (int): Flush once the buffer holds this many characters (0: no limit)
+        max_delay (float): Flush once the oldest buffered delta is this many seconds old (0: no limit)
+        clock (callable): Time source, replaceable for benchmarks
+
+    Returns:
+        generator: Coalesced text
+    """
+    if not max_chars and not max_delay:
+        yield from deltas
+        return
+
+    buffer = []
+    size = 0
+    started = None
+    first = True
+    for text in deltas:
+        if first:
+            first = False
+            yield text
+            continue
+
+        now = clock()
+        if not buffer:
+            started = now
+        buffer.append(text)
+        size += len(text)
+        if (max_chars and size >= max_chars) or (max_delay and now - started >= max_delay):
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+
+    if buffer:
+        yield "".join(buffer)
+
+
+async def acoalesce(deltas, max_chars=COALESCE_CHARS, max_delay=COALESCE_SECONDS):
+    """
+    Async counterpart of coalesce. The time window is enforced with a timeout, so
+    buffered text is also flushed while the upstream is idle.
+
+    Args:
+        deltas (async iterable): Text deltas
+
+    Returns:
+        async generator: Coalesced text
+    """
+    if not max_chars and not max_delay:
+        async for text in deltas:
+            yield text
+        return
+
+    loop = asyncio.get_running_loop()
+    iterator = deltas.__aiter__()
+    buffer = []
+    size = 0
+    started = None
+    first = True
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None
+            if buffer and max_delay:
+                timeout = max(0.0, started + max_delay - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if not done:
+                # Window expired while waiting for the next delta
+                text, buffer, size = "".join(buffer), [], 0
+                yield text
+                continue
+
+            try:
+                text = pending.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                pending = None
+
+            if first:
+                first = False
+                yield text
+                continue
+
+            if not buffer:
+                started = loop.time()
+            buffer.append(text)
+            size += len(text)
+            if max_chars and size >= max_chars:
+                text, buffer, size = "".join(buffer), [], 0
+                yield text
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        # On cancellation, stop the upstream and close it, so its completion stream is
+        # closed even if the pending read was cancelled before it started
+        with anyio.CancelScope(shield=True):
+            if pending is not None:
+                pending.cancel()
+                await asyncio.gather(pending, return_exceptions=True)
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
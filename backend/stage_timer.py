@@ -0,0 +1,81 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """
+    Records when each pipeline stage starts and ends, relative to the creation of
+    the timer, so stages that ran concurrently show overlapping spans.
+
+    A stage can run several times (e.g. one chunk search per page); its span then
+    covers the earliest start to the latest end and its count is the number of runs.
+    """
+
+    def __init__(self, histogram=None):
+        """
+        Args:
+            histogram (Histogram, optional): Receives the span of every stage, labelled
+                by stage, when the timer is finished.
+        """
+        self.origin = time.perf_counter()
+        self.spans = {}
+        self.histogram = histogram
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def timed(self, name, function, *args, **kwargs):
+        """
+        Call function inside a stage, convenient for submitting to an executor
+        """
+        with self.stage(name):
+            return function(*args, **kwargs)
+
+    def record(self, name, start, end):
+        with self._lock:
+            self.spans.setdefault(name, []).append((start - self.origin, end - self.origin))
+
+    def summary(self):
+        """
+        Returns:
+            dict: Stage name -> {"start_ms", "end_ms", "busy_ms", "count"}, ordered by start
+        """
+        with self._lock:
+            spans = {name: list(values) for name, values in self.spans.items()}
+
+        summary = {}
+        for name, values in sorted(spans.items(), key=lambda item: min(start for start, _ in item[1])):
+            summary[name] = {
+                "start_ms": round(min(start for start, _ in values) * 1000, 2),
+                "end_ms": round(max(end for _, end in values) * 1000, 2),
+                "busy_ms": round(sum(end - start for start, end in values) * 1000, 2),
+                "count": len(values)
+            }
+        return summary
+
+    def format(self):
+        return ", ".join(
+            f"{name} {span['start_ms']:.1f}-{span['end_ms']:.1f}ms"
+            + (f" (x{span['count']}, busy {span['busy_ms']:.1f}ms)" if span["count"] > 1 else "")
+            for name, span in self.summary().items()
+        )
+
+    def finish(self):
+        """
+        Observe the span of every stage in the histogram
+
+        Returns:
+            dict: The stage summary
+        """
+        summary = self.summary()
+        if self.histogram is not None:
+            for name, span in summary.items():
+                self.histogram.observe((span["end_ms"] - span["start_ms"]) / 1000, stage=name)
+        return summary
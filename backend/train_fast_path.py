@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import random
+import argparse
+import statistics
+
+from fast_path import FastPath, RetrievalClassifier
+
+
+def load_examples(log_path):
+    """
+    Read first-turn rewrites from the JSONL log written when REWRITE_LOG_PATH is set
+    """
+    examples = []
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("first_turn") and record.get("query"):
+                examples.append(record)
+    return examples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local rewrite fast path classifier from logged rewrites.")
+    parser.add_argument("--log", default=os.getenv("REWRITE_LOG_PATH", "rewrites.jsonl"))
+    parser.add_argument("--output", default=os.getenv("FAST_PATH_MODEL", "fast_path_model.json"))
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("FAST_PATH_THRESHOLD", 0.9)))
+    parser.add_argument("--holdout", type=float, default=0.2)
+    args = parser.parse_args()
+
+    examples = load_examples(args.log)
+    if len(examples) < 10:
+        raise ValueError(f"Need at least 10 first-turn rewrites to train, found {len(examples)}")
+
+    random.seed(42)
+    random.shuffle(examples)
+    split = int(len(examples) * (1 - args.holdout))
+    train, test = examples[:split], examples[split:]
+
+    classifier = RetrievalClassifier().train(
+        (record["query"], record["retrieval_needed"]) for record in train
+    )
+    fast_path = FastPath(classifier=classifier, threshold=args.threshold)
+
+    hits = 0
+    correct = 0
+    local_latencies = []
+    for record in test:
+        start = time.perf_counter()
+        decision = fast_path.decide("", record["query"])
+        local_latencies.append((time.perf_counter() - start) * 1000)
+        if decision is not None:
+            hits += 1
+            correct += decision[0] == record["retrieval_needed"]
+
+    llm_latencies = [record["latency_ms"] for record in test if record.get("latency_ms") is not None]
+
+    print(f"Trained on {len(train)} rewrites, evaluated on {len(test)}")
+    print(f"Fast path hit rate: {hits / len(test):.1%} at threshold {args.threshold}")
+    if hits:
+        print(f"retrieval_needed agreement with gpt-4o on hits: {correct / hits:.1%}")
+    print(f"Local decision latency: mean {statistics.mean(local_latencies):.3f} ms")
+    if llm_latencies:
+        print(f"Logged gpt-4o rewrite latency: mean {statistics.mean(llm_latencies):.1f} ms, "
+              f"median {statistics.median(llm_latencies):.1f} ms")
+
+    # The shipped model is trained on every example
+    RetrievalClassifier().train(
+        (record["query"], record["retrieval_needed"]) for record in examples
+    ).save(args.output)
+    print(f"Model saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import os
+import json
+
+import numpy as np
+
+COMPACT_DTYPES = ("float32", "float16", "int8")
+
+
+def truncate_embeddings(matrix, dimensions):
+    """
+    Matryoshka-style truncation: keep the first `dimensions` components and
+    renormalize. text-embedding-3 models are trained so that these prefixes are
+    usable embeddings on their own.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    truncated = np.ascontiguousarray(matrix[:, :dimensions])
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    return truncated / np.maximum(norms, 1e-12)
+
+
+def compact_embeddings(matrix, dimensions, dtype):
+    """
+    Truncated and quantized copy of an embedding matrix for coarse search.
+
+    int8 uses a symmetric per-dimension scale: row * scale recovers the float vector.
+
+    Returns:
+        tuple: (compact matrix, scale or None)
+    """
+    if dtype not in COMPACT_DTYPES:
+        raise ValueError(f"Unsupported compact dtype: {dtype}")
+    truncated = truncate_embeddings(matrix, dimensions)
+    if dtype != "int8":
+        return truncated.astype(dtype), None
+    scale = np.abs(truncated).max(axis=0) / 127 if len(truncated) else np.ones(truncated.shape[1], dtype=np.float32)
+    scale = np.maximum(scale, 1e-12).astype(np.float32)
+    return np.clip(np.rint(truncated / scale), -127, 127).astype(np.int8), scale
+
+
+def chunk_shard_name(community_id):
+    """
+    Collection holding the chunks of one community (CHUNK_INDEX=sharded)
+    """
+    return f"chunks_c{'none' if community_id is None else community_id}"
+
+
+def is_chunk_shard(name):
+    return name.startswith("chunks_c")
+
+
+def compact_file_name(name, variant, suffix="npy"):
+    """
+    File of a compact copy, e.g. chunks.256.int8.npy for variant "256.int8"
+    """
+    return f"{name}.{variant}.{suffix}"
+
+
+class NumpyVectorStore:
+    """
+    Brute-force vector search over collections exported from ChromaDB.
+
+    Every collection is stored as two files in the index directory:
+        <name>.npy   float32 or float16 matrix, one embedding per row, memory-mapped
+        <name>.json  {"ids": [...], "page_ids": [...]} aligned with the matrix rows
+
+    Distances are squared L2, the same space Chroma uses for our collections, so
+    results can be fused exactly like Chroma results.
+
+    With a coarse variant (e.g. "256.int8"), every collection also loads its compact
+    copy <name>.<variant>.npy (truncated to fewer dimensions, and for int8 with a
+    per-dimension scale in <name>.<variant>.scale.npy). Searches over more rows than
+    the shortlist of rescore_factor * n_results candidates then rank all rows on the
+    compact copy and rescore only the shortlist on the full-precision matrix, so only
+    the shortlisted rows of the full matrix are read from disk.
+    """
+
+    # Rows scored per matmul, bounds the float32 copy made from float16 matrices
+    BLOCK_SIZE = 16384
+
+    def __init__(self, index_dir, coarse_variant=None, rescore_factor=4):
+        """
+        Args:
+            index_dir (str): Directory written by export_numpy_index.py
+            coarse_variant (str, optional): "<dimensions>.<dtype>" compact copy used for
+                coarse search, exported with --compact
+            rescore_factor (int): Candidates rescored at full precision per result
+        """
+        self.index_dir = index_dir
+        self.coarse_variant = coarse_variant or None
+        self.rescore_factor = rescore_factor
+        self.collections = {}
+
+    def get_collection(self, name):
+        """
+        Load a collection on first use and keep it for the lifetime of the store
+        """
+        collection = self.collections.get(name)
+        if collection is None:
+            collection = self._load_collection(name)
+            self.collections[name] = collection
+        return collection
+
+    def _load_collection(self, name):
+        matrix = np.load(os.path.join(self.index_dir, f"{name}.npy"), mmap_mode="r")
+        with open(os.path.join(self.index_dir, f"{name}.json"), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+
+        ids = np.asarray(metadata["ids"], dtype=object)
+        if len(ids) != matrix.shape[0]:
+            raise ValueError(f"Collection '{name}' has {matrix.shape[0]} vectors but {len(ids)} ids")
+
+        # Squared norms are needed for every query, compute them once
+        squared_norms = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], self.BLOCK_SIZE):
+            block = np.asarray(matrix[start:start + self.BLOCK_SIZE], dtype=np.float32)
+            squared_norms[start:start + self.BLOCK_SIZE] = np.einsum("ij,ij->i", block, block)
+
+        page_rows = {}
+        for row, page_id in enumerate(metadata.get("page_ids") or []):
+            page_rows.setdefault(page_id, []).append(row)
+
+        collection = {
+            "matrix": matrix,
+            "ids": ids,
+            "squared_norms": squared_norms,
+            "page_rows": {page_id: np.asarray(rows, dtype=np.int64) for page_id, rows in page_rows.items()},
+            # [start, end) row range per page, when the export grouped rows by page
+            "page_blocks": metadata.get("page_blocks")
+        }
+        # Community shards are only searched for a few pages, exact search is enough
+        if self.coarse_variant is not None and not is_chunk_shard(name):
+            collection["coarse"] = self._load_coarse(name, matrix.shape[0])
+        return collection
+
+    def _load_coarse(self, name, num_rows):
+        matrix = np.load(os.path.join(self.index_dir, compact_file_name(name, self.coarse_variant)), mmap_mode="r")
+        if matrix.shape[0] != num_rows:
+            raise ValueError(f"Compact copy '{self.coarse_variant}' of '{name}' has {matrix.shape[0]} vectors, expected {num_rows}")
+        scale_path = os.path.join(self.index_dir, compact_file_name(name, self.coarse_variant, "scale.npy"))
+        scale = np.load(scale_path) if os.path.exists(scale_path) else None
+
+        squared_norms = np.empty(num_rows, dtype=np.float32)
+        for start in range(0, num_rows, self.BLOCK_SIZE):
+            block = self._dequantize(matrix[start:start + self.BLOCK_SIZE], scale)
+            squared_norms[start:start + self.BLOCK_SIZE] = np.einsum("ij,ij->i", block, block)
+        return {"matrix": matrix, "scale": scale, "squared_norms": squared_norms}
+
+    @staticmethod
+    def _dequantize(block, scale):
+        block = np.asarray(block, dtype=np.float32)
+        return block * scale if scale is not None else block
+
+    def _filter_rows(self, collection, where):
+        """
+        Translate a {"page_id": {"$in": [...]}} filter into the matching row indices
+        """
+        if where is None:
+            return None
+        try:
+            page_ids = where["page_id"]["$in"]
+        except (KeyError, TypeError):
+            raise ValueError(f"Unsupported filter for the numpy vector backend: {where}")
+        if len(where) != 1 or len(where["page_id"]) != 1:
+            raise ValueError(f"Unsupported filter for the numpy vector backend: {where}")
+
+        rows = [collection["page_rows"][page_id] for page_id in page_ids if page_id in collection["page_rows"]]
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(rows))
+
+    def query(self, collection_name, query_embeddings, n_results, where=None):
+        """
+        Find the nearest neighbours of every query embedding.
+
+        Args:
+            collection_name (str): Collection to search.
+            query_embeddings (list): Query embeddings.
+            n_results (int): Number of results per query.
+            where (dict, optional): {"page_id": {"$in": [...]}} filter.
+
+        Returns:
+            tuple: (ids, distances), one ranked list per query like ChromaDB.
+        """
+        collection = self.get_collection(collection_name)
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[np.newaxis, :]
+
+        rows = self._filter_rows(collection, where)
+        num_rows = collection["matrix"].shape[0] if rows is None else len(rows)
+        if num_rows == 0:
+            return [[] for _ in queries], [[] for _ in queries]
+
+        shortlist = n_results * self.rescore_factor
+        if "coarse" in collection and num_rows > shortlist:
+            rows = self._coarse_candidates(collection["coarse"], queries, rows, shortlist)
+            num_rows = len(rows)
+
+        distances = self._distances(collection["matrix"], None, collection["squared_norms"], queries, rows)
+        return self._rank(collection, distances, rows, n_results)
+
+    def score_pages(self, collection_name, query_embeddings, page_ids, n_results):
+        """
+        Exact scores of every row of the given pages, without a filtered search: the
+        pages' contiguous row blocks are sliced out of the matrix and scored against
+        all query embeddings with one matmul.
+
+        Args:
+            collection_name (str): Collection to score, usually "chunks".
+            query_embeddings (list): Query embeddings.
+            page_ids (list): Pages whose rows are scored.
+            n_results (int): Number of results per query.
+
+        Returns:
+            tuple: (ids, distances), one ranked list per query, the same results as
+                query() with a {"page_id": {"$in": page_ids}} filter.
+        """
+        collection = self.get_collection(collection_name)
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[np.newaxis, :]
+
+        blocks = collection["page_blocks"]
+        row_ranges = []
+        for page_id in dict.fromkeys(page_ids):
+            if blocks is not None:
+                if page_id in blocks:
+                    start, end = blocks[page_id]
+                    row_ranges.append(np.arange(start, end, dtype=np.int64))
+            elif page_id in collection["page_rows"]:
+                row_ranges.append(collection["page_rows"][page_id])
+        if not row_ranges:
+            return [[] for _ in queries], [[] for _ in queries]
+
+        rows = np.concatenate(row_ranges)
+        if blocks is not None:
+            # Slices of a memory map are views, only the pages' rows are read
+            matrix = np.concatenate([
+                np.asarray(collection["matrix"][page_rows[0]:page_rows[-1] + 1], dtype=np.float32)
+                for page_rows in row_ranges
+            ])
+        else:
+            matrix = np.asarray(collection["matrix"][rows], dtype=np.float32)
+
+        distances = (
+            np.einsum("ij,ij->i", queries, queries)[:, np.newaxis]
+            + collection["squared_norms"][rows]
+            - 2 * (queries @ matrix.T)
+        )
+        return self._rank(collection, distances, rows, n_results)
+
+    def _rank(self, collection, distances, rows, n_results):
+        """
+        Top n_results ids and distances per query, ascending by distance. Columns of
+        distances correspond to rows (all rows of the collection if None).
+        """
+        num_rows = distances.shape[1]
+        n_results = min(n_results, num_rows)
+        if n_results < num_rows:
+            top = np.argpartition(distances, n_results - 1, axis=1)[:, :n_results]
+        else:
+            top = np.broadcast_to(np.arange(num_rows), distances.shape)
+        top_distances = np.take_along_axis(distances, top, axis=1)
+        order = np.argsort(top_distances, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_distances = np.take_along_axis(top_distances, order, axis=1)
+
+        if rows is not None:
+            top = rows[top]
+
+        ids = [collection["ids"][query_rows].tolist() for query_rows in top]
+        return ids, top_distances.tolist()
+
+    def _distances(self, matrix, scale, squared_norms, queries, rows):
+        """
+        Squared L2 distances from every query to the given rows (all rows if None)
+        """
+        if rows is not None:
+            matrix = matrix[rows]
+            squared_norms = squared_norms[rows]
+
+        # ||q - x||^2 = ||q||^2 + ||x||^2 - 2 q.x, one BLAS matmul per block of rows
+        dot_products = np.empty((queries.shape[0], matrix.shape[0]), dtype=np.float32)
+        for start in range(0, matrix.shape[0], self.BLOCK_SIZE):
+            block = self._dequantize(matrix[start:start + self.BLOCK_SIZE], scale)
+            dot_products[:, start:start + self.BLOCK_SIZE] = queries @ block.T
+        return np.einsum("ij,ij->i", queries, queries)[:, np.newaxis] + squared_norms - 2 * dot_products
+
+    def _coarse_candidates(self, coarse, queries, rows, shortlist):
+        """
+        Rows of the union of every query's shortlist on the compact copy, sorted
+        """
+        compact_queries = truncate_embeddings(queries, coarse["matrix"].shape[1])
+        distances = self._distances(coarse["matrix"], coarse["scale"], coarse["squared_norms"], compact_queries, rows)
+        candidates = np.unique(np.argpartition(distances, shortlist - 1, axis=1)[:, :shortlist])
+        return candidates if rows is None else rows[candidates]
@@ -1,4 +1,5 @@
-from fhnw_bot_api import app
+from fhnw_bot_api import app, init_chatbot
 
 if __name__ == "__main__":
+    init_chatbot()
     app.run()
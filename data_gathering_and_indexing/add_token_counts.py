@@ -0,0 +1,60 @@
+import os
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+from tiktoken import get_encoding
+from tqdm import tqdm
+
+load_dotenv()
+
+NEO4J_URI = "bolt://localhost:7687"
+NEO4J_USERNAME = "neo4j"
+NEO4J_PASSWORD = os.getenv("NEO4J_PASS")
+BATCH_SIZE = 500
+
+driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD))
+
+
+def batch_items(items, batch_size):
+    for i in range(0, len(items), batch_size):
+        yield items[i:i + batch_size]
+
+
+def add_token_counts():
+    """
+    Store o200k_base token counts on an existing graph: Page.summary_token_count and
+    Chunk.token_count, the same properties neo4j_populate_o1.py sets on a fresh build.
+    """
+    tokenizer = get_encoding("o200k_base")
+
+    with driver.session() as session:
+        pages = session.run("MATCH (p:Page) RETURN p.page_id as id, p.summary as text").data()
+        chunks = session.run("MATCH (c:Chunk) RETURN c.chunk_id as id, c.content as text").data()
+
+        for batch in tqdm(list(batch_items(pages, BATCH_SIZE)), desc="Counting page summary tokens"):
+            rows = [{"id": item["id"], "count": len(tokenizer.encode(item["text"] or ""))} for item in batch]
+            session.run(
+                """
+                UNWIND $rows AS row
+                MATCH (p:Page {page_id: row.id})
+                SET p.summary_token_count = row.count
+                """,
+                rows=rows
+            )
+
+        for batch in tqdm(list(batch_items(chunks, BATCH_SIZE)), desc="Counting chunk tokens"):
+            rows = [{"id": item["id"], "count": len(tokenizer.encode(item["text"] or ""))} for item in batch]
+            session.run(
+                """
+                UNWIND $rows AS row
+                MATCH (c:Chunk {chunk_id: row.id})
+                SET c.token_count = row.count
+                """,
+                rows=rows
+            )
+
+    print(f"Token counts stored for {len(pages)} pages and {len(chunks)} chunks.")
+
+
+if __name__ == "__main__":
+    add_token_counts()
+    driver.close()
@@ -1,4 +1,6 @@
 import os
+import sys
+import argparse
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
 import chromadb
@@ -6,6 +8,10 @@ from chromadb.utils import embedding_functions
 from tqdm import tqdm
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from export_numpy_index import NUMPY_INDEX_DIR, export_collection, parse_compact_variants, write_compact_collection, read_collection
+from vector_store import chunk_shard_name, is_chunk_shard
+
 load_dotenv()
 
 NEO4J_URI = "bolt://localhost:7687"
@@ -35,6 +41,41 @@ def get_neo4j_ids():
         
         return pages, chunks
 
+def get_page_communities():
+    with neo4j_driver.session() as session:
+        pages = session.run("""
+            MATCH (p:Page)
+            RETURN p.page_id as page_id, p.community_id as community_id
+        """).data()
+        return {page["page_id"]: page["community_id"] for page in pages}
+
+def build_community_shards(client, chunks_collection):
+    """
+    Copy the chunk embeddings into one collection per page community (chunks_c<id>),
+    so a search for the selected pages only walks the graphs of their communities.
+    Embeddings are copied from the chunks collection, not requested again.
+    """
+    for collection in client.list_collections():
+        name = getattr(collection, "name", collection)
+        if is_chunk_shard(name):
+            client.delete_collection(name)
+
+    communities = get_page_communities()
+    ids, matrix, page_ids = read_collection(chunks_collection)
+    shards = {}
+    for row, page_id in enumerate(page_ids):
+        shards.setdefault(chunk_shard_name(communities.get(page_id)), []).append(row)
+
+    for name, rows in tqdm(sorted(shards.items()), desc="Building community shards"):
+        shard = client.create_collection(name=name)
+        for batch in batch_items(rows, BATCH_SIZE * 10):
+            shard.add(
+                ids=[ids[row] for row in batch],
+                embeddings=matrix[batch].tolist(),
+                metadatas=[{'page_id': page_ids[row]} for row in batch]
+            )
+    return {name: len(rows) for name, rows in shards.items()}
+
 def setup_chroma():
     client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
     chunks_collection = client.get_or_create_collection(
@@ -69,7 +110,29 @@ def process_items(items, collection, item_type):
             print(f"Error processing batch: {e}")
             continue
 
+def export_compact_index(client, output_dir, variants):
+    """
+    Export the collections as a NumPy index with truncated/quantized copies for
+    coarse search with full-precision rescoring (see backend/vector_store.py)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for name in ("summaries", "chunks"):
+        ids, matrix, _ = export_collection(client, output_dir, name)
+        for dimensions, dtype in variants:
+            compact = write_compact_collection(output_dir, name, matrix, dimensions, dtype)
+            print(f"{name} {dimensions}.{dtype}: {compact.nbytes / 2**20:.1f} MiB "
+                  f"(full precision {matrix.nbytes / 2**20:.1f} MiB, {len(ids)} vectors)")
+
 def main():
+    parser = argparse.ArgumentParser(description="Embed Neo4j pages and chunks into ChromaDB.")
+    parser.add_argument("--compact", default="",
+                        help="Also export a NumPy index with compact copies, e.g. 256.int8,1024.float16")
+    parser.add_argument("--numpy-dir", default=NUMPY_INDEX_DIR)
+    parser.add_argument("--shard-by-community", action="store_true",
+                        help="Also build one chunk collection per page community_id (CHUNK_INDEX=sharded)")
+    args = parser.parse_args()
+    compact_variants = parse_compact_variants(args.compact)
+
     try:
         print("Setting up ChromaDB...")
         client, chunks_collection, summaries_collection = setup_chroma()
@@ -97,6 +160,13 @@ def main():
             print(f"ID: {id}")
             print(f"Text: {text[:100]}...")
             print(f"Metadata: {metadata}")
+        if args.shard_by_community:
+            print("\nBuilding community shards...")
+            shard_sizes = build_community_shards(client, chunks_collection)
+            print(f"{len(shard_sizes)} shards, largest {max(shard_sizes.values(), default=0)} chunks")
+        if compact_variants:
+            print("\nExporting compact copies...")
+            export_compact_index(client, args.numpy_dir, compact_variants)
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import argparse
+from neo4j import GraphDatabase
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from graph_snapshot import GraphSnapshot, write_snapshot
+
+load_dotenv()
+
+NEO4J_URI = "bolt://localhost:7687"
+NEO4J_USERNAME = "neo4j"
+NEO4J_PASSWORD = os.getenv("NEO4J_PASS")
+GRAPH_SNAPSHOT_PATH = "./graph_snapshot.bin"
+
+
+def read_graph(driver):
+    """
+    Read every page and chunk property the serving path uses
+    """
+    with driver.session() as session:
+        pages = session.run("""
+            MATCH (p:Page)
+            RETURN p.page_id as page_id,
+                p.url as url,
+                p.summary as summary,
+                p.community_id as community_id,
+                p.number_of_chunks as number_of_chunks,
+                p.summary_token_count as summary_token_count
+        """).data()
+        chunks = session.run("""
+            MATCH (p:Page)-[:HAS_CHUNK]->(c:Chunk)
+            RETURN c.chunk_id as chunk_id,
+                p.page_id as page_id,
+                c.content as content,
+                c.chunk_number as chunk_number,
+                c.token_count as token_count
+        """).data()
+    return pages, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the Neo4j pages and chunks into a memory-mapped snapshot.")
+    parser.add_argument("--output", default=GRAPH_SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD))
+    try:
+        pages, chunks = read_graph(driver)
+    finally:
+        driver.close()
+
+    stats = write_snapshot(args.output, pages, chunks, metadata={
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": NEO4J_URI
+    })
+    text_bytes = sum(len((page["summary"] or "").encode("utf-8")) for page in pages) \
+        + sum(len((chunk["content"] or "").encode("utf-8")) for chunk in chunks)
+    print(f"Wrote {stats['pages']} pages and {stats['chunks']} chunks to {args.output}: "
+          f"{stats['bytes'] / 2**20:.1f} MiB ({text_bytes / 2**20:.1f} MiB of uncompressed text)")
+
+    # Verify that the snapshot opens and serves a page with its chunks
+    snapshot = GraphSnapshot(args.output)
+    if chunks:
+        page_id = chunks[0]["page_id"]
+        page_chunks = [chunk["chunk_id"] for chunk in chunks if chunk["page_id"] == page_id]
+        summary = next(page["summary"] for page in pages if page["page_id"] == page_id)
+        if snapshot.pages([page_id])[page_id]["page_summary"] != (summary or "") \
+                or len(snapshot.chunks([page_id], page_chunks)[page_id]) != len(page_chunks):
+            raise RuntimeError(f"Snapshot {args.output} does not match the graph")
+    snapshot.close()
+
+
+if __name__ == "__main__":
+    main()
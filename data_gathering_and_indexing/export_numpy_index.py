@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import argparse
+import chromadb
+import numpy as np
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from vector_store import COMPACT_DTYPES, compact_embeddings, compact_file_name, is_chunk_shard
+
+CHROMA_PERSIST_DIR = "./chroma_db"
+NUMPY_INDEX_DIR = "./numpy_index"
+COLLECTIONS = ["summaries", "chunks"]
+BATCH_SIZE = 1000
+
+
+def read_collection(collection):
+    """
+    Read every id, embedding and page_id of a ChromaDB collection in batches
+    """
+    ids = []
+    embeddings = []
+    page_ids = []
+    total = collection.count()
+    for offset in tqdm(range(0, total, BATCH_SIZE), desc=f"Reading {collection.name}"):
+        batch = collection.get(
+            limit=BATCH_SIZE,
+            offset=offset,
+            include=["embeddings", "metadatas"]
+        )
+        ids.extend(batch["ids"])
+        embeddings.extend(batch["embeddings"])
+        page_ids.extend((metadata or {}).get("page_id") for metadata in batch["metadatas"])
+    return ids, np.asarray(embeddings, dtype=np.float32), page_ids
+
+
+def group_by_page(ids, matrix, page_ids):
+    """
+    Reorder rows so the rows of every page are contiguous, pages in order of first
+    appearance and rows of a page in their original order
+    """
+    if not any(page_id is not None for page_id in page_ids):
+        return ids, matrix, page_ids
+    first_row = {}
+    for row, page_id in enumerate(page_ids):
+        first_row.setdefault(page_id, row)
+    order = sorted(range(len(ids)), key=lambda row: (first_row[page_ids[row]], row))
+    return [ids[row] for row in order], matrix[order], [page_ids[row] for row in order]
+
+
+def page_blocks(page_ids):
+    """
+    page_id -> [start, end) row range, or None if some page's rows are not contiguous
+    """
+    blocks = {}
+    for row, page_id in enumerate(page_ids):
+        block = blocks.get(page_id)
+        if block is None:
+            blocks[page_id] = [row, row + 1]
+        elif block[1] == row:
+            block[1] = row + 1
+        else:
+            return None
+    return blocks
+
+
+def write_collection(output_dir, name, ids, matrix, page_ids, dtype):
+    """
+    Write a collection in the format read by backend/vector_store.py. When the rows
+    of every page are contiguous, their ranges are stored as page_blocks for exact
+    per-page chunk scoring (CHUNK_RETRIEVAL=exact).
+    """
+    np.save(os.path.join(output_dir, f"{name}.npy"), matrix.astype(dtype))
+    metadata = {"ids": ids}
+    if any(page_id is not None for page_id in page_ids):
+        metadata["page_ids"] = page_ids
+        blocks = page_blocks(page_ids)
+        if blocks is not None:
+            metadata["page_blocks"] = blocks
+    with open(os.path.join(output_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump(metadata, f)
+
+
+def parse_compact_variants(value):
+    """
+    Parse "256.int8,1024.float16" into [(256, "int8"), (1024, "float16")]
+    """
+    variants = []
+    for variant in filter(None, (value or "").split(",")):
+        dimensions, dtype = variant.split(".")
+        if dtype not in COMPACT_DTYPES:
+            raise ValueError(f"Unsupported compact dtype in {variant}, use one of {COMPACT_DTYPES}")
+        variants.append((int(dimensions), dtype))
+    return variants
+
+
+def write_compact_collection(output_dir, name, matrix, dimensions, dtype):
+    """
+    Write a truncated and quantized copy of a collection for coarse search
+    (NUMPY_COARSE_INDEX=<dimensions>.<dtype> in the backend)
+    """
+    variant = f"{dimensions}.{dtype}"
+    compact, scale = compact_embeddings(matrix, dimensions, dtype)
+    np.save(os.path.join(output_dir, compact_file_name(name, variant)), compact)
+    scale_path = os.path.join(output_dir, compact_file_name(name, variant, "scale.npy"))
+    if scale is not None:
+        np.save(scale_path, scale)
+    elif os.path.exists(scale_path):
+        os.remove(scale_path)
+    return compact
+
+
+def export_collection(client, output_dir, name, dtype="float32"):
+    collection = client.get_collection(name=name)
+    ids, matrix, page_ids = group_by_page(*read_collection(collection))
+    write_collection(output_dir, name, ids, matrix, page_ids, dtype)
+    return ids, matrix, page_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export ChromaDB collections into memory-mappable NumPy files.")
+    parser.add_argument("--chroma-dir", default=CHROMA_PERSIST_DIR)
+    parser.add_argument("--output-dir", default=NUMPY_INDEX_DIR)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--compact", default="",
+                        help="Comma-separated <dimensions>.<dtype> compact copies, e.g. 256.int8,1024.float16")
+    args = parser.parse_args()
+    compact_variants = parse_compact_variants(args.compact)
+
+    os.environ['ANONYMIZED_TELEMETRY'] = 'False'
+    client = chromadb.PersistentClient(path=args.chroma_dir)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Per-community chunk shards built with create_embeddings.py --shard-by-community
+    shards = sorted(
+        name for name in (getattr(collection, "name", collection) for collection in client.list_collections())
+        if is_chunk_shard(name)
+    )
+    for name in COLLECTIONS + shards:
+        ids, matrix, _ = export_collection(client, args.output_dir, name, args.dtype)
+        print(f"Exported {name}: {len(ids)} vectors of dimension {matrix.shape[1] if len(ids) else 0} ({args.dtype})")
+        # Shards are searched with full precision, they are small enough not to need coarse copies
+        for dimensions, dtype in ([] if is_chunk_shard(name) else compact_variants):
+            compact = write_compact_collection(args.output_dir, name, matrix, dimensions, dtype)
+            print(f"  compact copy {dimensions}.{dtype}: {compact.nbytes / 2**20:.1f} MiB "
+                  f"(full precision {matrix.nbytes / 2**20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 import os
+import sys
 import json
 import hashlib
+import argparse
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
+from tiktoken import get_encoding
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from neo4j_schema import ensure_schema, verify_schema
 
 load_dotenv()
 
@@ -17,9 +23,36 @@ BASE_URL = "https://www.fhnw.ch"
 
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD))
 
+# Token counts are stored on the nodes so the backend can budget its context without tokenizing
+tokenizer = get_encoding("o200k_base")
+
+def duplicate_file_names():
+    """
+    Find file names shared by several JSON files, which would be merged into one page
+
+    Returns:
+        dict: file_name -> JSON file names, only for duplicates
+    """
+    json_files = {}
+    for json_filename in sorted(os.listdir(JSON_DIR)):
+        if json_filename.endswith('.json'):
+            with open(os.path.join(JSON_DIR, json_filename), 'r', encoding='utf-8') as json_file:
+                file_name = json.load(json_file).get('file_name', '').strip()
+            json_files.setdefault(file_name, []).append(json_filename)
+    return {file_name: names for file_name, names in json_files.items() if len(names) > 1}
+
+
 def create_graph():
     counter = 0
 
+    # Page.file_name is unique, so duplicates are reported before the existing graph is dropped
+    duplicates = duplicate_file_names()
+    if duplicates:
+        print(f"Error: {len(duplicates)} file names occur in several JSON files, the graph was not changed:")
+        for file_name, names in duplicates.items():
+            print(f"  {file_name}: {', '.join(names)}")
+        return False
+
     with driver.session() as session:
         session.run("MATCH (n) DETACH DELETE n")
 
@@ -32,7 +65,11 @@ def create_graph():
         for record in indexes:
             index_name = record["name"]
             session.run(f"DROP INDEX {index_name}")
-        
+
+    # Recreate the serving constraints before loading so MERGE by file_name is index-backed
+    ensure_schema(driver)
+
+    with driver.session() as session:
         for json_filename in os.listdir(JSON_DIR):
             if json_filename.endswith('.json'):
                 json_path = os.path.join(JSON_DIR, json_filename)
@@ -63,13 +100,15 @@ def create_graph():
                     session.run(
                         """
                         MERGE (p:Page {file_name: $file_name})
-                        SET p.url = $url, p.summary = $summary, p.page_id = $page_id, p.number_of_chunks = $number_of_chunks
+                        SET p.url = $url, p.summary = $summary, p.page_id = $page_id, p.number_of_chunks = $number_of_chunks,
+                            p.summary_token_count = $summary_token_count
                         """,
                         file_name=file_name,
                         url=full_url,
                         summary=summary,
                         page_id=page_id,
-                        number_of_chunks=number_of_chunks
+                        number_of_chunks=number_of_chunks,
+                        summary_token_count=len(tokenizer.encode(summary))
                     )
                     
         for json_filename in os.listdir(JSON_DIR):
@@ -98,13 +137,14 @@ def create_graph():
                                 session.run(
                                     """
                                     MATCH (p:Page {file_name: $file_name})
-                                    CREATE (c:Chunk {content: $content, chunk_id: $chunk_id, chunk_number: $chunk_number})
+                                    CREATE (c:Chunk {content: $content, chunk_id: $chunk_id, chunk_number: $chunk_number, token_count: $token_count})
                                     CREATE (p)-[:HAS_CHUNK]->(c)
                                     """,
                                     file_name=file_name,
                                     content=chunk_content,
                                     chunk_id=chunk_id,
-                                    chunk_number=chunk_number
+                                    chunk_number=chunk_number,
+                                    token_count=len(tokenizer.encode(chunk_content))
                                 )
                     else:
                         print(f"Warning: Chunks directory not found for {file_name}")
@@ -128,8 +168,32 @@ def create_graph():
                             from_file_name=file_name,
                             to_file_name=link_file_name
                         )
+    verify_schema(driver)
     print("Graph creation completed.")
+    return True
+
+
+def create_schema():
+    """
+    Add the serving constraints to an existing graph, reporting duplicate values instead
+    """
+    try:
+        ensure_schema(driver)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return False
+    verify_schema(driver)
+    print("Schema creation completed.")
+    return True
+
 
 if __name__ == "__main__":
-    create_graph()
+    parser = argparse.ArgumentParser(description="Populate the Neo4j graph from the summarized and chunked pages.")
+    parser.add_argument("--schema-only", action="store_true",
+                        help="Only create the serving constraints on the existing graph")
+    args = parser.parse_args()
+
+    succeeded = create_schema() if args.schema_only else create_graph()
     driver.close()
+    if not succeeded:
+        sys.exit(1)
@@ -0,0 +1,151 @@
+"""
+Latency and recall of the chunk search on the global chunks collection against
+the per-community shards of create_embeddings.py --shard-by-community.
+
+Every simulated request selects 8 pages from 1 to 3 communities, as select_ids
+groups the selected pages by community, and searches their chunks with 3 query
+embeddings near chunks of those pages. Recall is the overlap of the top 128 and
+top 40 chunks with an exact search over the pages' chunk embeddings.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+import chromadb
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_gathering_and_indexing"))
+from rank_fusion import merge_by_distance
+from vector_store import is_chunk_shard
+from export_numpy_index import read_collection
+
+TOP_N = 128
+
+
+def chroma_query(collection, query_embeddings, page_ids):
+    results = collection.query(
+        query_embeddings=query_embeddings,
+        n_results=TOP_N,
+        where={"page_id": {"$in": page_ids}},
+        include=["distances"]
+    )
+    return results["ids"], results["distances"]
+
+
+def exact_search(matrix, page_rows, query_embeddings, page_ids):
+    rows = np.concatenate([page_rows[page_id] for page_id in page_ids])
+    distances = ((query_embeddings[:, np.newaxis, :] - matrix[rows][np.newaxis, :, :]) ** 2).sum(axis=2)
+    order = np.argsort(distances, axis=1)[:, :TOP_N]
+    return [rows[query_order].tolist() for query_order in order]
+
+
+def make_requests(page_communities, page_rows, matrix, num_requests, noise):
+    communities = {}
+    for page_id, community in page_communities.items():
+        communities.setdefault(community, []).append(page_id)
+    requests = []
+    for _ in range(num_requests):
+        chosen = random.sample(list(communities), min(random.randint(1, 3), len(communities)))
+        candidates = [page_id for community in chosen for page_id in communities[community]]
+        page_ids = random.sample(candidates, min(8, len(candidates)))
+        rows = np.concatenate([page_rows[page_id] for page_id in page_ids])
+        queries = matrix[np.random.choice(rows, 3)] + np.random.normal(0, noise, (3, matrix.shape[1])).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        requests.append((page_ids, queries))
+    return requests
+
+
+def overlap(exact_rows, ids, row_ids, k):
+    scores = [
+        len({row_ids[row] for row in reference[:k]} & set(result[:k])) / len(reference[:k])
+        for reference, result in zip(exact_rows, ids)
+        if reference
+    ]
+    return statistics.mean(scores) if scores else 1.0
+
+
+def summarize(name, latencies, recalls_128, recalls_40):
+    latencies = sorted(latencies)
+    print(f"{name:<22}{statistics.median(latencies):>9.2f}ms{latencies[int(0.95 * (len(latencies) - 1))]:>9.2f}ms"
+          f"{statistics.mean(recalls_128):>12.3f}{statistics.mean(recalls_40):>11.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the global chunk collection with per-community shards.")
+    parser.add_argument("--chroma-dir", default="../backend/chroma_db")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.05)
+    args = parser.parse_args()
+
+    random.seed(42)
+    np.random.seed(42)
+    os.environ['ANONYMIZED_TELEMETRY'] = 'False'
+    client = chromadb.PersistentClient(path=args.chroma_dir)
+    global_collection = client.get_collection("chunks")
+    shard_names = sorted(
+        name for name in (getattr(c, "name", c) for c in client.list_collections()) if is_chunk_shard(name)
+    )
+    if not shard_names:
+        raise SystemExit("No chunk shards found, build them with create_embeddings.py --shard-by-community")
+    shards = {name: client.get_collection(name) for name in shard_names}
+
+    ids, matrix, page_ids = read_collection(global_collection)
+    page_rows = {}
+    for row, page_id in enumerate(page_ids):
+        page_rows.setdefault(page_id, []).append(row)
+    page_rows = {page_id: np.asarray(rows) for page_id, rows in page_rows.items()}
+
+    page_communities = {}
+    for name, shard in shards.items():
+        for metadata in shard.get(include=["metadatas"])["metadatas"]:
+            page_communities[metadata["page_id"]] = name
+
+    requests = make_requests(page_communities, page_rows, matrix, args.requests, args.noise)
+    sizes = sorted(shard.count() for shard in shards.values())
+    print(f"\n{len(ids)} chunks, {len(shards)} shards (median {statistics.median(sizes):.0f}, largest {sizes[-1]} chunks), "
+          f"{len(requests)} requests of 8 pages\n")
+
+    def search_global(page_ids, queries):
+        return chroma_query(global_collection, queries.tolist(), page_ids)
+
+    def shard_searches(page_ids):
+        by_shard = {}
+        for page_id in page_ids:
+            by_shard.setdefault(page_communities[page_id], []).append(page_id)
+        return by_shard.items()
+
+    def search_sharded(page_ids, queries):
+        return merge_by_distance([chroma_query(shards[name], queries.tolist(), shard_pages)
+                                  for name, shard_pages in shard_searches(page_ids)], TOP_N)
+
+    pool = ThreadPoolExecutor(8)
+
+    def search_sharded_concurrent(page_ids, queries):
+        futures = [pool.submit(chroma_query, shards[name], queries.tolist(), shard_pages)
+                   for name, shard_pages in shard_searches(page_ids)]
+        return merge_by_distance([future.result() for future in futures], TOP_N)
+
+    print(f"{'index':<22}{'p50':>11}{'p95':>11}{'recall@128':>12}{'recall@40':>11}")
+    for name, search in (("global", search_global), ("sharded", search_sharded),
+                         ("sharded, concurrent", search_sharded_concurrent)):
+        for page_ids_, queries in requests[:10]:
+            search(page_ids_, queries)
+        latencies, recalls_128, recalls_40 = [], [], []
+        for page_ids_, queries in requests:
+            start = time.perf_counter()
+            result_ids, _ = search(page_ids_, queries)
+            latencies.append((time.perf_counter() - start) * 1000)
+            exact_rows = exact_search(matrix, page_rows, queries, page_ids_)
+            recalls_128.append(overlap(exact_rows, result_ids, ids, TOP_N))
+            recalls_40.append(overlap(exact_rows, result_ids, ids, 40))
+        summarize(name, latencies, recalls_128, recalls_40)
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
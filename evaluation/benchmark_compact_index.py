@@ -0,0 +1,143 @@
+"""
+Memory, latency and recall of coarse search on compact embedding copies.
+
+For every <dimensions>.<dtype> variant and rescore factor, searches the summaries
+(top 36) and all chunks (top 128) of a NumPy index with NUMPY_COARSE_INDEX-style
+coarse search plus full-precision rescoring, and compares the results with exact
+search. The compact copies are written to a temporary directory next to links to
+the full-precision index, so the index itself is left untouched.
+
+Queries are the cached rewritten-query embeddings of benchmark_retrieval.py when
+--query-cache exists, otherwise stored summaries with noise added.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_gathering_and_indexing"))
+from vector_store import NumpyVectorStore, compact_file_name
+from export_numpy_index import parse_compact_variants, write_compact_collection
+from benchmark_vector_backends import make_queries
+
+SEARCHES = [("summaries", 36), ("chunks", 128)]
+
+
+def load_queries(path, store, num_requests):
+    """
+    Query batches of 3 embeddings, like the rewritten queries of one request
+    """
+    cache = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    batches = [
+        np.stack([np.frombuffer(base64.b64decode(e), dtype="<f4") for e in entry["embeddings"]])
+        for entry in cache.values() if entry.get("embeddings")
+    ]
+    dimensions = store.get_collection("summaries")["matrix"].shape[1]
+    batches = [batch for batch in batches if batch.shape[1] == dimensions]
+    if batches:
+        return batches, "cached rewritten queries"
+    return make_queries(store, num_requests, 3), "stored summaries with noise"
+
+
+def run_searches(store, batches):
+    """
+    Returns:
+        dict: collection -> (latencies in ms, result ids per batch)
+    """
+    results = {}
+    for name, n_results in SEARCHES:
+        # Warm up the memory maps
+        for batch in batches[:5]:
+            store.query(name, batch, n_results)
+        latencies = []
+        ids = []
+        for batch in batches:
+            start = time.perf_counter()
+            batch_ids, _ = store.query(name, batch, n_results)
+            latencies.append((time.perf_counter() - start) * 1000)
+            ids.append(batch_ids)
+        results[name] = (latencies, ids)
+    return results
+
+
+def recall(exact, candidate):
+    scores = [
+        len(set(ref) & set(cand)) / len(ref)
+        for ref_lists, cand_lists in zip(exact, candidate)
+        for ref, cand in zip(ref_lists, cand_lists)
+        if ref
+    ]
+    return statistics.mean(scores) if scores else 1.0
+
+
+def link_full_index(source_dir, target_dir):
+    for name, _ in SEARCHES:
+        for suffix in ("npy", "json"):
+            os.symlink(os.path.abspath(os.path.join(source_dir, f"{name}.{suffix}")),
+                       os.path.join(target_dir, f"{name}.{suffix}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark coarse search on compact embedding copies.")
+    parser.add_argument("--numpy-dir", default="../backend/numpy_index")
+    parser.add_argument("--variants", default="256.int8,256.float16,1024.int8,1024.float16")
+    parser.add_argument("--rescore-factors", default="1,4,8")
+    parser.add_argument("--query-cache", default="retrieval_benchmark_cache.json")
+    parser.add_argument("--requests", type=int, default=100, help="Query batches when no query cache exists")
+    args = parser.parse_args()
+
+    random.seed(42)
+    np.random.seed(42)
+
+    exact_store = NumpyVectorStore(args.numpy_dir)
+    batches, source = load_queries(args.query_cache, exact_store, args.requests)
+    full_sizes = {name: exact_store.get_collection(name)["matrix"].nbytes for name, _ in SEARCHES}
+    print(f"\n{len(batches)} requests of 3 queries ({source}), "
+          + ", ".join(f"{name} {exact_store.get_collection(name)['matrix'].shape[0]} vectors" for name, _ in SEARCHES))
+
+    exact = run_searches(exact_store, batches)
+    print(f"\n{'variant':<16}{'rescore':>8}{'MiB':>9}{'sum p50':>10}{'sum recall':>11}{'chunk p50':>11}{'chunk p95':>11}{'chunk recall':>13}")
+    print(f"{'exact':<16}{'':>8}{sum(full_sizes.values()) / 2**20:>9.1f}"
+          f"{statistics.median(exact['summaries'][0]):>8.2f}ms{1.0:>11.3f}"
+          f"{statistics.median(exact['chunks'][0]):>9.2f}ms"
+          f"{sorted(exact['chunks'][0])[int(0.95 * (len(batches) - 1))]:>9.2f}ms{1.0:>13.3f}")
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        link_full_index(args.numpy_dir, index_dir)
+        for dimensions, dtype in parse_compact_variants(args.variants):
+            variant = f"{dimensions}.{dtype}"
+            compact_bytes = 0
+            for name, _ in SEARCHES:
+                matrix = exact_store.get_collection(name)["matrix"]
+                compact_bytes += write_compact_collection(index_dir, name, matrix, dimensions, dtype).nbytes
+                if dtype == "int8":
+                    compact_bytes += os.path.getsize(os.path.join(index_dir, compact_file_name(name, variant, "scale.npy")))
+
+            for factor in map(int, args.rescore_factors.split(",")):
+                store = NumpyVectorStore(index_dir, coarse_variant=variant, rescore_factor=factor)
+                results = run_searches(store, batches)
+                chunk_latencies = sorted(results["chunks"][0])
+                print(f"{variant:<16}{factor:>7}x{compact_bytes / 2**20:>9.1f}"
+                      f"{statistics.median(results['summaries'][0]):>8.2f}ms"
+                      f"{recall(exact['summaries'][1], results['summaries'][1]):>11.3f}"
+                      f"{statistics.median(chunk_latencies):>9.2f}ms"
+                      f"{chunk_latencies[int(0.95 * (len(chunk_latencies) - 1))]:>9.2f}ms"
+                      f"{recall(exact['chunks'][1], results['chunks'][1]):>13.3f}")
+
+    print("\nMiB is the memory coarse search keeps resident; rescoring reads only the shortlisted "
+          "rows (rescore x results per query) of the full-precision matrix.")
+
+
+if __name__ == "__main__":
+    main()
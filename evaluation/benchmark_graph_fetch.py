@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import random
+import statistics
+from dotenv import load_dotenv
+from neo4j import GraphDatabase
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from rag_chatbot import CHUNKS_QUERY
+from graph_snapshot import GraphSnapshot
+
+# Query used by query_neo4j_chunks before it was batched, one round trip per page
+PER_PAGE_CHUNKS_QUERY = """
+    MATCH (p:Page) WHERE p.page_id = $page_id
+    MATCH (p)-[:HAS_CHUNK]->(c:Chunk) WHERE c.chunk_id IN $chunk_ids
+    RETURN c.chunk_id as chunk_id,
+        c.content as chunk_content,
+        c.chunk_number as chunk_number,
+        c.token_count as token_count
+    ORDER BY c.chunk_number
+    """
+
+
+def sample_requests(session, num_requests, pages_per_request, chunks_per_request):
+    """
+    Build realistic (page_ids, chunk_ids) pairs from pages that have chunks.
+    """
+    pages = session.run(
+        """
+        MATCH (p:Page)-[:HAS_CHUNK]->(c:Chunk)
+        RETURN p.page_id as page_id, collect(c.chunk_id) as chunk_ids
+        """
+    ).data()
+
+    requests = []
+    for _ in range(num_requests):
+        selected = random.sample(pages, min(pages_per_request, len(pages)))
+        page_ids = [page["page_id"] for page in selected]
+        candidate_chunks = [chunk_id for page in selected for chunk_id in page["chunk_ids"]]
+        chunk_ids = random.sample(candidate_chunks, min(chunks_per_request, len(candidate_chunks)))
+        requests.append((page_ids, chunk_ids))
+    return requests
+
+
+def fetch_per_page(session, page_ids, chunk_ids):
+    context_results = {}
+    for page_id in page_ids:
+        results = session.run(PER_PAGE_CHUNKS_QUERY, {"page_id": page_id, "chunk_ids": chunk_ids}).data()
+        if results:
+            context_results[page_id] = results
+    return context_results
+
+
+def fetch_batched(session, page_ids, chunk_ids):
+    results = session.run(CHUNKS_QUERY, {"page_ids": page_ids, "chunk_ids": chunk_ids}).data()
+    return {result["page_id"]: result["chunks"] for result in results if result["chunks"]}
+
+
+def time_fetch(driver, fetch, requests):
+    latencies = []
+    for page_ids, chunk_ids in requests:
+        start = time.perf_counter()
+        with driver.session() as session:
+            fetch(session, page_ids, chunk_ids)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def time_snapshot(snapshot, requests):
+    latencies = []
+    for page_ids, chunk_ids in requests:
+        start = time.perf_counter()
+        snapshot.chunks(page_ids, chunk_ids)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{name:<12} mean {statistics.mean(latencies):8.2f} ms   p50 {statistics.median(latencies):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def main():
+    load_dotenv()
+    neo4j_uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+    neo4j_username = os.getenv("NEO4J_USERNAME", "neo4j")
+    neo4j_password = os.getenv("NEO4J_PASS")
+    if not neo4j_password:
+        raise ValueError("NEO4J_PASS not found in environment.")
+
+    num_requests = 200
+    pages_per_request = 8
+    chunks_per_request = 40
+
+    # With GRAPH_SNAPSHOT_PATH set, the snapshot of export_graph_snapshot.py is compared too
+    snapshot_path = os.getenv("GRAPH_SNAPSHOT_PATH")
+    snapshot = GraphSnapshot(snapshot_path) if snapshot_path else None
+
+    random.seed(42)
+    driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_username, neo4j_password))
+    try:
+        with driver.session() as session:
+            requests = sample_requests(session, num_requests, pages_per_request, chunks_per_request)
+
+        # Check both paths return the same chunks before timing them
+        with driver.session() as session:
+            for page_ids, chunk_ids in requests[:10]:
+                per_page = fetch_per_page(session, page_ids, chunk_ids)
+                batched = fetch_batched(session, page_ids, chunk_ids)
+                if per_page != batched:
+                    raise RuntimeError(f"Batched fetch differs from per-page fetch for pages {page_ids}")
+                if snapshot is not None and snapshot.chunks(page_ids, chunk_ids) != batched:
+                    raise RuntimeError(f"Snapshot fetch differs from Neo4j fetch for pages {page_ids}")
+
+        # Warm up connection pool and query caches
+        time_fetch(driver, fetch_per_page, requests[:10])
+        time_fetch(driver, fetch_batched, requests[:10])
+
+        per_page_latencies = time_fetch(driver, fetch_per_page, requests)
+        batched_latencies = time_fetch(driver, fetch_batched, requests)
+        snapshot_latencies = time_snapshot(snapshot, requests) if snapshot is not None else None
+    finally:
+        driver.close()
+
+    print(f"\n{num_requests} requests, {pages_per_request} pages and {chunks_per_request} chunks each\n")
+    summarize("per-page", per_page_latencies)
+    summarize("batched", batched_latencies)
+    if snapshot_latencies is not None:
+        summarize("snapshot", snapshot_latencies)
+    print(f"\nSpeedup (mean): {statistics.mean(per_page_latencies) / statistics.mean(batched_latencies):.2f}x")
+    if snapshot_latencies is not None:
+        print(f"Snapshot vs batched (mean): {statistics.mean(batched_latencies) / statistics.mean(snapshot_latencies):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
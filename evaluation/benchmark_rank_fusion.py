@@ -0,0 +1,90 @@
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from rank_fusion import reciprocal_rank_fusion
+
+
+def legacy_reciprocal_rank_fusion(list_of_ranked_lists, top_k):
+    """
+    The list.index() based implementation previously used by UniversityRAGChatbot.
+    """
+    K = len(list_of_ranked_lists)
+
+    all_items = set()
+    for ranked_list in list_of_ranked_lists:
+        all_items.update(ranked_list)
+
+    rrf_scores = {}
+
+    for item in all_items:
+        score = 0.0
+        for ranked_list in list_of_ranked_lists:
+            try:
+                rank = ranked_list.index(item)
+                score += 1.0 / (K + rank)
+            except ValueError:
+                pass
+        rrf_scores[item] = score
+
+    sorted_items = sorted(rrf_scores.items(), key=lambda x: x[1], reverse=True)
+
+    return [item[0] for item in sorted_items[:top_k]]
+
+
+def rrf_score(ranked_lists, item):
+    return sum(1.0 / (len(ranked_lists) + ranked_list.index(item)) for ranked_list in ranked_lists if item in ranked_list)
+
+
+def make_ranked_lists(num_lists, top_n, pool_size):
+    """
+    Simulate the results of rewritten queries: overlapping rankings drawn from a shared pool.
+    """
+    pool = [f"c_{random.getrandbits(32):08x}_{i}" for i in range(pool_size)]
+    ranked_lists = [random.sample(pool, top_n) for _ in range(num_lists)]
+    distances = [sorted(random.uniform(0.6, 1.4) for _ in range(top_n)) for _ in range(num_lists)]
+    return ranked_lists, distances
+
+
+def main():
+    random.seed(42)
+    repeats = 2000
+
+    # (stage, top_n, top_k, candidate pool)
+    scenarios = [
+        ("summaries", 36, 12, 80),
+        ("chunks", 128, 40, 300),
+        ("chunks x2", 256, 40, 600),
+    ]
+
+    print(f"{'stage':<12}{'top_n':>6}{'legacy (us)':>14}{'rank map (us)':>16}{'+distances (us)':>18}{'speedup':>10}")
+    for stage, top_n, top_k, pool_size in scenarios:
+        ranked_lists, distances = make_ranked_lists(3, top_n, pool_size)
+
+        # Both implementations must select items with the same fused scores (ties may swap)
+        legacy = legacy_reciprocal_rank_fusion(ranked_lists, top_k)
+        fused = reciprocal_rank_fusion(ranked_lists, top_k)
+        if [round(rrf_score(ranked_lists, item), 12) for item in legacy] != \
+                [round(rrf_score(ranked_lists, item), 12) for item in fused]:
+            raise RuntimeError(f"Fusion results differ for {stage}")
+
+        legacy_time = timeit.timeit(lambda: legacy_reciprocal_rank_fusion(ranked_lists, top_k), number=repeats)
+        fused_time = timeit.timeit(lambda: reciprocal_rank_fusion(ranked_lists, top_k), number=repeats)
+        weighted_time = timeit.timeit(
+            lambda: reciprocal_rank_fusion(ranked_lists, top_k, distances=distances, distance_weight=0.5),
+            number=repeats
+        )
+
+        print(
+            f"{stage:<12}{top_n:>6}"
+            f"{legacy_time / repeats * 1e6:>14.1f}"
+            f"{fused_time / repeats * 1e6:>16.1f}"
+            f"{weighted_time / repeats * 1e6:>18.1f}"
+            f"{legacy_time / fused_time:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Retrieval-only benchmark over test_dataset.json.
+
+Runs retrieve for every test query and reports:
+- recall@k of the labelled pages in the fused summary ranking, and the share of
+  labelled pages that made it into the context (with --labels)
+- answer coverage: the share of the correct response's terms (names, numbers,
+  content words) found in the retrieved context, which needs no labels
+- context tokens and per-stage latency
+
+Query rewrites and their embeddings are cached in --cache after the first run, so
+later runs call neither gpt-4o nor the embedding API and only measure retrieval.
+Delete the cache (or pass --refresh) after changing the rewrite prompt or model.
+
+Write a baseline with --output and check a change against it with --compare, which
+exits with status 1 if recall, coverage, context size or latency regressed beyond
+the tolerances. Labels are a JSON object mapping queries to relevant page URLs (or
+page ids); --write-labels seeds such a file from the current retrieval, as pages in
+the context that contain most of the correct response, for manual review.
+"""
+import os
+import re
+import sys
+import json
+import base64
+import argparse
+import statistics
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from rag_chatbot import UniversityRAGChatbot
+from stage_timer import StageTimer
+
+WELCOME_MESSAGE = "Welcome to FHNW! I'm your chatbot assistant, and I'm here to help answer any questions you may have about our university. Feel free to ask me about our programs, services, or research opportunities. How can I assist you today?"
+RECALL_AT = (1, 3, 5, 12)
+STOPWORDS = {
+    "the", "and", "for", "with", "are", "about", "information", "per", "from", "its", "this",
+    "that", "there", "their", "which", "has", "have", "was", "were", "you", "your", "who"
+}
+PAGE_HEADER = re.compile(r"^# Page summary \(URL: (.*?)\):$", re.MULTILINE)
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def normalize_number(text):
+    # 5,700 / 5'700 / 5 700 -> 5700
+    return re.sub(r"(?<=\d)[,.'’ ](?=\d{3}\b)", "", text)
+
+
+def answer_terms(correct_response):
+    """
+    Significant lowercase terms of a correct response: numbers and content words
+    """
+    text = normalize_number(correct_response.lower())
+    terms = []
+    for term in re.findall(r"[^\W_]+", text):
+        if term.isdigit() or (len(term) >= 3 and term not in STOPWORDS):
+            terms.append(term)
+    return list(dict.fromkeys(terms))
+
+
+def coverage(terms, context):
+    if not terms:
+        return 1.0
+    words = set(re.findall(r"[^\W_]+", normalize_number(context.lower())))
+    return sum(term in words for term in terms) / len(terms)
+
+
+def encode_embedding(embedding):
+    return base64.b64encode(np.asarray(embedding, dtype="<f4").tobytes()).decode("ascii")
+
+
+def decode_embedding(value):
+    return np.frombuffer(base64.b64decode(value), dtype="<f4")
+
+
+def load_cache(path):
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def rewrite_and_embed(chatbot, query, cache):
+    """
+    Cached rewrite and embeddings of a first-turn query, formatted and rewritten as
+    in UniversityRAGChatbot.prepare_response
+
+    Returns:
+        tuple: (retrieval_needed, rewritten_queries, embeddings)
+    """
+    entry = cache.get(query)
+    if entry is None:
+        latest_query, formatted_conversation = chatbot.format_conversation([
+            {"role": "assistant", "content": WELCOME_MESSAGE},
+            {"role": "user", "content": query}
+        ])
+        fast_rewrite = None
+        if chatbot.fast_path is not None:
+            fast_rewrite = chatbot.fast_rewrite(formatted_conversation, latest_query)
+        if fast_rewrite is not None:
+            retrieval_needed, rewritten_queries = fast_rewrite
+        else:
+            retrieval_needed, rewritten_queries = chatbot.rewrite_query(formatted_conversation, latest_query)
+        entry = {
+            "retrieval_needed": bool(retrieval_needed),
+            "rewritten_queries": rewritten_queries,
+            "embeddings": [encode_embedding(e) for e in chatbot.embed_queries(rewritten_queries)]
+        }
+        cache[query] = entry
+    return entry["retrieval_needed"], entry["rewritten_queries"], [decode_embedding(e) for e in entry["embeddings"]]
+
+
+def is_relevant(page_id, page_urls, labels):
+    return page_id in labels or page_urls.get(page_id) in labels
+
+
+def benchmark_query(chatbot, item, cache, labels, repeats):
+    retrieval_needed, rewritten_queries, embeddings = rewrite_and_embed(chatbot, item["query"], cache)
+    terms = answer_terms(item["correct_response"])
+    result = {
+        "query": item["query"],
+        "retrieval_needed": retrieval_needed,
+        "rewritten_queries": rewritten_queries
+    }
+    if not retrieval_needed:
+        return result
+
+    # Serve the cached embeddings so only retrieval is measured
+    cached = dict(zip(rewritten_queries, embeddings))
+    embed_queries = chatbot.embed_queries
+    chatbot.embed_queries = lambda texts: [cached[text] if text in cached else embed_queries([text])[0] for text in texts]
+    try:
+        stage_runs = []
+        for _ in range(repeats):
+            timer = StageTimer()
+            retrieved = chatbot.retrieve(rewritten_queries, timer=timer)
+            stage_runs.append(timer.summary())
+    finally:
+        chatbot.embed_queries = embed_queries
+
+    stages = {}
+    for summary in stage_runs:
+        for name, span in summary.items():
+            stages.setdefault(name, []).append(span["busy_ms"])
+    result.update({
+        "context_tokens": retrieved["context_tokens"],
+        "answer_coverage": coverage(terms, retrieved["context"]),
+        "ranked_pages": [retrieved["page_urls"].get(page_id, page_id) for page_id in retrieved["ranked_page_ids"]],
+        "context_pages": [retrieved["page_urls"].get(page_id, page_id) for page_id in retrieved["context_page_ids"]],
+        "stage_ms": {name: statistics.median(values) for name, values in stages.items()},
+        "total_ms": statistics.median(max(span["end_ms"] for span in summary.values()) for summary in stage_runs)
+    })
+
+    relevant = labels.get(item["query"])
+    if relevant:
+        relevant = set(relevant)
+        page_urls = retrieved["page_urls"]
+        result["recall"] = {
+            str(k): sum(is_relevant(page_id, page_urls, relevant) for page_id in retrieved["ranked_page_ids"][:k]) / len(relevant)
+            for k in RECALL_AT
+        }
+        result["context_recall"] = sum(
+            is_relevant(page_id, page_urls, relevant) for page_id in retrieved["context_page_ids"]
+        ) / len(relevant)
+
+    # Pages of the context that contain most of the correct response, as label suggestions
+    page_texts = PAGE_HEADER.split(retrieved["context"])[1:]
+    result["suggested_pages"] = [
+        url for url, text in zip(page_texts[::2], page_texts[1::2])
+        if terms and coverage(terms, text) >= 0.6
+    ]
+    return result
+
+
+def summarize(results):
+    retrieved = [result for result in results if result["retrieval_needed"]]
+    summary = {
+        "queries": len(results),
+        "retrieval_needed": len(retrieved),
+        "answer_coverage": statistics.mean(r["answer_coverage"] for r in retrieved) if retrieved else float("nan"),
+        "fully_covered": sum(r["answer_coverage"] == 1.0 for r in retrieved),
+        "context_tokens": {
+            "mean": statistics.mean(r["context_tokens"] for r in retrieved) if retrieved else float("nan"),
+            "p50": percentile([r["context_tokens"] for r in retrieved], 0.5),
+            "p95": percentile([r["context_tokens"] for r in retrieved], 0.95)
+        },
+        "latency_ms": {
+            "p50": percentile([r["total_ms"] for r in retrieved], 0.5),
+            "p95": percentile([r["total_ms"] for r in retrieved], 0.95)
+        },
+        "stage_ms": {}
+    }
+    for name in dict.fromkeys(name for r in retrieved for name in r["stage_ms"]):
+        values = [r["stage_ms"][name] for r in retrieved if name in r["stage_ms"]]
+        summary["stage_ms"][name] = {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
+
+    labelled = [r for r in retrieved if "recall" in r]
+    if labelled:
+        summary["labelled"] = len(labelled)
+        summary["recall"] = {str(k): statistics.mean(r["recall"][str(k)] for r in labelled) for k in RECALL_AT}
+        summary["context_recall"] = statistics.mean(r["context_recall"] for r in labelled)
+    return summary
+
+
+def print_summary(summary):
+    print(f"\n{summary['queries']} queries, {summary['retrieval_needed']} needing retrieval")
+    if "recall" in summary:
+        print(f"Page recall ({summary['labelled']} labelled): "
+              + ", ".join(f"@{k} {value:.3f}" for k, value in summary["recall"].items())
+              + f", in context {summary['context_recall']:.3f}")
+    print(f"Answer coverage: {summary['answer_coverage']:.3f} "
+          f"({summary['fully_covered']} of {summary['retrieval_needed']} fully covered)")
+    tokens = summary["context_tokens"]
+    print(f"Context tokens: mean {tokens['mean']:.0f}, p50 {tokens['p50']:.0f}, p95 {tokens['p95']:.0f}")
+    print(f"\n{'stage':<20}{'p50':>10}{'p95':>10}")
+    for name, values in summary["stage_ms"].items():
+        print(f"{name:<20}{values['p50']:>8.1f}ms{values['p95']:>8.1f}ms")
+    print(f"{'total':<20}{summary['latency_ms']['p50']:>8.1f}ms{summary['latency_ms']['p95']:>8.1f}ms")
+
+
+def compare(summary, results, baseline, args):
+    """
+    Returns:
+        list of str: Regressions against the baseline
+    """
+    regressions = []
+    old = baseline["summary"]
+    if "recall" in summary and "recall" in old:
+        for k, value in summary["recall"].items():
+            if value < old["recall"].get(k, 0.0) - args.recall_tolerance:
+                regressions.append(f"recall@{k} {old['recall'][k]:.3f} -> {value:.3f}")
+        if summary["context_recall"] < old["context_recall"] - args.recall_tolerance:
+            regressions.append(f"context recall {old['context_recall']:.3f} -> {summary['context_recall']:.3f}")
+    if summary["answer_coverage"] < old["answer_coverage"] - args.recall_tolerance:
+        regressions.append(f"answer coverage {old['answer_coverage']:.3f} -> {summary['answer_coverage']:.3f}")
+    if summary["context_tokens"]["mean"] > old["context_tokens"]["mean"] * (1 + args.tokens_tolerance):
+        regressions.append(f"mean context tokens {old['context_tokens']['mean']:.0f} -> {summary['context_tokens']['mean']:.0f}")
+    if summary["latency_ms"]["p50"] > old["latency_ms"]["p50"] * (1 + args.latency_tolerance):
+        regressions.append(f"p50 retrieval latency {old['latency_ms']['p50']:.1f}ms -> {summary['latency_ms']['p50']:.1f}ms")
+
+    # Queries that lost coverage or recall, to point at what changed
+    old_results = {result["query"]: result for result in baseline["results"]}
+    for result in results:
+        before = old_results.get(result["query"])
+        if not before or not result["retrieval_needed"] or not before["retrieval_needed"]:
+            continue
+        if result["answer_coverage"] < before["answer_coverage"]:
+            print(f"  coverage {before['answer_coverage']:.2f} -> {result['answer_coverage']:.2f}: {result['query']}")
+        if "recall" in result and "recall" in before and result["context_recall"] < before["context_recall"]:
+            print(f"  context recall {before['context_recall']:.2f} -> {result['context_recall']:.2f}: {result['query']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency on the test dataset.")
+    parser.add_argument("--dataset", default="test_dataset.json")
+    parser.add_argument("--cache", default="retrieval_benchmark_cache.json", help="Cached rewrites and embeddings")
+    parser.add_argument("--refresh", action="store_true", help="Rewrite and embed all queries again")
+    parser.add_argument("--labels", default="retrieval_labels.json", help="Query -> relevant page URLs or ids")
+    parser.add_argument("--write-labels", default=None, help="Write suggested labels to this file")
+    parser.add_argument("--repeats", type=int, default=3, help="Retrievals per query; latencies are medians")
+    parser.add_argument("--output", default=None, help="Write the results as a baseline to this file")
+    parser.add_argument("--compare", default=None, help="Baseline file to check for regressions")
+    parser.add_argument("--recall-tolerance", type=float, default=0.01)
+    parser.add_argument("--tokens-tolerance", type=float, default=0.10)
+    parser.add_argument("--latency-tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    with open(args.dataset, "r", encoding="utf-8") as f:
+        dataset = json.load(f)
+    cache = {} if args.refresh else load_cache(args.cache)
+    labels = load_cache(args.labels)
+
+    chatbot = UniversityRAGChatbot()
+    results = []
+    for i, item in enumerate(dataset):
+        results.append(benchmark_query(chatbot, item, cache, labels, args.repeats))
+        print(f"\r{i + 1}/{len(dataset)} queries", end="", flush=True)
+    print()
+
+    with open(args.cache, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+
+    summary = summarize(results)
+    config = {
+        "vector_backend": chatbot.vector_backend,
+        "retrieval_execution": chatbot.retrieval_execution,
+        "context_token_budget": chatbot.context_token_budget
+    }
+    # The derived index version changes with every rebuild, only an explicit one is compared
+    if chatbot.configured_index_version:
+        config["index_version"] = chatbot.configured_index_version
+    print_summary(summary)
+
+    if args.write_labels:
+        suggested = {r["query"]: r["suggested_pages"] for r in results if r.get("suggested_pages")}
+        with open(args.write_labels, "w", encoding="utf-8") as f:
+            json.dump(suggested, f, indent=4, ensure_ascii=False)
+        print(f"\nSuggested labels for {len(suggested)} queries written to {args.write_labels}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "summary": summary, "results": results}, f, indent=4, ensure_ascii=False)
+        print(f"\nBaseline written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["config"] != config:
+            print(f"\nNote: baseline config {baseline['config']} differs from {config}")
+        regressions = compare(summary, results, baseline, args)
+        if regressions:
+            print("\nRegressions against " + args.compare + ":\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from sse import coalesce, text_event, DONE_EVENT
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def load_answers(path):
+    """
+    Recorded chatbot answers from an evaluate_chatbot.py results file
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        results = json.load(f)["evaluation_results"]
+    return [result["chatbot_response"] for result in results if result["chatbot_response"] not in ("", "ERROR")]
+
+
+# Word pieces with their leading space, punctuation runs and whitespace, roughly how
+# the BPE tokenizer of gpt-4o-mini splits text; long words are cut into 4-char pieces
+PIECE_PATTERN = re.compile(r" ?[^\W_]{1,4}| ?[^\w\s]+|\s+|_")
+
+
+def token_deltas(answer, tokens_per_second, rng):
+    """
+    Split an answer into token-sized deltas with arrival times, like an OpenAI stream
+    """
+    deltas = []
+    now = 0.0
+    for piece in PIECE_PATTERN.findall(answer):
+        now += rng.expovariate(tokens_per_second)
+        deltas.append((now, piece))
+    return deltas
+
+
+def legacy_event(text):
+    # Framing before coalescing: json.dumps per delta
+    return f"data: {json.dumps({'text': text})}\n\n".encode("utf-8")
+
+
+def frame_answer(deltas, max_chars, max_delay, event):
+    """
+    Returns:
+        dict: events, bytes and writes of the answer, serialization time, and the
+            delay coalescing added to every character
+    """
+    clock = FakeClock()
+    arrivals = []
+
+    def stream():
+        for arrival, text in deltas:
+            clock.now = arrival
+            arrivals.extend([arrival] * len(text))
+            yield text
+
+    events = 0
+    size = 0
+    serialize_seconds = 0.0
+    delays = []
+    sent = 0
+    for text in coalesce(stream(), max_chars=max_chars, max_delay=max_delay, clock=clock):
+        start = time.perf_counter()
+        payload = event(text)
+        serialize_seconds += time.perf_counter() - start
+        events += 1
+        size += len(payload)
+        delays.extend(clock.now - arrival for arrival in arrivals[sent:sent + len(text)])
+        sent += len(text)
+
+    size += len(DONE_EVENT)
+    return {
+        "events": events,
+        "bytes": size,
+        # One write (and send syscall) per event plus [DONE], as the WSGI and ASGI servers flush every chunk
+        "writes": events + 1,
+        "serialize_us": serialize_seconds * 1e6,
+        "mean_delay_ms": statistics.mean(delays) * 1000 if delays else 0.0,
+        "max_delay_ms": max(delays, default=0.0) * 1000
+    }
+
+
+def parse_config(value):
+    chars, milliseconds = value.split(":")
+    return int(chars), float(milliseconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SSE framing strategies on recorded answers.")
+    parser.add_argument("--answers", default="evaluation_results.json")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--configs", default="64:30,128:50,64:0,0:30",
+                        help="Comma-separated chars:milliseconds coalescing settings")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    answers = load_answers(args.answers)
+    streams = [token_deltas(answer, args.tokens_per_second, rng) for answer in answers]
+    print(f"\n{len(answers)} answers, mean {statistics.mean(len(s) for s in streams):.0f} deltas each, "
+          f"{args.tokens_per_second:.0f} tokens/s\n")
+
+    strategies = [("per delta, json.dumps", 0, 0.0, legacy_event), ("per delta, orjson", 0, 0.0, text_event)]
+    for chars, milliseconds in map(parse_config, args.configs.split(",")):
+        strategies.append((f"{chars} chars / {milliseconds:g} ms", chars, milliseconds / 1000, text_event))
+
+    print(f"{'framing':<24}{'events':>8}{'writes':>8}{'bytes':>9}{'serialize':>12}{'mean delay':>12}{'max delay':>11}")
+    for name, max_chars, max_delay, event in strategies:
+        results = [frame_answer(deltas, max_chars, max_delay, event) for deltas in streams]
+        print(f"{name:<24}"
+              f"{statistics.mean(r['events'] for r in results):>8.1f}"
+              f"{statistics.mean(r['writes'] for r in results):>8.1f}"
+              f"{statistics.mean(r['bytes'] for r in results):>9.0f}"
+              f"{statistics.mean(r['serialize_us'] for r in results):>10.1f}us"
+              f"{statistics.mean(r['mean_delay_ms'] for r in results):>10.1f}ms"
+              f"{max(r['max_delay_ms'] for r in results):>9.1f}ms")
+    print("\nPer answer means; delay is the time coalescing held text back (max over all answers).")
+
+
+if __name__ == "__main__":
+    main()
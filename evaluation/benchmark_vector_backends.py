@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+import chromadb
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from vector_store import NumpyVectorStore
+
+
+def make_queries(store, num_requests, queries_per_request, noise=0.02):
+    """
+    Build query batches near stored summaries, so no embedding API calls are needed.
+    """
+    matrix = store.get_collection("summaries")["matrix"]
+    batches = []
+    for _ in range(num_requests):
+        rows = np.asarray(matrix[random.sample(range(matrix.shape[0]), queries_per_request)], dtype=np.float32)
+        rows += np.random.normal(0, noise, rows.shape).astype(np.float32)
+        rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+        batches.append(rows)
+    return batches
+
+
+def chroma_search(client):
+    def search(collection_name, query_embeddings, n_results, where=None):
+        collection = client.get_collection(name=collection_name)
+        results = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=["distances"]
+        )
+        return results["ids"], results["distances"]
+    return search
+
+
+def numpy_search(store):
+    def search(collection_name, query_embeddings, n_results, where=None):
+        return store.query(collection_name, query_embeddings, n_results, where=where)
+    return search
+
+
+def run_requests(search, batches, page_filters):
+    """
+    Replay the two vector searches of retrieve_context for every request.
+    """
+    latencies = {"summaries": [], "chunks": []}
+    results = []
+    for query_embeddings, page_ids in zip(batches, page_filters):
+        start = time.perf_counter()
+        summary_ids, _ = search("summaries", query_embeddings, 36)
+        latencies["summaries"].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        chunk_ids, _ = search("chunks", query_embeddings, 128, where={"page_id": {"$in": page_ids}})
+        latencies["chunks"].append((time.perf_counter() - start) * 1000)
+        results.append((summary_ids, chunk_ids))
+    return latencies, results
+
+
+def overlap(reference, candidate):
+    scores = [
+        len(set(ref) & set(cand)) / len(ref)
+        for ref_lists, cand_lists in zip(reference, candidate)
+        for ref, cand in zip(ref_lists, cand_lists)
+        if ref
+    ]
+    return statistics.mean(scores) if scores else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ChromaDB and NumPy vector search latency.")
+    parser.add_argument("--backend", choices=["chroma", "numpy", "both"], default="both")
+    parser.add_argument("--chroma-dir", default="../backend/chroma_db")
+    parser.add_argument("--numpy-dir", default="../backend/numpy_index")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(42)
+    np.random.seed(42)
+
+    store = NumpyVectorStore(args.numpy_dir)
+    batches = make_queries(store, args.requests, 3)
+    page_ids = list(store.get_collection("chunks")["page_rows"].keys())
+    page_filters = [random.sample(page_ids, min(8, len(page_ids))) for _ in batches]
+
+    backends = {}
+    if args.backend in ("chroma", "both"):
+        os.environ['ANONYMIZED_TELEMETRY'] = 'False'
+        backends["chroma"] = chroma_search(chromadb.PersistentClient(path=args.chroma_dir))
+    if args.backend in ("numpy", "both"):
+        backends["numpy"] = numpy_search(store)
+
+    all_results = {}
+    print(f"\n{args.requests} requests, 3 query embeddings each\n")
+    for name, search in backends.items():
+        # Warm up caches and memory maps
+        run_requests(search, batches[:10], page_filters[:10])
+        latencies, results = run_requests(search, batches, page_filters)
+        all_results[name] = results
+        for stage, values in latencies.items():
+            values = sorted(values)
+            p95 = values[int(0.95 * (len(values) - 1))]
+            print(f"{name:<7}{stage:<11} p50 {statistics.median(values):8.2f} ms   p95 {p95:8.2f} ms")
+
+    if len(all_results) == 2:
+        exact = all_results["numpy"]
+        approximate = all_results["chroma"]
+        print(f"\nChroma overlap with exact search: summaries {overlap([r[0] for r in exact], [r[0] for r in approximate]):.3f}, "
+              f"chunks {overlap([r[1] for r in exact], [r[1] for r in approximate]):.3f}")
+
+
+if __name__ == "__main__":
+    main()
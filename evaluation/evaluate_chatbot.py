@@ -16,8 +16,13 @@ def main():
     dataset_file = "test_dataset.json"
     results_file = "evaluation_results.json"
     chatbot_url = "http://localhost:5000/api/chat"
+    batch_url = "http://localhost:5000/api/chat/batch"
+    batch_size = 64
     num_iterations = 7
 
+    # Fetch all chatbot answers through the batch endpoint instead of one SSE stream each
+    use_batch = os.getenv("EVALUATION_BATCH", "false").lower() == "true"
+
     with open(dataset_file, "r", encoding="utf-8") as f:
         dataset = json.load(f)
 
@@ -32,8 +37,32 @@ If the chatbot's response includes the correct information mark it as correctly
 
     total_steps = len(dataset) * num_iterations
 
+    welcome_message = "Welcome to FHNW! I'm your chatbot assistant, and I'm here to help answer any questions you may have about our university. Feel free to ask me about our programs, services, or research opportunities. How can I assist you today?"
+
+    batch_answers = None
+    if use_batch:
+        conversations = [
+            {
+                "id": f"{item_index}-{i}",
+                "messages": [
+                    {"role": "assistant", "content": welcome_message},
+                    {"role": "user", "content": item["query"]}
+                ]
+            }
+            for item_index, item in enumerate(dataset)
+            for i in range(num_iterations)
+        ]
+        batch_answers = {}
+        for start in tqdm(range(0, len(conversations), batch_size), desc="Fetching batch answers", ncols=150):
+            response = requests.post(batch_url, json={"conversations": conversations[start:start + batch_size]}, stream=True)
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    result = json.loads(line)
+                    batch_answers[result["id"]] = result.get("answer", "ERROR")
+
     with tqdm(total=total_steps, desc="Evaluating queries", ncols=150) as pbar:
-        for item in dataset:
+        for item_index, item in enumerate(dataset):
             query = item["query"]
             correct_answer = item["correct_response"]
 
@@ -47,7 +76,7 @@ If the chatbot's response includes the correct information mark it as correctly
                     "messages": [
                         {
                             "role": "assistant",
-                            "content": "Welcome to FHNW! I'm your chatbot assistant, and I'm here to help answer any questions you may have about our university. Feel free to ask me about our programs, services, or research opportunities. How can I assist you today?"
+                            "content": welcome_message
                         },
                         {
                             "role": "user",
@@ -58,22 +87,25 @@ If the chatbot's response includes the correct information mark it as correctly
 
                 chatbot_response = ""
                 try:
-                    response = requests.post(
-                        chatbot_url,
-                        headers={"Content-Type": "application/json"},
-                        data=json.dumps(payload),
-                        stream=True
-                    )
-
-                    for line in response.iter_lines(decode_unicode=True):
-                        if line and line.startswith("data: "):
-                            data_str = line[len("data: "):]
-                            if data_str != "[DONE]":
-                                try:
-                                    chunk_json = json.loads(data_str)
-                                    chatbot_response += chunk_json.get("text", "")
-                                except json.JSONDecodeError:
-                                    pass
+                    if batch_answers is not None:
+                        chatbot_response = batch_answers.get(f"{item_index}-{i}", "ERROR")
+                    else:
+                        response = requests.post(
+                            chatbot_url,
+                            headers={"Content-Type": "application/json"},
+                            data=json.dumps(payload),
+                            stream=True
+                        )
+
+                        for line in response.iter_lines(decode_unicode=True):
+                            if line and line.startswith("data: "):
+                                data_str = line[len("data: "):]
+                                if data_str != "[DONE]":
+                                    try:
+                                        chunk_json = json.loads(data_str)
+                                        chatbot_response += chunk_json.get("text", "")
+                                    except json.JSONDecodeError:
+                                        pass
 
                     evaluation = client.chat.completions.create(
                         model="gpt-4o-mini",
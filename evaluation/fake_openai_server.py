@@ -0,0 +1,175 @@
+"""
+Local OpenAI-compatible stand-in for load tests.
+
+Serves the three calls the chatbot makes, with configurable latency and no cost:
+- /v1/embeddings: deterministic unit vectors derived from a hash of the text, so the
+  same text always gets the same embedding (see fake_embedding)
+- /v1/chat/completions with a json_schema response format: a structured rewrite that
+  fills every schema property (booleans true, strings with the user query)
+- /v1/chat/completions with stream=true: an answer streamed token by token
+
+Point the backend at it with:
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=fake
+"""
+import time
+import json
+import base64
+import asyncio
+import hashlib
+import argparse
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+ANSWER_WORDS = (
+    "The FHNW School of Business offers this programme full-time and part-time . "
+    "Tuition fees are charged per semester and depend on your place of residence . "
+    "You can find the details on the programme page and contact the advisory service "
+    "for questions about admission , deadlines and the application process . "
+).split()
+
+
+def fake_embedding(text, dimensions=3072):
+    """
+    Deterministic unit vector for a text, shared with seed_load_test_corpus.py
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def user_query(messages):
+    """
+    The user query of a rewrite request, or the last user message
+    """
+    content = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    if "User query:" in content:
+        content = content.rsplit("User query:", 1)[1]
+    return content.strip().splitlines()[0] if content.strip() else "fhnw"
+
+
+def fake_structured_output(schema, query):
+    values = {}
+    for index, (name, spec) in enumerate(schema.get("properties", {}).items()):
+        if spec.get("type") == "boolean":
+            values[name] = True
+        elif spec.get("type") == "string":
+            values[name] = query if index <= 1 else f"{query} fhnw"
+        else:
+            values[name] = None
+    return values
+
+
+def create_app(config):
+    async def embeddings(request):
+        data = await request.json()
+        inputs = data["input"] if isinstance(data["input"], list) else [data["input"]]
+        dimensions = data.get("dimensions") or config.embedding_dim
+        await asyncio.sleep(config.embedding_latency_ms / 1000)
+
+        items = []
+        for index, text in enumerate(inputs):
+            vector = fake_embedding(text, dimensions)
+            if data.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            items.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(len(text.split()) for text in inputs)
+        return JSONResponse({
+            "object": "list",
+            "data": items,
+            "model": data.get("model"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    async def chat_completions(request):
+        data = await request.json()
+        created = int(time.time())
+        completion_id = f"chatcmpl-fake-{created}"
+        model = data.get("model")
+        query = user_query(data.get("messages", []))
+
+        response_format = data.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            await asyncio.sleep(config.rewrite_latency_ms / 1000)
+            content = json.dumps(fake_structured_output(response_format["json_schema"]["schema"], query))
+        else:
+            content = None
+
+        if not data.get("stream"):
+            if content is None:
+                await asyncio.sleep((config.ttft_ms + config.token_ms * config.answer_tokens) / 1000)
+                content = " ".join(ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(config.answer_tokens))
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": config.answer_tokens, "total_tokens": config.answer_tokens}
+            })
+
+        def chunk(delta, finish_reason=None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def stream():
+            await asyncio.sleep(config.ttft_ms / 1000)
+            yield chunk({"role": "assistant", "content": ""})
+            for i in range(config.answer_tokens):
+                if i:
+                    await asyncio.sleep(config.token_ms / 1000)
+                word = ANSWER_WORDS[i % len(ANSWER_WORDS)]
+                yield chunk({"content": word if i == 0 else " " + word})
+            yield chunk({}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    async def retrieve_model(request):
+        return JSONResponse({
+            "id": request.path_params["model"],
+            "object": "model",
+            "created": 0,
+            "owned_by": "fake"
+        })
+
+    return Starlette(routes=[
+        Route("/v1/embeddings", embeddings, methods=["POST"]),
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/v1/models/{model}", retrieve_model, methods=["GET"])
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stand-in for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--embedding-dim", type=int, default=3072)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--rewrite-latency-ms", type=float, default=800)
+    parser.add_argument("--ttft-ms", type=float, default=400)
+    parser.add_argument("--token-ms", type=float, default=15)
+    parser.add_argument("--answer-tokens", type=int, default=250)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
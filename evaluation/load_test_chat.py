@@ -0,0 +1,145 @@
+"""
+Closed-loop load test for the full chat pipeline.
+
+Keeps --concurrency clients sending /api/chat requests back to back, each with the
+next question of the test dataset, for --duration seconds or until --requests have
+been sent. Reports time to first token, total latency and throughput percentiles,
+and the status codes of failed requests (429 and 503 come from admission control).
+
+Run it offline, without OpenAI costs, against the local stand-in and a synthetic corpus:
+    python fake_openai_server.py &
+    python seed_load_test_corpus.py --numpy-dir ../backend/load_test_index [--neo4j]
+    cd ../backend && OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=fake \\
+        VECTOR_BACKEND=numpy NUMPY_INDEX_DIR=./load_test_index gunicorn -c gunicorn.conf.py wsgi:app
+    python load_test_chat.py --concurrency 32 --duration 60
+"""
+import time
+import json
+import asyncio
+import argparse
+import itertools
+import statistics
+from collections import Counter
+
+import httpx
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def load_questions(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [item["query"] for item in json.load(f)]
+
+
+async def run_chat(client, url, question):
+    """
+    Returns:
+        dict: "status" (HTTP status, or the exception name), "ok", "ttft" and
+            "latency" in seconds, "chars" of answer text
+    """
+    payload = {"messages": [
+        {"role": "assistant", "content": "Hello! How can I help you?"},
+        {"role": "user", "content": question}
+    ]}
+    start = time.perf_counter()
+    ttft = None
+    chars = 0
+    try:
+        async with client.stream("POST", url, json=payload) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return {"status": response.status_code, "ok": False, "ttft": None,
+                        "latency": time.perf_counter() - start, "chars": 0}
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                if line == "data: [DONE]":
+                    return {"status": 200, "ok": True, "ttft": ttft,
+                            "latency": time.perf_counter() - start, "chars": chars}
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                chars += len(json.loads(line[len("data: "):]).get("text", ""))
+        status = "incomplete"
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        status = type(e).__name__
+    return {"status": status, "ok": False, "ttft": ttft, "latency": time.perf_counter() - start, "chars": chars}
+
+
+async def worker(client, url, questions, deadline, remaining, results):
+    while time.perf_counter() < deadline:
+        if remaining is not None:
+            if remaining[0] <= 0:
+                return
+            remaining[0] -= 1
+        results.append(await run_chat(client, url, next(questions)))
+
+
+async def main_async(args):
+    questions = itertools.cycle(load_questions(args.dataset))
+    url = f"{args.base_url}/api/chat"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    deadline = time.perf_counter() + (args.duration if args.duration else float("inf"))
+    remaining = [args.requests] if args.requests else None
+    results = []
+
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            worker(client, url, questions, deadline, remaining, results) for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+
+    ok = [result for result in results if result["ok"]]
+    ttfts = [result["ttft"] for result in ok if result["ttft"] is not None]
+    latencies = [result["latency"] for result in ok]
+    failures = Counter(result["status"] for result in results if not result["ok"])
+
+    print(f"\n{len(results)} requests at concurrency {args.concurrency} in {elapsed:.1f}s: "
+          f"{len(ok)} ok, {len(results) - len(ok)} failed")
+    print(f"{'':<14}{'p50':>9}{'p95':>9}{'p99':>9}{'mean':>9}")
+    for name, values in (("ttft", ttfts), ("latency", latencies)):
+        print(f"{name:<14}"
+              f"{percentile(values, 0.5):>8.3f}s{percentile(values, 0.95):>8.3f}s{percentile(values, 0.99):>8.3f}s"
+              f"{statistics.mean(values) if values else float('nan'):>8.3f}s")
+    print(f"\nThroughput: {len(ok) / elapsed:.2f} answers/s, "
+          f"{sum(result['chars'] for result in ok) / elapsed:.0f} answer chars/s")
+    if failures:
+        print("Failures: " + ", ".join(f"{status}: {count}" for status, count in failures.most_common()))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "concurrency": args.concurrency,
+                "elapsed": elapsed,
+                "requests": len(results),
+                "ok": len(ok),
+                "failures": {str(status): count for status, count in failures.items()},
+                "ttft": {"p50": percentile(ttfts, 0.5), "p95": percentile(ttfts, 0.95), "p99": percentile(ttfts, 0.99)},
+                "latency": {"p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95),
+                            "p99": percentile(latencies, 0.99)},
+                "throughput": len(ok) / elapsed
+            }, f, indent=4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive /api/chat at a fixed concurrency and report latency percentiles.")
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--dataset", default="test_dataset.json")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to run (0: until --requests are sent)")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests (0: no limit)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", default=None, help="Write the summary to this JSON file")
+    args = parser.parse_args()
+    if not args.duration and not args.requests:
+        parser.error("set --duration or --requests")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Load test for concurrent answer streams.
+
+Opens increasing numbers of simultaneous /api/chat streams against a running
+server and reports, per level, how many streams completed, time to first token,
+stream duration and the peak number of streams held open at once. Run it against
+the Flask app and the ASGI app (asgi.py) to compare how many streams one process
+can hold. To avoid paying for tokens, point the server's OPENAI_BASE_URL at a
+local fake OpenAI server.
+
+With --disconnect-after N every client hangs up after N events; the server's
+fhnw_client_disconnects_total counter should then grow by the number of streams.
+"""
+import time
+import json
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+QUESTION = "What are the tuition fees for the BSc in Business Information Technology?"
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def run_stream(client, url, state, disconnect_after):
+    """
+    Returns:
+        dict: "ok", "ttft" and "duration" in seconds, "events"
+    """
+    payload = {"messages": [
+        {"role": "assistant", "content": "Hello! How can I help you?"},
+        {"role": "user", "content": QUESTION}
+    ]}
+    start = time.perf_counter()
+    ttft = None
+    events = 0
+    try:
+        async with client.stream("POST", url, json=payload) as response:
+            if response.status_code != 200:
+                return {"ok": False, "ttft": None, "duration": time.perf_counter() - start, "events": 0}
+            state["open"] += 1
+            state["peak"] = max(state["peak"], state["open"])
+            try:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    if line == "data: [DONE]":
+                        return {"ok": True, "ttft": ttft, "duration": time.perf_counter() - start, "events": events}
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    events += 1
+                    if disconnect_after and events >= disconnect_after:
+                        # Leaving the context manager closes the connection mid-stream
+                        return {"ok": True, "ttft": ttft, "duration": time.perf_counter() - start, "events": events}
+            finally:
+                state["open"] -= 1
+    except (httpx.HTTPError, json.JSONDecodeError):
+        pass
+    return {"ok": False, "ttft": ttft, "duration": time.perf_counter() - start, "events": events}
+
+
+async def run_level(url, concurrency, timeout, disconnect_after):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    state = {"open": 0, "peak": 0}
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            run_stream(client, url, state, disconnect_after) for _ in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+    return results, state["peak"], elapsed
+
+
+async def read_disconnects(base_url):
+    async with httpx.AsyncClient(timeout=10) as client:
+        try:
+            response = await client.get(f"{base_url}/metrics")
+        except httpx.HTTPError:
+            return None
+    for line in response.text.splitlines():
+        if line.startswith("fhnw_client_disconnects_total"):
+            return float(line.split()[-1])
+    return 0.0
+
+
+async def main_async(args):
+    url = f"{args.base_url}/api/chat"
+    print(f"{'streams':>8} {'ok':>6} {'failed':>6} {'peak open':>9} {'ttft p50':>9} {'ttft p95':>9} "
+          f"{'dur p50':>8} {'dur max':>8} {'wall':>7}")
+    held = 0
+    for concurrency in args.levels:
+        disconnects_before = await read_disconnects(args.base_url)
+        results, peak, elapsed = await run_level(url, concurrency, args.timeout, args.disconnect_after)
+        ok = [result for result in results if result["ok"]]
+        ttfts = [result["ttft"] for result in ok if result["ttft"] is not None]
+        durations = [result["duration"] for result in ok]
+        print(f"{concurrency:>8} {len(ok):>6} {len(results) - len(ok):>6} {peak:>9} "
+              f"{percentile(ttfts, 0.5):>8.2f}s {percentile(ttfts, 0.95):>8.2f}s "
+              f"{percentile(durations, 0.5):>7.2f}s {max(durations, default=float('nan')):>7.2f}s {elapsed:>6.1f}s")
+
+        if args.disconnect_after:
+            # Give the server a moment to notice the closed connections
+            await asyncio.sleep(1)
+            disconnects_after = await read_disconnects(args.base_url)
+            if disconnects_before is not None and disconnects_after is not None:
+                print(f"{'':>8} server counted {disconnects_after - disconnects_before:.0f} client disconnects")
+
+        if len(ok) == len(results):
+            held = max(held, peak)
+        elif args.stop_on_failure:
+            break
+
+    print(f"\nMost concurrent streams held with no failures: {held}")
+    if ttfts:
+        print(f"Mean time to first token at the last level: {statistics.mean(ttfts):.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how many concurrent answer streams a server can hold.")
+    parser.add_argument("--base-url", default="http://localhost:5000")
+    parser.add_argument("--levels", type=lambda value: [int(level) for level in value.split(",")],
+                        default=[10, 50, 100, 200, 400])
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--disconnect-after", type=int, default=0,
+                        help="Hang up after this many events (0 reads every stream to the end)")
+    parser.add_argument("--stop-on-failure", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Seed a synthetic corpus for load tests against fake_openai_server.py.
+
+Embeddings come from the stand-in's deterministic fake_embedding, so the rewritten
+queries it returns search a consistent index. Writes:
+- a NumPy index (serve it with VECTOR_BACKEND=numpy and NUMPY_INDEX_DIR)
+- optionally ChromaDB collections (serve them with CHROMA_PERSIST_DIR)
+- optionally a graph snapshot of the pages and chunks (serve it with GRAPH_SNAPSHOT_PATH,
+  no Neo4j needed)
+- optionally the matching pages and chunks into the Neo4j at NEO4J_URI. All synthetic
+  page and chunk ids start with "loadtest-", so an existing graph is left untouched
+  and --clear removes only the synthetic nodes.
+"""
+import os
+import sys
+import argparse
+
+import numpy as np
+from dotenv import load_dotenv
+from neo4j import GraphDatabase
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data_gathering_and_indexing"))
+from export_numpy_index import write_collection
+from graph_snapshot import write_snapshot
+from vector_store import chunk_shard_name
+from fake_openai_server import fake_embedding
+
+PREFIX = "loadtest-"
+TOPICS = [
+    "tuition fees", "admission requirements", "application deadlines", "exchange semester",
+    "master programmes", "bachelor programmes", "student housing", "library services",
+    "research projects", "continuing education", "campus locations", "scholarships"
+]
+BATCH_SIZE = 500
+
+
+def build_corpus(num_pages, chunks_per_page):
+    pages = []
+    chunks = []
+    for i in range(num_pages):
+        topic = TOPICS[i % len(TOPICS)]
+        page_id = f"{PREFIX}p{i}"
+        summary = f"Synthetic page {i} about {topic} at FHNW, variant {i // len(TOPICS)}."
+        pages.append({
+            "page_id": page_id,
+            "file_name": f"{PREFIX}{i}.json",
+            "url": f"https://www.fhnw.ch/loadtest/{i}",
+            "summary": summary,
+            "community_id": i % 20,
+            "number_of_chunks": chunks_per_page,
+            "summary_token_count": len(summary) // 4 + 1
+        })
+        for number in range(chunks_per_page):
+            content = f"## {topic.title()} ({i}.{number})\n\n" + f"Details on {topic} for page {i}, part {number}. " * 20
+            chunks.append({
+                "page_id": page_id,
+                "chunk_id": f"{PREFIX}c{i}_{number}",
+                "content": content,
+                "chunk_number": number,
+                "token_count": len(content) // 4 + 1
+            })
+    return pages, chunks
+
+
+def embed(texts, dimensions):
+    return np.stack([fake_embedding(text, dimensions) for text in tqdm(texts, desc="Embedding")])
+
+
+def seed_neo4j(driver, pages, chunks):
+    with driver.session() as session:
+        for start in tqdm(range(0, len(pages), BATCH_SIZE), desc="Neo4j pages"):
+            session.run("""
+                UNWIND $pages AS page
+                MERGE (p:Page {file_name: page.file_name})
+                SET p.page_id = page.page_id, p.url = page.url, p.summary = page.summary,
+                    p.community_id = page.community_id, p.number_of_chunks = page.number_of_chunks,
+                    p.summary_token_count = page.summary_token_count
+                """, pages=pages[start:start + BATCH_SIZE]).consume()
+        for start in tqdm(range(0, len(chunks), BATCH_SIZE), desc="Neo4j chunks"):
+            session.run("""
+                UNWIND $chunks AS chunk
+                MATCH (p:Page {page_id: chunk.page_id})
+                MERGE (c:Chunk {chunk_id: chunk.chunk_id})
+                SET c.content = chunk.content, c.chunk_number = chunk.chunk_number, c.token_count = chunk.token_count
+                MERGE (p)-[:HAS_CHUNK]->(c)
+                """, chunks=chunks[start:start + BATCH_SIZE]).consume()
+
+
+def clear_neo4j(driver):
+    with driver.session() as session:
+        session.run("""
+            MATCH (p:Page) WHERE p.page_id STARTS WITH $prefix
+            OPTIONAL MATCH (p)-[:HAS_CHUNK]->(c:Chunk)
+            DETACH DELETE p, c
+            """, prefix=PREFIX).consume()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a synthetic corpus for load tests.")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--chunks-per-page", type=int, default=6)
+    parser.add_argument("--embedding-dim", type=int, default=3072)
+    parser.add_argument("--numpy-dir", default="../backend/load_test_index")
+    parser.add_argument("--chroma-dir", default=None, help="Also write ChromaDB collections here")
+    parser.add_argument("--shard-by-community", action="store_true",
+                        help="Also write one ChromaDB chunk collection per community (CHUNK_INDEX=sharded)")
+    parser.add_argument("--graph-snapshot", default=None, help="Also write a graph snapshot to this file")
+    parser.add_argument("--neo4j", action="store_true", help="Write the pages and chunks to NEO4J_URI")
+    parser.add_argument("--clear", action="store_true", help="Only remove the synthetic nodes from Neo4j")
+    args = parser.parse_args()
+
+    load_dotenv()
+    driver = None
+    if args.neo4j or args.clear:
+        driver = GraphDatabase.driver(
+            os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+            auth=(os.getenv("NEO4J_USERNAME", "neo4j"), os.getenv("NEO4J_PASS"))
+        )
+    if args.clear:
+        clear_neo4j(driver)
+        driver.close()
+        print("Removed synthetic pages and chunks from Neo4j")
+        return
+
+    pages, chunks = build_corpus(args.pages, args.chunks_per_page)
+    summary_matrix = embed([page["summary"] for page in pages], args.embedding_dim)
+    chunk_matrix = embed([chunk["content"] for chunk in chunks], args.embedding_dim)
+
+    os.makedirs(args.numpy_dir, exist_ok=True)
+    page_ids = [page["page_id"] for page in pages]
+    write_collection(args.numpy_dir, "summaries", page_ids, summary_matrix, [None] * len(pages), "float32")
+    write_collection(args.numpy_dir, "chunks", [chunk["chunk_id"] for chunk in chunks], chunk_matrix,
+                     [chunk["page_id"] for chunk in chunks], "float32")
+    print(f"Wrote NumPy index with {len(pages)} pages and {len(chunks)} chunks to {args.numpy_dir}")
+
+    if args.graph_snapshot:
+        stats = write_snapshot(args.graph_snapshot, pages, chunks, metadata={"source": "seed_load_test_corpus.py"})
+        print(f"Wrote graph snapshot ({stats['bytes'] / 2**20:.1f} MiB) to {args.graph_snapshot}")
+
+    if args.chroma_dir:
+        os.environ['ANONYMIZED_TELEMETRY'] = 'False'
+        import chromadb
+
+        client = chromadb.PersistentClient(path=args.chroma_dir)
+        for name in ("summaries", "chunks"):
+            try:
+                client.delete_collection(name)
+            except Exception:
+                pass
+        summaries = client.create_collection("summaries")
+        chunk_collection = client.create_collection("chunks")
+        for start in tqdm(range(0, len(pages), BATCH_SIZE), desc="Chroma summaries"):
+            summaries.add(ids=page_ids[start:start + BATCH_SIZE],
+                          embeddings=summary_matrix[start:start + BATCH_SIZE].tolist(),
+                          documents=[page["summary"] for page in pages[start:start + BATCH_SIZE]])
+        for start in tqdm(range(0, len(chunks), BATCH_SIZE), desc="Chroma chunks"):
+            batch = chunks[start:start + BATCH_SIZE]
+            chunk_collection.add(ids=[chunk["chunk_id"] for chunk in batch],
+                                 embeddings=chunk_matrix[start:start + BATCH_SIZE].tolist(),
+                                 documents=[chunk["content"] for chunk in batch],
+                                 metadatas=[{"page_id": chunk["page_id"]} for chunk in batch])
+        if args.shard_by_community:
+            communities = {page["page_id"]: page["community_id"] for page in pages}
+            shards = {}
+            for row, chunk in enumerate(chunks):
+                shards.setdefault(chunk_shard_name(communities[chunk["page_id"]]), []).append(row)
+            for name, rows in tqdm(sorted(shards.items()), desc="Chroma community shards"):
+                try:
+                    client.delete_collection(name)
+                except Exception:
+                    pass
+                shard = client.create_collection(name)
+                for start in range(0, len(rows), BATCH_SIZE):
+                    batch = rows[start:start + BATCH_SIZE]
+                    shard.add(ids=[chunks[row]["chunk_id"] for row in batch],
+                              embeddings=chunk_matrix[batch].tolist(),
+                              metadatas=[{"page_id": chunks[row]["page_id"]} for row in batch])
+        print(f"Wrote ChromaDB collections to {args.chroma_dir}")
+
+    if driver is not None:
+        seed_neo4j(driver, pages, chunks)
+        driver.close()
+        print("Wrote synthetic pages and chunks to Neo4j")
+
+
+if __name__ == "__main__":
+    main()